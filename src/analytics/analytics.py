@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+import sys
+import json
+import time
+import argparse
+import datetime
+
+from prettytable import PrettyTable
+
+from trades import TradeCache, load_trades, report
+
+
+FIELD_NAMES = [
+    "transactions", "filled", "fill_rate", "closed", "open", "win_rate", "realized", "unrealized", "return",
+    "volume", "time_to_fill", "hold_time", "buy_slippage", "sell_slippage"
+]
+FORMATS = {
+    "fill_rate": "{:.1%}", "win_rate": "{:.1%}", "return": "{:.2%}", "buy_slippage": "{:+.3%}", "sell_slippage": "{:+.3%}",
+    "realized": "{:.4f}", "unrealized": "{:.4f}", "volume": "{:.2f}", "time_to_fill": "{:.0f}s", "hold_time": "{:.0f}s",
+    "transactions": "{:.0f}", "filled": "{:.0f}", "closed": "{:.0f}", "open": "{:.0f}"
+}
+
+
+def to_epoch(value:str) -> int:
+    # epoch seconds or a utc date
+    if value is None or value.isdigit():
+        return int(value) if value else None
+    return int(datetime.datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc).timestamp())
+
+
+def render(rows:list, key:str) -> str:
+    tbl = PrettyTable()
+    tbl.field_names = [key] + FIELD_NAMES
+    tbl.align = "r"
+    for row in rows:
+        tbl.add_row([row["key"]] + ["-" if row[name] is None else FORMATS[name].format(row[name]) for name in FIELD_NAMES])
+    return str(tbl)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="P&L, fill and slippage report of trading_table",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="python analytics.py --database=/opt/db/tradingbot.db --since=2024-01-01"
+    )
+    parser.add_argument('--database', dest='database', type=str, default="/opt/db/tradingbot.db")
+    parser.add_argument('--since', dest='since', type=str, help='first bid day (YYYY-MM-DD, utc) or epoch second')
+    parser.add_argument('--until', dest='until', type=str, help='bids before this day (YYYY-MM-DD, utc) or epoch second')
+    parser.add_argument('--symbol', dest='symbol', type=str, help='only this trading pair')
+    parser.add_argument('--report', dest='reports', action='append', choices=("total", "pairs", "days"),
+                            help='report to print, all by default')
+    parser.add_argument('--cache', dest='cache', type=str, help='columns cache of the final rows, <database>.trades.npz by default')
+    parser.add_argument('--no-cache', dest='no_cache', action='store_true', help='read every row from the database')
+    parser.add_argument('--json', dest='json', action='store_true', help='print the reports as json')
+
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache = None if args.no_cache else TradeCache(args.cache or f"{args.database}.trades.npz")
+    trades = load_trades(
+        args.database, since=to_epoch(args.since), until=to_epoch(args.until), symbol=args.symbol, cache=cache
+    )
+    reports = report(trades)
+    elapsed = time.perf_counter() - start
+
+    selected = args.reports or ["total", "pairs", "days"]
+    if args.json:
+        json.dump({name: reports[name] for name in selected}, sys.stdout, indent=2)
+        sys.exit(0)
+
+    for name in selected:
+        print(render(reports[name], key="pair" if name == "pairs" else "day" if name == "days" else ""))
+    print(f"{len(trades)} transaction(s) - {len(trades.symbols)} pair(s) - {elapsed:.2f}s")
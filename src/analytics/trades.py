@@ -0,0 +1,251 @@
+import os
+import sqlite3
+
+import numpy as np
+
+
+DAY = 86400
+
+def real(column:str) -> str:
+    # the bot writes some of the numbers as quoted strings or '' when unset
+    return f"CAST(NULLIF({column}, '') AS REAL)"
+
+
+# trading_table columns read per row, the casts and the average fill prices are done by sqlite in the same query
+COLUMNS = {
+    "id": "id",
+    "ia": "ia",
+    "ie": "ie",
+    "bft": "bft",
+    "sft": "sft",
+    "bp": real("bp"),
+    "cp": real("cp"),
+    "sp": real("sp"),
+    "abq": real("abq"),
+    "asq": real("asq"),
+    # the order updates swap origQty / executedQty, the executed one is never the larger
+    "buy_avg": f"{real('cbqq')} / NULLIF(MIN({real('obq')}, {real('ebq')}), 0)",
+    "sell_avg": f"{real('csqq')} / NULLIF(MIN({real('osq')}, {real('esq')}), 0)",
+}
+TEXT_COLUMNS = ["s", "st"]
+# rows the bot won't write to anymore, closed / expired / cancelled for good
+FINAL_SQL = "ie IS NOT NULL"
+CHECK_SQL = "SELECT COUNT(*), TOTAL(ia), TOTAL(ie), TOTAL(st = 'CLOSED') FROM trading_table WHERE id <= ?"
+
+
+class TradeColumns:
+    """The rows of trading_table as one array per column.
+
+    Numeric columns are float64 with NaN for NULL / '' values, `s` and `st` are
+    strings, `symbol_idx` are the codes of `s` into `symbols`.
+    """
+
+    def __init__(self, columns:dict):
+        self.columns = columns
+        self.symbols, self.symbol_idx = np.unique(columns["s"], return_inverse=True)
+
+    def __repr__(self):
+        return f"TradeColumns - {len(self)} - {len(self.symbols)} symbol(s)"
+
+    def __len__(self):
+        return len(self.symbol_idx)
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["columns"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def select(self, mask:np.ndarray) -> "TradeColumns":
+        return TradeColumns({name: values[mask] for name, values in self.columns.items()})
+
+
+def fetch_columns(db, where:str="", params=()) -> dict:
+    sql = "SELECT {columns}, {text} FROM trading_table {where} ORDER BY id".format(
+        columns=", ".join(COLUMNS.values()), text=", ".join(f"IFNULL({c}, '')" for c in TEXT_COLUMNS), where=where
+    )
+    rows = db.execute(sql, params).fetchall()
+    n = len(COLUMNS)
+    # None -> NaN in the float conversion
+    values = np.array([row[:n] for row in rows], dtype=np.float64).reshape(-1, n)
+    text = np.array([row[n:] for row in rows], dtype=str).reshape(-1, len(TEXT_COLUMNS))
+    columns = {name: values[:, i] for i, name in enumerate(COLUMNS)}
+    columns.update({name: text[:, i] for i, name in enumerate(TEXT_COLUMNS)})
+    return columns
+
+
+def concat_columns(*parts) -> dict:
+    parts = [part for part in parts if part]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+class TradeCache:
+    """The columns of the final trading_table rows in a .npz file, so a report only reads the rows written since.
+
+    Rows are final once `ie` is set. The file keeps the highest id it covers
+    and the count, the sums of (ia, ie) and the closed count of the rows up to
+    it, it is rebuilt when the table no longer matches them. Prices edited by
+    hand on a final row aren't noticed, report with `--no-cache` after that.
+    """
+
+    def __init__(self, path:str):
+        self.path = path
+
+    def __repr__(self):
+        return f"TradeCache - {self.path}"
+
+    def load(self, db) -> tuple:
+        """Returns (columns, watermark) of a cache that still matches `db`, (None, None) otherwise."""
+
+        try:
+            with np.load(self.path) as data:
+                cached = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None, None
+        watermark = int(cached.pop("_watermark"))
+        check = tuple(cached.pop("_check"))
+        if db.execute(CHECK_SQL, (watermark,)).fetchone() != check:
+            return None, None
+        return cached, watermark
+
+    def save(self, db, columns:dict) -> None:
+        watermark = int(np.nanmax(columns["id"])) if len(columns["id"]) else 0
+        final = ~np.isnan(columns["ie"])
+        data = {name: values[final] for name, values in columns.items()}
+        try:
+            tmp = f"{self.path}.tmp.npz"
+            np.savez(tmp, _watermark=watermark, _check=np.array(db.execute(CHECK_SQL, (watermark,)).fetchone()), **data)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
+def load_trades(dbname:str, since:int=None, until:int=None, symbol:str=None, cache:TradeCache=None) -> TradeColumns:
+    """Reads trading_table columnar.
+
+    With a `cache` only the rows after its watermark and the ones still open
+    are read from sqlite. The filters on the bid time and the pair are applied
+    on the arrays.
+    """
+
+    with sqlite3.connect(f"file:{dbname}?mode=ro", uri=True) as db:
+        cached, watermark = cache.load(db) if cache else (None, None)
+        if cached is None:
+            columns = fetch_columns(db)
+            changed = True
+        else:
+            fresh = fetch_columns(db, f"WHERE id > ? OR NOT ({FINAL_SQL})", (watermark,))
+            columns = concat_columns(cached, fresh)
+            # only rewritten when rows turned final
+            changed = bool(np.any(~np.isnan(fresh["ie"])))
+        if cache and changed:
+            cache.save(db, columns)
+
+    trades = TradeColumns(columns)
+    mask = np.ones(len(trades), dtype=bool)
+    if since is not None:
+        mask &= trades.ia >= since
+    if until is not None:
+        mask &= trades.ia < until
+    if symbol:
+        mask &= trades.s == symbol.upper()
+    return trades if mask.all() else trades.select(mask)
+
+
+def trade_metrics(trades:TradeColumns) -> dict:
+    """Per row P&L, fill and slippage arrays, NaN where a row has no value.
+
+    Profits follow `get_profit`: realized is asq x sellPrice - abq x buyPrice
+    once CLOSED, unrealized is abq x (currentPrice - buyPrice) while the bought
+    quantity is still held. Slippage is the average fill price against the
+    bid / ask the order was placed at, positive is worse.
+    """
+
+    t = trades
+    closed = t.st == "CLOSED"
+    bought = np.nan_to_num(t.abq) > 0
+    # ie is set once a position is closed / expired / cancelled for good
+    held = bought & ~closed & np.isnan(t.ie)
+    cost = np.where(bought, t.abq * t.bp, np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        buy_slippage = np.where(bought, t.buy_avg / t.bp - 1, np.nan)
+        sell_slippage = np.where(closed, 1 - t.sell_avg / t.sp, np.nan)
+
+    return {
+        "closed": closed,
+        "bought": bought,
+        "held": held,
+        "cost": cost,
+        "realized": np.where(closed, t.asq * t.sp - t.abq * t.bp, np.nan),
+        "unrealized": np.where(held, t.abq * (t.cp - t.bp), np.nan),
+        "time_to_fill": np.where(bought, t.bft - t.ia, np.nan),
+        "hold_time": np.where(closed, t.sft - t.bft, np.nan),
+        "buy_slippage": buy_slippage,
+        "sell_slippage": sell_slippage,
+    }
+
+
+def group_sum(idx:np.ndarray, values:np.ndarray, size:int) -> np.ndarray:
+    # NaN rows don't count
+    return np.bincount(idx, weights=np.nan_to_num(values), minlength=size)
+
+
+def group_count(idx:np.ndarray, mask:np.ndarray, size:int) -> np.ndarray:
+    return np.bincount(idx, weights=mask.astype(np.float64), minlength=size)
+
+
+def group_mean(idx:np.ndarray, values:np.ndarray, size:int) -> np.ndarray:
+    count = group_count(idx, ~np.isnan(values), size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(count > 0, group_sum(idx, values, size) / count, np.nan)
+
+
+def aggregate(keys:np.ndarray, idx:np.ndarray, metrics:dict) -> list:
+    """Sums and means of the trade metrics per group, `idx` is the group of every row."""
+
+    size = len(keys)
+    transactions = np.bincount(idx, minlength=size)
+    bought = group_count(idx, metrics["bought"], size)
+    closed = group_count(idx, metrics["closed"], size)
+    wins = group_count(idx, np.nan_to_num(metrics["realized"]) > 0, size)
+    realized = group_sum(idx, metrics["realized"], size)
+    cost = group_sum(idx, np.where(metrics["closed"], metrics["cost"], np.nan), size)
+    columns = {
+        "transactions": transactions,
+        "filled": bought,
+        "fill_rate": np.divide(bought, transactions, out=np.zeros(size), where=transactions > 0),
+        "closed": closed,
+        "open": group_count(idx, metrics["held"], size),
+        "win_rate": np.divide(wins, closed, out=np.zeros(size), where=closed > 0),
+        "realized": realized,
+        "unrealized": group_sum(idx, metrics["unrealized"], size),
+        "return": np.divide(realized, cost, out=np.zeros(size), where=cost > 0),
+        "volume": group_sum(idx, metrics["cost"], size),
+        "time_to_fill": group_mean(idx, metrics["time_to_fill"], size),
+        "hold_time": group_mean(idx, metrics["hold_time"], size),
+        "buy_slippage": group_mean(idx, metrics["buy_slippage"], size),
+        "sell_slippage": group_mean(idx, metrics["sell_slippage"], size),
+    }
+    results = []
+    for i, key in enumerate(keys):
+        if not transactions[i]:
+            continue
+        row = {"key": key.item() if isinstance(key, np.generic) else key}
+        for name, values in columns.items():
+            value = values[i].item()
+            row[name] = None if value != value else value
+        results.append(row)
+    return results
+
+
+def report(trades:TradeColumns) -> dict:
+    """Totals, per pair and per utc day (of the bid) aggregates of the trades."""
+
+    metrics = trade_metrics(trades)
+    days, day_idx = np.unique((np.nan_to_num(trades.ia) // DAY).astype(np.int64), return_inverse=True)
+    return {
+        "total": aggregate(np.array(["total"]), np.zeros(len(trades), dtype=np.int64), metrics),
+        "pairs": aggregate(trades.symbols, trades.symbol_idx, metrics),
+        "days": aggregate((days * DAY).astype("datetime64[s]").astype("datetime64[D]").astype(str), day_idx, metrics),
+    }
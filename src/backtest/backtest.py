@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+import sys
+import json
+import time
+import argparse
+import configparser
+
+from prettytable import PrettyTable
+
+from data import load_predictions, load_prediction_history, load_price_dir
+from simulate import load_params, run_backtest
+
+
+FIELD_NAMES = ["symbol", "trades", "open", "unfilled", "hit_rate", "pnl", "fees", "return", "max_drawdown", "avg_hold_min"]
+
+
+def render(results:list) -> str:
+    tbl = PrettyTable()
+    tbl.field_names = FIELD_NAMES
+    tbl.align = "r"
+    for row in results:
+        tbl.add_row([
+            row["symbol"], row["trades"], row["open"], row["unfilled"], f"{row['hit_rate']:.1%}", f"{row['pnl']:.4f}",
+            f"{row['fees']:.4f}", f"{row['return']:.2%}", f"{row['max_drawdown']:.4f}", f"{row['avg_hold_min']:.1f}"
+        ])
+    return str(tbl)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="replays prediction history through the spot strategy",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="python backtest.py --predictions=pred_history.csv --klines=klines/ --config=config.ini"
+    )
+    parser.add_argument('--predictions', dest='predictions', type=str, required=True, help='prediction snapshots csv, or the collector db to read pred_history from')
+    parser.add_argument('--klines', dest='klines', type=str, required=True, help='directory of <SYMBOL>-<interval>-<date>.csv klines')
+    parser.add_argument('--config', dest='config', type=str, help='config path, [trading] and [backtest] are used')
+    parser.add_argument('--start', dest='start', type=int, help='first epoch second read from pred_history')
+    parser.add_argument('--end', dest='end', type=int, help='last epoch second read from pred_history')
+    parser.add_argument('--quote', dest='quote', type=str, default="USDT", help='quote asset of the pairs')
+    parser.add_argument('--json', dest='json', action='store_true', help='print the results as json')
+
+    args = parser.parse_args()
+    config = configparser.ConfigParser()
+    if args.config:
+        config.read(args.config)
+    params = load_params(config)
+
+    start = time.perf_counter()
+    if args.predictions.endswith(".db"):
+        predictions = load_prediction_history(args.predictions, args.start, args.end)
+    else:
+        predictions = load_predictions(args.predictions)
+    prices = load_price_dir(args.klines, [f"{crypto.upper()}{args.quote}" for crypto in predictions])
+    results = run_backtest(predictions, prices, params, quote=args.quote)
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.exit(0)
+
+    print(render(results))
+    total_pnl = sum(row["pnl"] for row in results)
+    total_trades = sum(row["trades"] for row in results)
+    print(f"{len(results)} pair(s) - {total_trades} trade(s) - pnl {total_pnl:.4f} {args.quote} - {elapsed:.2f}s")
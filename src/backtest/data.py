@@ -0,0 +1,189 @@
+import os
+import csv
+import glob
+import sqlite3
+
+import numpy as np
+
+
+NONE = 0
+LONG = 1
+SHORT = 2
+POSITIONS = {"none": NONE, "long": LONG, "short": SHORT}
+# bar length assumed when a series has a single bar
+DEFAULT_INTERVAL = 60
+
+
+class PredictionSeries:
+    """Prediction snapshots of one crypto as arrays sorted by time.
+
+    `t` is the epoch second the snapshot was scraped at, `position` one of the
+    POSITIONS codes and `elapsed` the minutes since the signal, NaN while the
+    feed shows `-`.
+    """
+
+    def __init__(self, crypto:str, t:np.ndarray, position:np.ndarray, elapsed:np.ndarray):
+        order = np.argsort(t, kind="stable")
+        self.crypto = crypto
+        self.t = t[order]
+        self.position = position[order]
+        self.elapsed = elapsed[order]
+
+    def __repr__(self):
+        return f"PredictionSeries - {self.crypto} - {len(self.t)}"
+
+    def __len__(self):
+        return len(self.t)
+
+
+class PriceSeries:
+    """Kline bars of one trading pair, `t` is the open time of each bar in epoch seconds.
+
+    `interval` is the bar length in seconds, the smallest spacing of the bars
+    unless given, larger spacings are gaps in the klines.
+    """
+
+    def __init__(self, symbol:str, t:np.ndarray, low:np.ndarray, high:np.ndarray, close:np.ndarray, interval:int=None):
+        order = np.argsort(t, kind="stable")
+        self.symbol = symbol
+        self.t = t[order]
+        self.low = low[order]
+        self.high = high[order]
+        self.close = close[order]
+        if interval is None:
+            spacing = np.diff(self.t)
+            spacing = spacing[spacing > 0]
+            interval = int(spacing.min()) if len(spacing) else DEFAULT_INTERVAL
+        self.interval = interval
+
+    def __repr__(self):
+        return f"PriceSeries - {self.symbol} - {len(self.t)}"
+
+    def __len__(self):
+        return len(self.t)
+
+    def bar_at(self, t) -> np.ndarray:
+        """Index of the bar `t` falls in, -1 before the first bar, after the last one closed or in a gap."""
+
+        idx = np.searchsorted(self.t, t, side="right") - 1
+        inside = (idx >= 0) & (t < self.t[np.maximum(idx, 0)] + self.interval) if len(self.t) else False
+        return np.where(inside, idx, -1)
+
+    def closed_bar_at(self, t) -> np.ndarray:
+        # the last bar already closed at `t`, its close is the latest price known then
+        return self.bar_at(np.asarray(t) - self.interval)
+
+    def first_bar_after(self, t) -> np.ndarray:
+        # first bar opening after `t`, len(self) when there is none
+        return np.searchsorted(self.t, t, side="right")
+
+
+def column(header:list, *names) -> int:
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+def load_predictions(path:str) -> dict:
+    """Reads prediction snapshots from a csv with the feed columns plus the scrape time.
+
+    The time column is `inserted_at` or `ia`, as the collector stores it. The
+    file is parsed by numpy's reader, values are only normalized per distinct
+    value and the rows are split per crypto with one sort. Returns a
+    PredictionSeries per crypto.
+    """
+
+    with open(path, newline="") as f:
+        header = [name.strip().lower() for name in next(csv.reader(f), [])]
+    columns = [
+        column(header, "crypto", "c"), column(header, "position", "p"),
+        column(header, "elapsed_time(min)", "et"), column(header, "inserted_at", "ia")
+    ]
+    data = np.loadtxt(path, delimiter=",", dtype=str, skiprows=1, usecols=columns, quotechar='"', ndmin=2)
+    return split_predictions(data)
+
+
+def load_prediction_history(dbname:str, start:int=None, end:int=None) -> dict:
+    """Reads prediction snapshots from the collector's `pred_history` table.
+
+    `start` / `end` are epoch seconds, only the day partitions between them are
+    read. Returns a PredictionSeries per crypto, as `load_predictions`.
+    """
+
+    sql = "SELECT c, p, CAST(et AS TEXT), ca FROM pred_history"
+    where, params = [], []
+    if start is not None:
+        where.append("d >= ? AND ca >= ?")
+        params += [int(start) // 86400, int(start)]
+    if end is not None:
+        where.append("d <= ? AND ca <= ?")
+        params += [int(end) // 86400, int(end)]
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    with sqlite3.connect(f"file:{dbname}?mode=ro", uri=True) as db:
+        rows = db.execute(sql, params).fetchall()
+    data = np.array([["" if v is None else str(v) for v in row] for row in rows], dtype=str).reshape(-1, 4)
+    return split_predictions(data)
+
+
+def split_predictions(data:np.ndarray) -> dict:
+    # (crypto, position, elapsed, time) string columns to a PredictionSeries per crypto
+    if not len(data):
+        return {}
+
+    cryptos, crypto_idx = np.unique(data[:, 0], return_inverse=True)
+    # the same crypto may be written in another case, merge them
+    cryptos, merged_idx = np.unique(np.char.lower(np.char.strip(cryptos)), return_inverse=True)
+    crypto_idx = merged_idx[crypto_idx]
+    positions, position_idx = np.unique(data[:, 1], return_inverse=True)
+    codes = np.array([POSITIONS.get(p.strip().lower(), NONE) for p in positions], dtype=np.int8)[position_idx]
+    # `-` and empty cells are the feed's way of saying there is no signal
+    elapsed = data[:, 2]
+    elapsed = np.where((elapsed == "-") | (elapsed == ""), "nan", elapsed).astype(np.float64)
+    t = data[:, 3].astype(np.float64).astype(np.int64)
+
+    order = np.argsort(crypto_idx, kind="stable")
+    starts = np.flatnonzero(np.diff(crypto_idx[order], prepend=-1))
+    series = {}
+    for group in np.split(order, starts[1:]):
+        name = str(cryptos[crypto_idx[group[0]]])
+        if name:
+            series[name] = PredictionSeries(name, t[group], codes[group], elapsed[group])
+    return series
+
+
+def kline_seconds(open_time:np.ndarray) -> np.ndarray:
+    # binance vision files are in milliseconds, the spot ones in microseconds since 2025
+    if len(open_time) and open_time.max() > 10 ** 14:
+        return open_time // 1000000
+    if len(open_time) and open_time.max() > 10 ** 11:
+        return open_time // 1000
+    return open_time
+
+
+def load_klines(symbol:str, paths:list) -> PriceSeries:
+    """Reads binance kline csv files (open_time, open, high, low, close, ...), with or without a header."""
+
+    chunks = []
+    for path in paths:
+        with open(path) as f:
+            first = f.readline()
+        skip = 0 if first[:1].isdigit() else 1
+        data = np.loadtxt(path, delimiter=",", usecols=(0, 2, 3, 4), skiprows=skip, ndmin=2, dtype=np.float64)
+        chunks.append(data)
+    data = np.concatenate(chunks) if chunks else np.empty((0, 4))
+    return PriceSeries(
+        symbol, kline_seconds(data[:, 0].astype(np.int64)), low=data[:, 2], high=data[:, 1], close=data[:, 3]
+    )
+
+
+def load_price_dir(kline_dir:str, symbols:list) -> dict:
+    """PriceSeries per symbol from the `<SYMBOL>-<interval>-<date>.csv` files of `kline_dir`."""
+
+    prices = {}
+    for symbol in symbols:
+        paths = sorted(glob.glob(os.path.join(kline_dir, f"{symbol}-*.csv")) + glob.glob(os.path.join(kline_dir, f"{symbol}.csv")))
+        if paths:
+            prices[symbol] = load_klines(symbol, paths)
+    return prices
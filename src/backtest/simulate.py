@@ -0,0 +1,180 @@
+import numpy as np
+
+from data import NONE, PredictionSeries, PriceSeries
+
+
+DEFAULT_BUY_DELAY = 0
+DEFAULT_ELAPSED_TIME_EXP = 60
+DEFAULT_AMOUNT = 1
+# binance spot taker / maker fee without BNB discount
+DEFAULT_FEE_RATE = 0.001
+# seconds from a snapshot to the order resting on the book, poll interval plus latency
+DEFAULT_FILL_DELAY = 5
+# how long a bid rests before it is cancelled, bid_retry x the poll_bid cap of the bot
+DEFAULT_BID_TIMEOUT = 25
+# how long the sell walks down the ask levels before it takes the best ask
+DEFAULT_SELL_TIMEOUT = 100
+DEFAULT_BID_OFFSET = 0.0
+DEFAULT_ASK_OFFSET = 0.001
+
+TRADE_DTYPE = np.dtype([
+    ("signal_t", np.int64),
+    ("buy_t", np.int64),
+    ("sell_t", np.int64),
+    ("buy_price", np.float64),
+    ("sell_price", np.float64),
+    ("quantity", np.float64),
+    ("fees", np.float64),
+    ("pnl", np.float64),
+    ("open", np.bool_),
+])
+
+
+class StrategyParams:
+    """The `Bot.run_spot` settings plus the fill model of the simulation."""
+
+    def __init__(self, buy_delay:float=DEFAULT_BUY_DELAY, elapsed_time_exp:float=DEFAULT_ELAPSED_TIME_EXP,
+                    amount:float=DEFAULT_AMOUNT, fee_rate:float=DEFAULT_FEE_RATE, fill_delay:float=DEFAULT_FILL_DELAY,
+                    bid_timeout:float=DEFAULT_BID_TIMEOUT, sell_timeout:float=DEFAULT_SELL_TIMEOUT,
+                    bid_offset:float=DEFAULT_BID_OFFSET, ask_offset:float=DEFAULT_ASK_OFFSET):
+        self.buy_delay = buy_delay
+        self.elapsed_time_exp = elapsed_time_exp
+        self.amount = amount
+        self.fee_rate = fee_rate
+        self.fill_delay = fill_delay
+        self.bid_timeout = bid_timeout
+        self.sell_timeout = sell_timeout
+        self.bid_offset = bid_offset
+        self.ask_offset = ask_offset
+
+    def __repr__(self):
+        return f"StrategyParams - buy_delay:{self.buy_delay} elapsed_time_exp:{self.elapsed_time_exp}"
+
+
+def load_params(config) -> StrategyParams:
+    trading = config['trading'] if config.has_section('trading') else {}
+    backtest = config['backtest'] if config.has_section('backtest') else {}
+    return StrategyParams(
+        buy_delay=float(trading.get('buy_delay', DEFAULT_BUY_DELAY)),
+        elapsed_time_exp=float(trading.get('elapsed_time_exp', DEFAULT_ELAPSED_TIME_EXP)),
+        amount=float(trading.get('amount', None) or DEFAULT_AMOUNT),
+        fee_rate=float(backtest.get('fee_rate', DEFAULT_FEE_RATE)),
+        fill_delay=float(backtest.get('fill_delay', DEFAULT_FILL_DELAY)),
+        bid_timeout=float(backtest.get('bid_timeout', DEFAULT_BID_TIMEOUT)),
+        sell_timeout=float(backtest.get('sell_timeout', DEFAULT_SELL_TIMEOUT)),
+        bid_offset=float(backtest.get('bid_offset', DEFAULT_BID_OFFSET)),
+        ask_offset=float(backtest.get('ask_offset', DEFAULT_ASK_OFFSET)),
+    )
+
+
+def first_at_or_after(index:np.ndarray, start:int) -> int:
+    # first element of the sorted `index` >= start, -1 when there is none
+    k = np.searchsorted(index, start, side="left")
+    return int(index[k]) if k < len(index) else -1
+
+
+def simulate_pair(predictions:PredictionSeries, prices:PriceSeries, params:StrategyParams) -> tuple:
+    """Replays the spot strategy of one pair, returns (trades, unfilled bids).
+
+    The entry and exit signals of every snapshot and the bars of every order are
+    computed as arrays up front, only the walk from one trade to the next is a
+    loop and each step is a binary search. An order is priced from the last bar
+    closed when it is placed and only the bars opening after that can fill it: a
+    bid fills when one of their lows reaches it, a sell at the ask when a high
+    reaches it and at the latest close at the end of its window otherwise, as the
+    bot walks down to the best ask. Snapshots whose orders would fall past the
+    klines or into a gap are skipped. Use the finest klines available, with bars
+    longer than the bid window no bid can fill.
+    """
+
+    t, position, elapsed = predictions.t, predictions.position, predictions.elapsed
+    placed = t + params.fill_delay
+    tradable = ~np.isnan(elapsed)
+
+    # the bar each order is priced from, the bars of its window and the last one closed when it ends
+    price_bar = prices.closed_bar_at(placed)
+    first_bar = prices.first_bar_after(placed)
+    bid_end = prices.bar_at(placed + params.bid_timeout)
+    sell_end = prices.bar_at(placed + params.sell_timeout)
+    sell_close = prices.closed_bar_at(placed + params.sell_timeout)
+
+    entries = np.flatnonzero(tradable & (elapsed > params.buy_delay) & (price_bar >= 0) & (bid_end >= 0))
+    exits = np.flatnonzero(
+        ((position == NONE) | ~tradable | (elapsed >= params.elapsed_time_exp))
+        & (price_bar >= 0) & (sell_end >= 0) & (sell_close >= 0)
+    )
+
+    trades = []
+    unfilled = 0
+    quantity = params.amount
+    i = 0
+    while True:
+        e = first_at_or_after(entries, i)
+        if e < 0:
+            break
+
+        bid = prices.close[price_bar[e]] * (1 - params.bid_offset)
+        b0, b1 = first_bar[e], bid_end[e]
+        filled = prices.low[b0:b1 + 1] <= bid
+        if not filled.any():
+            # cancelled, the bot looks at the predictions again after the bid window
+            unfilled += 1
+            i = max(e + 1, int(np.searchsorted(t, placed[e] + params.bid_timeout, side="left")))
+            continue
+
+        buy_t = int(prices.t[b0 + int(np.argmax(filled))])
+        x = first_at_or_after(exits, max(e + 1, int(np.searchsorted(t, buy_t, side="left"))))
+        if x < 0:
+            # still holding at the end of the history, valued at the last close
+            sell_price, sell_t, is_open = prices.close[-1], int(prices.t[-1]), True
+        else:
+            ask = prices.close[price_bar[x]] * (1 + params.ask_offset)
+            s0, s1 = first_bar[x], sell_end[x]
+            hit = prices.high[s0:s1 + 1] >= ask
+            if hit.any():
+                sell_price, sell_t = ask, int(prices.t[s0 + int(np.argmax(hit))])
+            else:
+                sell_price, sell_t = prices.close[sell_close[x]], int(placed[x] + params.sell_timeout)
+            is_open = False
+
+        fees = params.fee_rate * quantity * (bid + sell_price)
+        trades.append((t[e], buy_t, sell_t, bid, sell_price, quantity, fees, quantity * (sell_price - bid) - fees, is_open))
+        if x < 0:
+            break
+        i = max(x + 1, int(np.searchsorted(t, sell_t, side="left")))
+
+    return np.array(trades, dtype=TRADE_DTYPE), unfilled
+
+
+def summarize(symbol:str, trades:np.ndarray, unfilled:int) -> dict:
+    """P&L, drawdown and hit rate of the trades of one pair."""
+
+    closed = trades[~trades["open"]]
+    equity = np.cumsum(trades["pnl"])
+    drawdown = np.max(np.maximum.accumulate(np.concatenate(([0.0], equity)))[1:] - equity) if len(equity) else 0.0
+    invested = np.sum(trades["buy_price"] * trades["quantity"])
+    return {
+        "symbol": symbol,
+        "trades": len(trades),
+        "open": int(trades["open"].sum()),
+        "unfilled": unfilled,
+        "hit_rate": float(np.mean(closed["pnl"] > 0)) if len(closed) else 0.0,
+        "pnl": float(equity[-1]) if len(equity) else 0.0,
+        "fees": float(np.sum(trades["fees"])),
+        "return": float(equity[-1] / invested) if len(equity) and invested else 0.0,
+        "max_drawdown": float(drawdown),
+        "avg_hold_min": float(np.mean(closed["sell_t"] - closed["buy_t"]) / 60) if len(closed) else 0.0,
+    }
+
+
+def run_backtest(predictions:dict, prices:dict, params:StrategyParams, quote:str="USDT") -> list:
+    """Summaries of every crypto that has both predictions and prices."""
+
+    results = []
+    for crypto in sorted(predictions):
+        symbol = f"{crypto.upper()}{quote}"
+        if symbol not in prices or not len(prices[symbol]):
+            continue
+        trades, unfilled = simulate_pair(predictions[crypto], prices[symbol], params)
+        results.append(summarize(symbol, trades, unfilled))
+    return results
@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+"""Runs the micro-benchmarks and compares their results.
+
+    python benchmarks/bench.py run --output=baseline.json
+    python benchmarks/bench.py compare baseline.json current.json --threshold=0.1
+
+Every suite runs in its own interpreter, the collector and the bot both have a
+top level `db` module. `compare` exits with 1 when a benchmark got slower than
+`threshold`, so it can gate a change.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import platform
+import subprocess
+
+from harness import format_time
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SUITES = ("bench_tradingbot", "bench_collector")
+DEFAULT_THRESHOLD = 0.1
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(suites:list, name_filter:str=None) -> dict:
+    results = {}
+    for suite in suites:
+        args = [sys.executable, os.path.join(BENCH_DIR, f"{suite}.py")] + ([name_filter] if name_filter else [])
+        proc = subprocess.run(args, cwd=BENCH_DIR, stdout=subprocess.PIPE, check=True, text=True)
+        results.update(json.loads(proc.stdout))
+    return {
+        "meta": {
+            "time": int(time.time()),
+            "commit": get_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+        },
+        "results": results
+    }
+
+
+def compare(baseline:dict, current:dict, threshold:float) -> int:
+    """Prints the median change of every benchmark, returns the number of regressions."""
+
+    regressions = 0
+    base_results, results = baseline["results"], current["results"]
+    print(f"{'benchmark':<52} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name in sorted(set(base_results) | set(results)):
+        if name not in results or name not in base_results:
+            side = "baseline" if name in base_results else "current"
+            print(f"{name:<52} only in {side}")
+            continue
+        before, after = base_results[name]["median"], results[name]["median"]
+        change = after / before - 1
+        flag = ""
+        if change > threshold:
+            flag = " REGRESSION"
+            regressions += 1
+        print(f"{name:<52} {format_time(before):>12} {format_time(after):>12} {change:>+8.1%}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="tradingbot benchmarks",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="python benchmarks/bench.py run --output=baseline.json"
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--output', dest='output', type=str, help='json file to write the results to')
+    run_parser.add_argument('--suite', dest='suites', action='append', choices=SUITES, help='suite to run, all by default')
+    run_parser.add_argument('--filter', dest='name_filter', type=str, help='only run benchmarks whose name contains it')
+    run_parser.add_argument('--baseline', dest='baseline', type=str, help='compare the results against this json file')
+    run_parser.add_argument('--threshold', dest='threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = subparsers.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline', type=str)
+    compare_parser.add_argument('current', type=str)
+    compare_parser.add_argument('--threshold', dest='threshold', type=float, default=DEFAULT_THRESHOLD,
+                                    help='slowdown of the median counted as a regression, 0.1 = 10%%')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        current = run(args.suites or SUITES, args.name_filter)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(current, f, indent=2)
+        if not args.baseline:
+            sys.exit(0)
+    else:
+        with open(args.current) as f:
+            current = json.load(f)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    sys.exit(1 if compare(baseline, current, args.threshold) else 0)
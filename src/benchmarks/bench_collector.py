@@ -0,0 +1,62 @@
+"""Benchmarks of the collector's feed transform, run by `bench.py`."""
+
+import atexit
+import tempfile
+import functools
+
+from harness import Benchmark, add_path, temp_db, main
+
+add_path("collector")
+
+from db import SQLiteDB
+from feeds.cpp import CryptoPricePredictions
+
+
+FEED_SIZES = (10, 1000, 100000)
+
+
+def feed_rows(size:int, price:float) -> list:
+    # parsed csv rows as `CryptoPricePredictions.parse` yields them
+    return [{
+        "crypto": f"sym{i}", "position": "long", "trade_time(utc)": "2023-11-14 22:13:20",
+        "elapsed_time(min)": "30", "entry_price": "10.5", "target_price": "11.5",
+        "current_price": f"{price + i % 100 / 100:.2f}", "price_spread": "0.2", "amount": "100",
+        "current_profit": "1.2", "daily_profit": "0.4", "monthly_profit": "3.1"
+    } for i in range(size)]
+
+
+def transform_fixture(tmpdir:str, size:int) -> tuple:
+    cpp = CryptoPricePredictions(config={}, db=SQLiteDB(db=temp_db(tmpdir, f"collector-{size}")))
+    # two feeds with different prices so every call rewrites the rows, like a live feed
+    feeds = [feed_rows(size, 10), feed_rows(size, 20)]
+    cpp.transform(feeds[0])
+    return cpp, feeds
+
+
+def benchmarks() -> list:
+    tmpdir = tempfile.TemporaryDirectory()
+    atexit.register(tmpdir.cleanup)
+
+    result = []
+    for size in FEED_SIZES:
+        # built once, by the first of the two benchmarks that runs
+        fixture = functools.cache(functools.partial(transform_fixture, tmpdir.name, size))
+
+        def make_transform(fixture=fixture):
+            cpp, feeds = fixture()
+            calls = iter(range(10 ** 9))
+            return lambda: cpp.transform(feeds[next(calls) % 2]), None
+
+        def make_unchanged(fixture=fixture):
+            cpp, feeds = fixture()
+            # an unchanged feed only compares the rows
+            return lambda: cpp.transform(feeds[0]), lambda: cpp.transform(feeds[0])
+
+        repeat = 3 if size >= 100000 else 7
+        result.append(Benchmark(f"CryptoPricePredictions.transform[{size}]", make=make_transform, repeat=repeat))
+        result.append(Benchmark(f"CryptoPricePredictions.transform[{size},unchanged]", make=make_unchanged, repeat=repeat))
+    return result
+
+
+if __name__ == "__main__":
+    main(benchmarks)
@@ -0,0 +1,130 @@
+"""Benchmarks of the bot's table models and log rendering, run by `bench.py`."""
+
+import io
+import atexit
+import logging
+import tempfile
+import functools
+
+from harness import Benchmark, add_path, get_logger, temp_db, main
+
+add_path("tradingbot")
+
+from db import SQLiteDB
+from models import PredTable, TradingTable
+from render import log_table
+from fixedpoint import Fixed
+
+
+SYMBOLS = 50
+POSITIONS = 1000
+PREDICTIONS = 1000
+RENDER_ROWS = 20
+PRED_FIELDS = list(PredTable().dmapper.values())
+
+
+def load_db(tmpdir:str, logger) -> SQLiteDB:
+    db = SQLiteDB(db=temp_db(tmpdir, "tradingbot"), logger=logger)
+    db.insert_many(
+        "INSERT INTO trading_table (oid, s, si, st, a, bp, cp, ut, tty, ia) VALUES (?, ?, 'BUY', 'NEW', 1, 10.5, 10.5, 0, 'spot', ?)",
+        ((i, f"SYM{i % SYMBOLS}USDT", i) for i in range(POSITIONS))
+    )
+    db.insert_many(
+        "INSERT INTO pred_table (c, p, tt, et, ep, tp, cp, ps, a, cpr, dp, mp, ia) "
+        "VALUES (?, 'long', 1700000000, 30, 10.5, 11.5, 10.7, 0.2, 100, 1.2, 0.4, 3.1, ?)",
+        ((f"sym{i}", i) for i in range(PREDICTIONS))
+    )
+    return db
+
+
+class TableFixture:
+    """The db with the tables filled and one open position to update."""
+
+    def __init__(self, tmpdir:str):
+        logger = get_logger("bench")
+        self.db = load_db(tmpdir, logger)
+        self.trading_table = TradingTable(logger)
+        self.pred_table = PredTable()
+        self.order_ids = iter(range(POSITIONS, 10 ** 9))
+        self.position = {
+            "symbol": "SYM7USDT", "tradingType": "spot", "side": "BUY", "status": "NEW",
+            "amount": 1, "buyPrice": 10.5, "currentPrice": 10.5, "updateTime": 1700000000, "tradeType": "spot"
+        }
+        self.transaction_id = self.trading_table.save_requested_position(
+            self.db, dict(self.position, orderId=next(self.order_ids))
+        )["id"]
+
+
+def benchmarks() -> list:
+    tmpdir = tempfile.TemporaryDirectory()
+    atexit.register(tmpdir.cleanup)
+
+    # only built when one of the table benchmarks runs
+    tables = functools.cache(lambda: TableFixture(tmpdir.name))
+
+    def make_insert():
+        t = tables()
+        db, trading_table, position, order_ids = t.db, t.trading_table, t.position, t.order_ids
+        return lambda: trading_table.save_requested_position(db, dict(position, orderId=next(order_ids))), None
+
+    def make_update():
+        t = tables()
+        db, trading_table, transaction_id = t.db, t.trading_table, t.transaction_id
+        prices = iter(range(10 ** 9))
+
+        def update_position():
+            trading_table.save_requested_position(db, {
+                "transactionId": transaction_id, "status": "FILLED", "currentPrice": 10 + next(prices) % 100 / 100
+            })
+        return update_position, None
+
+    def make_position_data(**kwargs):
+        def make():
+            db, trading_table = tables().db, tables().trading_table
+            return lambda: trading_table.get_position_data(db, "SYM7USDT", "spot", **kwargs), None
+        return make
+
+    def make_predictions():
+        db, pred_table = tables().db, tables().pred_table
+        return lambda: pred_table.deserialize(pred_table.get_predictions(db, "sym7")), None
+
+    stream = io.StringIO()
+    render_logger = logging.getLogger("bench.render")
+    render_logger.addHandler(logging.StreamHandler(stream))
+    render_logger.propagate = False
+    rows = [{field: f"{field}-{i}" for field in PRED_FIELDS} for i in range(RENDER_ROWS)]
+
+    def reset_stream():
+        stream.seek(0)
+        stream.truncate()
+
+    def render(level):
+        def fn():
+            render_logger.setLevel(level)
+            log_table(render_logger, rows, PRED_FIELDS)
+        return fn
+
+    def profit():
+        # get_profit's arithmetic on the values it reads back from the db and the exchange
+        buy_qty = Fixed.parse(0.0012345678)
+        buy_value = buy_qty * Fixed.parse("43000.12000000")
+        sell_value = Fixed.parse(0.0012345) * Fixed.parse("43100.50000000")
+        return (buy_qty * Fixed.parse("43050.00000000") - buy_value).format(8), (sell_value - buy_value).format(8)
+
+    step_size = Fixed.parse("0.00001000").normalize()
+
+    return [
+        Benchmark("TradingTable.save_requested_position[insert]", make=make_insert),
+        Benchmark("TradingTable.save_requested_position[update]", make=make_update),
+        Benchmark("TradingTable.get_position_data[symbol]", make=make_position_data()),
+        Benchmark("TradingTable.get_position_data[orderId]", make=make_position_data(orderId=POSITIONS // 2)),
+        Benchmark("PredTable.get_predictions+deserialize", make=make_predictions),
+        Benchmark(f"render_tbl[table,{RENDER_ROWS}]", render(logging.DEBUG), setup=reset_stream),
+        Benchmark(f"render_tbl[kv,{RENDER_ROWS}]", render(logging.INFO), setup=reset_stream),
+        Benchmark("Fixed[profit]", profit),
+        Benchmark("Fixed.quantize+format[stepSize]", lambda: Fixed.parse(0.0012345678).quantize(step_size).format(8)),
+    ]
+
+
+if __name__ == "__main__":
+    main(benchmarks)
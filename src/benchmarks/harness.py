@@ -0,0 +1,122 @@
+import os
+import sys
+import gc
+import json
+import time
+import logging
+import statistics
+
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_REPEAT = 7
+# per sample, the number of calls is raised until a sample takes at least this long
+DEFAULT_MIN_SAMPLE_TIME = 0.05
+
+
+def add_path(*dirs) -> None:
+    # the suites import the app modules the way the apps do, from their own directory
+    for d in dirs:
+        sys.path.insert(0, os.path.join(SRC_DIR, d))
+
+
+def get_logger(name:str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def temp_db(tmpdir:str, name:str) -> str:
+    add_path("sql")
+    from migrate import migrate
+
+    dbname = os.path.join(tmpdir, f"{name}.db")
+    migrate(dbname)
+    return dbname
+
+
+class Benchmark:
+    """Times `fn` in samples of `number` calls, `setup` runs before each sample outside the timing.
+
+    Benchmarks with expensive fixtures pass `make` instead, it returns the
+    (fn, setup) pair and is only called once the benchmark runs, so the ones
+    left out by `--filter` never build them.
+    """
+
+    def __init__(self, name:str, fn=None, setup=None, number:int=None, repeat:int=DEFAULT_REPEAT, make=None):
+        self.name = name
+        self.fn = fn
+        self.setup = setup
+        self.number = number
+        self.repeat = repeat
+        self.make = make
+
+    def __repr__(self):
+        return f"Benchmark - {self.name}"
+
+    def sample(self, number:int) -> float:
+        if self.setup:
+            self.setup()
+        fn = self.fn
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            return time.perf_counter() - start
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def calibrate(self) -> int:
+        number = 1
+        while True:
+            elapsed = self.sample(number)
+            if elapsed >= DEFAULT_MIN_SAMPLE_TIME or number >= 1000000:
+                return number
+            number *= 10 if elapsed < DEFAULT_MIN_SAMPLE_TIME / 10 else 2
+
+    def run(self) -> dict:
+        if self.make:
+            self.fn, self.setup = self.make()
+            self.make = None
+        number = self.number or self.calibrate()
+        # seconds per call of each sample
+        times = [self.sample(number) / number for _ in range(self.repeat)]
+        return {
+            "median": statistics.median(times),
+            "min": min(times),
+            "mean": statistics.fmean(times),
+            "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+            "number": number,
+            "repeat": self.repeat,
+        }
+
+
+def run_suite(benchmarks:list, name_filter:str=None) -> dict:
+    results = {}
+    for benchmark in benchmarks:
+        if name_filter and name_filter not in benchmark.name:
+            continue
+        results[benchmark.name] = benchmark.run()
+        print(f"{benchmark.name:<52} {format_time(results[benchmark.name]['median']):>12}", file=sys.stderr)
+    return results
+
+
+def main(benchmarks) -> None:
+    """Entry point of a suite module, prints the results as json for `bench.py`."""
+
+    name_filter = sys.argv[1] if len(sys.argv) > 1 else None
+    # stdout carries the results only, anything the app code prints goes to stderr
+    out, sys.stdout = sys.stdout, sys.stderr
+    json.dump(run_suite(benchmarks(), name_filter), out)
+
+
+def format_time(seconds:float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
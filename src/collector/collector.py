@@ -1,17 +1,66 @@
 import argparse
 import configparser
 
+import requests
+
 from db import SQLiteDB
 from feeds.cpp import CryptoPricePredictions
+from scheduler import Scheduler, DEFAULT_INTERVAL, DEFAULT_JITTER
+from notify import PredictionNotifier, DEFAULT_NOTIFY_DIR
+from history import load_history
+
+
 
+def load_notifier() -> PredictionNotifier:
+    notify_dir = config['settings'].get('notify_dir', DEFAULT_NOTIFY_DIR) if config.has_section('settings') else DEFAULT_NOTIFY_DIR
+    return PredictionNotifier(notify_dir=notify_dir)
 
 
-def cpp_downloader():
-    
-    db = SQLiteDB(db=config['database']['dbname'])
-    cpp = CryptoPricePredictions(config=config, db=db)
+def cpp_downloader(cpp:CryptoPricePredictions=None, notifier:PredictionNotifier=None):
+
+    if not cpp:
+        db = SQLiteDB(db=config['database']['dbname'], config=config['database'])
+        cpp = CryptoPricePredictions(config=config, db=db)
+    if not notifier:
+        notifier = load_notifier()
     raw_data = cpp.download()
-    cpp.transform(raw_data=raw_data)
+    if raw_data is None:
+        return
+    cryptos = cpp.transform(raw_data=raw_data)
+    # validators are only saved after the rows are written, a failed write refetches
+    cpp.save_feed_state()
+    if cryptos:
+        sent = notifier.publish(cryptos)
+        print(f"[notify] - {len(cryptos)} crypto(s) updated, notified {sent} bot(s)")
+
+
+def cpp_daemon(interval:float=None):
+
+    feed_conf = config['feedsource'] if config.has_section('feedsource') else {}
+    if not interval:
+        interval = float(feed_conf.get('interval', DEFAULT_INTERVAL))
+    jitter = float(feed_conf.get('jitter', DEFAULT_JITTER))
+
+    # keep the db connection and the http session (tcp/tls) warm across ticks
+    db = SQLiteDB(db=config['database']['dbname'], config=config['database'])
+    with requests.Session() as session:
+        cpp = CryptoPricePredictions(config=config, db=db, session=session)
+        notifier = load_notifier()
+        history = load_history(db, config)
+        scheduler = Scheduler(interval=interval, jitter=jitter)
+        print(f"[daemon] - {scheduler} - {history}")
+
+        def job():
+            cpp_downloader(cpp, notifier)
+            history.maybe_compact()
+        scheduler.run(job)
+
+
+def compact_history():
+    db = SQLiteDB(db=config['database']['dbname'], config=config['database'])
+    history = load_history(db, config)
+    print(f"[history] - {history} - {history.compact()}")
+
 
 if __name__ == "__main__":
 
@@ -35,6 +84,27 @@ if __name__ == "__main__":
         help='config path'
     )
 
+    parser.add_argument(
+        '--daemon',
+        dest='daemon',
+        action='store_true',
+        help='keep running and download on an interval'
+    )
+
+    parser.add_argument(
+        '--interval',
+        dest='interval',
+        type=float,
+        help='daemon interval in seconds, overrides [feedsource] interval'
+    )
+
+    parser.add_argument(
+        '--compact',
+        dest='compact',
+        action='store_true',
+        help='downsample / drop the old pred_history days and exit'
+    )
+
     args = parser.parse_args()
     config_path = "/opt/config.ini"
     if args.config:
@@ -43,7 +113,11 @@ if __name__ == "__main__":
     config = configparser.ConfigParser()
     config.read(config_path)
 
-    if args.downloader == "cpp":
+    if args.compact:
+        compact_history()
+    elif args.downloader == "cpp" and args.daemon:
+        cpp_daemon(interval=args.interval)
+    elif args.downloader == "cpp":
         cpp_downloader()
     else:
         print(f"Not supported..")
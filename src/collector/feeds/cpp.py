@@ -2,14 +2,42 @@ import os
 import requests
 import logging
 import sqlite3
+import csv
+import hashlib
 import datetime
+import time
 from prettytable import PrettyTable
 
+PRED_COLUMNS = ['c', 'p', 'tt', 'et', 'ep', 'tp', 'cp', 'ps', 'a', 'cpr', 'dp', 'mp']
+UPSERT_PRED_TABLE_SQL = (
+    "INSERT INTO pred_table ({columns}, ia) VALUES ({values}, :ia) "
+    "ON CONFLICT(c) DO UPDATE SET {updates}, ia = excluded.ia "
+    "WHERE {changed}"
+).format(
+    columns=", ".join(PRED_COLUMNS),
+    values=", ".join(f":{c}" for c in PRED_COLUMNS),
+    updates=", ".join(f"{c} = excluded.{c}" for c in PRED_COLUMNS[1:]),
+    changed=" OR ".join(f"pred_table.{c} IS NOT excluded.{c}" for c in PRED_COLUMNS[1:])
+)
+
+# every fetch is also appended to the history, `d` is the utc day partition of the collection time
+INSERT_PRED_HISTORY_SQL = (
+    "INSERT OR IGNORE INTO pred_history (d, c, ca, {columns}) VALUES (:ia / 86400, :c, :ia, {values})"
+).format(
+    columns=", ".join(PRED_COLUMNS[1:]),
+    values=", ".join(f":{c}" for c in PRED_COLUMNS[1:])
+)
+
+# bytes read from the streamed feed at a time
+CHUNK_SIZE = 65536
+# seconds to connect, and to wait for each read as well as for the whole body
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
 
 class CryptoPricePredictions:
     
-    def __init__(self, config: object, db: object):
+    def __init__(self, config: object, db: object, session: object=None):
 
         self.feed_source = 'https://crypto-price-prediction.com/prediction_data/pred_table.csv'
         self.mapper = {
@@ -28,22 +56,61 @@ class CryptoPricePredictions:
         }
         self.db = db
         self.config = config
+        self.debug = int(config['app'].get('debug', 0)) if 'app' in config else 0
+        feed_conf = config['feedsource'] if 'feedsource' in config else {}
+        self.history = int(feed_conf.get('history', 1))
+        # a hung request would block the daemon's scheduler, it fails the tick instead
+        self.connect_timeout = float(feed_conf.get('connect_timeout', DEFAULT_CONNECT_TIMEOUT))
+        self.read_timeout = float(feed_conf.get('read_timeout', DEFAULT_READ_TIMEOUT))
+        # shared requests.Session when running as a daemon
+        self.session = session
+        # validators of the last fetched body, saved once the rows are written
+        self.feed_state = None
 
     def convert_to_epoch(self, timestamp) -> int:
         epoch  = datetime.datetime(1970, 1, 1)
         return int((datetime.datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S') - epoch).total_seconds())
 
-    def is_exist(self, crypto: str) -> bool:
-        r = self.db.select_one(f"SELECT count(*) as count  FROM pred_table WHERE c = '{crypto}'")
-        return True if r['count'] else False
+    def parse(self, lines) -> list:
+        # stream rows out of the csv feed, `lines` can be any iterable of text lines
+        reader = csv.reader(line for line in lines if line)
+        header = next(reader, None)
+        if not header:
+            return
+        supported_columns = [col.lower() for col in header if col]
+        for row in reader:
+            item = {}
+            for i, d in enumerate(row):
+                if not d or i >= len(supported_columns): continue
+                item[supported_columns[i]] = d.strip().lower()
+            if item:
+                yield item
+
+    def iter_body(self, response, hasher) -> object:
+        # text lines of the streamed body as they arrive, every chunk also goes through `hasher`
+        pending = b""
+        deadline = time.monotonic() + self.read_timeout
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            # the read timeout is per socket read, a feed trickling in is cut off here
+            if time.monotonic() > deadline:
+                raise requests.exceptions.ReadTimeout(f"feed body not read within {self.read_timeout}s")
+            hasher.update(chunk)
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                yield line.rstrip(b"\r").decode()
+        if pending:
+            yield pending.rstrip(b"\r").decode()
 
-    def transform(self, raw_data: list) -> None:
-      
-        insert_rows = []
-        update_rows = []        
+    def transform(self, raw_data: list) -> list:
+        """Upserts the feed rows, returns the cryptos whose pred_table row was inserted or changed."""
+
+        inserted_at = int(time.time())
+        rows = []
         for item in raw_data:
+            if not item.get("crypto", None): continue
             # map fields
-            mapped_data = {self.mapper[k]: item[k] for k in item}
+            mapped_data = {self.mapper[k]: item[k] for k in item if k in self.mapper}
             # normalize mapping with no values
             for _ in self.mapper:
                 k = self.mapper[_]
@@ -51,69 +118,104 @@ class CryptoPricePredictions:
                     mapped_data[k] = ''
                 elif _ == 'trade_time(utc)':
                     mapped_data[k] = self.convert_to_epoch(mapped_data[k])
-            
-            mapped_data['ia'] = "strftime(\'%s\',\'now\')"
-            # check if crypto already exists
-            is_exist = self.is_exist(item["crypto"])
-            if is_exist:
-                sql = "UPDATE pred_table SET "
-                sql += "p='{p}', tt='{tt}', et={et}, ep={ep}, ".format(**mapped_data)
-                sql += "tp={tp}, cp={cp}, ps={ps}, a={a}, ".format(**mapped_data)
-                sql += "cpr={cpr}, dp={dp}, mp={mp}, ia={ia} ".format(**mapped_data)
-                sql += "WHERE c = '{c}'".format(**mapped_data)
-                update_rows.append(sql)
-            else:
-                insert_rows.append("('{c}', '{p}', '{tt}', {et}, {ep}, {tp}, {cp}, {ps}, {a}, {cpr}, {dp}, {mp}, {ia})".format(**mapped_data))
-
-        if update_rows:
-            for sql in update_rows:
-                # print(f"[transform] - update => {sql}")
-                self.db.insert(sql)
-
-        if insert_rows:
-            sql = "INSERT INTO pred_table (c, p, tt, et, ep, tp, "
-            sql += "cp, ps, a, cpr, dp, mp, ia) VALUES "
-            sql += ", ".join(insert_rows)
-            # print(f"[transform] - insert new => {sql}")
-            self.db.insert(sql)
-
-    def download(self, feed_source:str=None) -> None:
+
+            mapped_data['ia'] = inserted_at
+            rows.append(mapped_data)
+
+        if not rows:
+            return []
+
+        # single transaction upsert, rows whose values didn't change are left untouched,
+        # the history gets every fetch in the same transaction
+        if self.history:
+            changed, _ = self.db.insert_batch([(UPSERT_PRED_TABLE_SQL, rows), (INSERT_PRED_HISTORY_SQL, rows)])
+        else:
+            changed = self.db.insert_many(UPSERT_PRED_TABLE_SQL, rows)
+        if not changed:
+            return []
+        # the upsert only stamps `ia` on the rows it wrote, the unchanged ones keep their older fetch time
+        written = {row['c'] for row in self.db.select("SELECT c FROM pred_table WHERE ia = ?", (inserted_at,))}
+        return [row['c'] for row in rows if row['c'] in written]
+
+    def get_feed_state(self, url:str) -> dict:
+        return self.db.select_one("SELECT * FROM feed_state WHERE src = ?", (url,)) or {}
+
+    def save_feed_state(self) -> None:
+        if not self.feed_state:
+            return
+        self.db.insert(
+            "INSERT INTO feed_state (src, etag, lm, h, ua) VALUES (:src, :etag, :lm, :h, :ua) "
+            "ON CONFLICT(src) DO UPDATE SET etag = excluded.etag, lm = excluded.lm, h = excluded.h, ua = excluded.ua",
+            self.feed_state
+        )
+        self.feed_state = None
+
+    def download(self, feed_source:str=None) -> list:
+        """Returns the parsed feed rows, or None when the feed didn't change since the last saved fetch.
+
+        Raises requests.Timeout past `connect_timeout` / `read_timeout`, the daemon counts it as a failed tick.
+        """
 
         url = self.feed_source
         if feed_source:
             url = feed_source
 
-        # request url
+        state = self.get_feed_state(url)
+        headers = {"user-agent": USER_AGENT, "content-type": "application/json"}
+        if state.get("etag", None):
+            headers["if-none-match"] = state["etag"]
+        if state.get("lm", None):
+            headers["if-modified-since"] = state["lm"]
+
+        # request url, streamed so the body is parsed and hashed as it arrives
+        timeout = (self.connect_timeout, self.read_timeout)
+        if self.session:
+            return self.read(self.session.get(url, headers=headers, stream=True, timeout=timeout), url, state)
         with requests.Session() as s:
-            response = s.get(url, headers={"user-agent": USER_AGENT, "content-type": "application/json"})
+            return self.read(s.get(url, headers=headers, stream=True, timeout=timeout), url, state)
 
+    def read(self, response, url:str, state:dict) -> list:
         data = []
-        if response.status_code == 200:
-            items = [item.strip('\r') for item in response.content.decode().split('\n') if item]
-            supported_columns = [col.lower() for col in items[0].split(',') if col]
-            for row in items[1:]:
-                if not row: continue
-                item = {}
-                for i, d in enumerate(row.split(",")):
-                    if not d: continue
-                    item[supported_columns[i]] = d.strip().lower()
-                data.append(item)
-
-        # print tables
+        with response:
+            if response.status_code == 304:
+                print(f"[download] - not modified: {url}")
+                return None
+
+            if response.status_code == 200:
+                # parsed while it streams in, the hash is only known once the whole body went through
+                hasher = hashlib.sha256()
+                data = list(self.parse(self.iter_body(response, hasher)))
+                body_hash = hasher.hexdigest()
+                self.feed_state = {
+                    "src": url,
+                    "etag": response.headers.get("etag", None),
+                    "lm": response.headers.get("last-modified", None),
+                    "h": body_hash,
+                    "ua": int(time.time())
+                }
+                if body_hash == state.get("h", None):
+                    # same content served without validators, the parsed rows aren't written
+                    print(f"[download] - unchanged content: {url}")
+                    self.save_feed_state()
+                    return None
+
+        self.render(data)
+        return data
+
+    def render(self, data:list) -> None:
+        # the table is only built when debugging, one key=value line otherwise
+        rows = [row for row in data if row['crypto'] == self.config['trading']['symbol']]
+        if not self.debug:
+            for row in rows:
+                print("[download] - " + " ".join(f"{k}={row.get(k, None) or '-'}" for k in self.mapper))
+            return
+
         tbl = PrettyTable()
         tbl.field_names = [f for f in self.mapper]
-        for row in data:
-            row_vals = []
-            if row['crypto'] != self.config['trading']['symbol']: continue
-            for k in self.mapper:
-                if not row.get(k, None):
-                    row_vals.append('-')
-                else:
-                    row_vals.append(row[k])
-            tbl.add_row(row_vals)
+        for row in rows:
+            tbl.add_row([row.get(k, None) or '-' for k in self.mapper])
         print(f'[download] .. ')
         print(tbl)
-        return data
 
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+import time
+
+
+DAY = 86400
+# days kept at the collection resolution before they are downsampled
+DEFAULT_RAW_DAYS = 7
+# resolution of the downsampled days, the last snapshot of each window is kept
+DEFAULT_STEP = 900
+# days kept at all, 0 keeps the history forever
+DEFAULT_RETENTION_DAYS = 0
+DEFAULT_COMPACT_INTERVAL = 3600
+
+
+class PredictionHistory:
+    """Compaction of the append-only `pred_history` table.
+
+    The collector appends every fetch keyed by (day, crypto, collected_at), the
+    bot keeps reading the latest values from `pred_table`. Days older than
+    `raw_days` are downsampled to the last snapshot per crypto every `step`
+    seconds, once, and are tracked in `pred_history_days`. Days older than
+    `retention_days` are dropped when it is set. Each day is a contiguous range of
+    the primary key, so a pass only touches the days it rewrites.
+    """
+
+    def __init__(self, db, raw_days:int=DEFAULT_RAW_DAYS, step:int=DEFAULT_STEP,
+                    retention_days:int=DEFAULT_RETENTION_DAYS, compact_interval:float=DEFAULT_COMPACT_INTERVAL):
+        self.db = db
+        self.raw_days = raw_days
+        self.step = step
+        self.retention_days = retention_days
+        self.compact_interval = compact_interval
+        self.compacted_at = None
+
+    def __repr__(self):
+        return f"PredictionHistory - raw_days:{self.raw_days} step:{self.step} retention_days:{self.retention_days}"
+
+    def next_day(self, after:int) -> int:
+        # walks the distinct days through the primary key instead of scanning the table
+        row = self.db.select_one("SELECT MIN(d) AS d FROM pred_history WHERE d > ?", (after,))
+        return row["d"] if row else None
+
+    def compact_day(self, day:int) -> int:
+        """Keeps the last snapshot per crypto and `step` window of `day`, returns the rows removed."""
+
+        count_sql = "SELECT COUNT(*) AS n FROM pred_history WHERE d = ?"
+        before = self.db.select_one(count_sql, (day,))["n"]
+        self.db.insert(
+            "DELETE FROM pred_history WHERE d = ? AND (c, ca) NOT IN ("
+            "SELECT c, MAX(ca) FROM pred_history WHERE d = ? GROUP BY c, ca / ?)",
+            (day, day, self.step)
+        )
+        kept = self.db.select_one(count_sql, (day,))["n"]
+        self.db.insert(
+            "INSERT INTO pred_history_days (d, r, n, ua) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(d) DO UPDATE SET r = excluded.r, n = excluded.n, ua = excluded.ua",
+            (day, self.step, kept, int(time.time()))
+        )
+        return before - kept
+
+    def compact(self, now:float=None) -> dict:
+        today = int((now or time.time()) // DAY)
+        stats = {"dropped_days": 0, "compacted_days": 0}
+
+        if self.retention_days:
+            cutoff = today - self.retention_days
+            day = self.next_day(-1)
+            while day is not None and day < cutoff:
+                stats["dropped_days"] += 1
+                day = self.next_day(day)
+            if stats["dropped_days"]:
+                self.db.insert("DELETE FROM pred_history WHERE d < ?", (cutoff,))
+                self.db.insert("DELETE FROM pred_history_days WHERE d < ?", (cutoff,))
+
+        compacted = {row["d"] for row in self.db.select("SELECT d FROM pred_history_days WHERE r = ?", (self.step,))}
+        cutoff = today - self.raw_days
+        day = self.next_day(-1)
+        while day is not None and day < cutoff:
+            if day not in compacted:
+                self.compact_day(day)
+                stats["compacted_days"] += 1
+            day = self.next_day(day)
+        return stats
+
+    def maybe_compact(self) -> dict:
+        """Compacts at most once per `compact_interval`, for the collector daemon's ticks."""
+
+        if self.compacted_at is not None and time.monotonic() - self.compacted_at < self.compact_interval:
+            return None
+        self.compacted_at = time.monotonic()
+        stats = self.compact()
+        if stats["compacted_days"] or stats["dropped_days"]:
+            print(f"[history] - {stats}")
+        return stats
+
+
+def load_history(db, config) -> PredictionHistory:
+    feed_conf = config['feedsource'] if config.has_section('feedsource') else {}
+    return PredictionHistory(
+        db=db,
+        raw_days=int(feed_conf.get('history_raw_days', DEFAULT_RAW_DAYS)),
+        step=int(feed_conf.get('history_step', DEFAULT_STEP)),
+        retention_days=int(feed_conf.get('history_retention_days', DEFAULT_RETENTION_DAYS)),
+        compact_interval=float(feed_conf.get('history_compact_interval', DEFAULT_COMPACT_INTERVAL))
+    )
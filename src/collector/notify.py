@@ -0,0 +1,46 @@
+import os
+import glob
+import socket
+
+
+DEFAULT_NOTIFY_DIR = "/tmp/btb-notify"
+
+
+class PredictionNotifier:
+    """Publishes prediction changes to every bot listening in `notify_dir`.
+
+    Each bot binds a unix datagram socket `<notify_dir>/<name>.sock`, the payload
+    is the comma separated list of cryptos that were written.
+    """
+
+    def __init__(self, notify_dir:str=DEFAULT_NOTIFY_DIR):
+        self.notify_dir = notify_dir
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def __del__(self):
+        self.sock.close()
+
+    def publish(self, cryptos:list) -> int:
+
+        payload = ",".join(cryptos).encode()
+        sent = 0
+        for path in glob.glob(os.path.join(self.notify_dir, "*.sock")):
+            try:
+                self.sock.sendto(payload, path)
+                sent += 1
+            except BlockingIOError:
+                # listener already has unread notifications queued
+                continue
+            except ConnectionRefusedError:
+                # nobody bound to it anymore, the bot exited without cleanup
+                self.remove_stale(path)
+            except OSError as exc:
+                print(f"[notify] - failed to notify {path}: {exc}")
+        return sent
+
+    def remove_stale(self, path:str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
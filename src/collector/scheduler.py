@@ -0,0 +1,77 @@
+import time
+import random
+import traceback
+
+
+DEFAULT_INTERVAL = 60
+DEFAULT_JITTER = 0
+# a tick that starts later than this fraction of the interval is reported as late
+LATE_TICK_RATIO = 0.1
+
+
+class Scheduler:
+    """Fixed-rate scheduler for long running jobs.
+
+    Ticks are planned on the monotonic clock at `interval` seconds apart, so a
+    slow run doesn't make the schedule drift. Jitter only moves the actual start
+    inside a tick, ticks the job overran are skipped and reported.
+    """
+
+    def __init__(self, interval:float=DEFAULT_INTERVAL, jitter:float=DEFAULT_JITTER):
+        if interval <= 0:
+            raise ValueError(f"Invalid interval: {interval}")
+
+        self.interval = float(interval)
+        self.jitter = min(abs(float(jitter)), self.interval / 2)
+        self.late_threshold = self.interval * LATE_TICK_RATIO
+
+        self.ticks = 0
+        self.late_ticks = 0
+        self.missed_ticks = 0
+        self.errors = 0
+
+    def __repr__(self):
+        return f"Scheduler - interval:{self.interval} jitter:{self.jitter}"
+
+    def stats(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "late_ticks": self.late_ticks,
+            "missed_ticks": self.missed_ticks,
+            "errors": self.errors
+        }
+
+    def run(self, job, max_ticks:int=None) -> None:
+
+        next_tick = time.monotonic()
+        while max_ticks is None or self.ticks < max_ticks:
+
+            offset = random.uniform(-self.jitter, self.jitter) if self.jitter else 0
+            delay = next_tick + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            started = time.monotonic()
+            lateness = started - (next_tick + offset)
+            if lateness > self.late_threshold:
+                self.late_ticks += 1
+                print(f"[scheduler] - late tick: {lateness:.3f}s behind schedule")
+
+            self.ticks += 1
+            try:
+                job()
+            except Exception as exc:
+                self.errors += 1
+                print(f"[scheduler] - job failed: {exc}")
+                print(traceback.format_exc())
+
+            elapsed = time.monotonic() - started
+            next_tick += self.interval
+
+            # skip ticks the job overran instead of firing them back to back
+            behind = time.monotonic() - next_tick
+            if behind > 0:
+                missed = int(behind // self.interval) + 1
+                self.missed_ticks += missed
+                next_tick += missed * self.interval
+                print(f"[scheduler] - job took {elapsed:.3f}s, missed {missed} tick(s)")
@@ -2,7 +2,8 @@
 
 touch /var/log/cron.log
 
-(crontab -l ; echo "* * * * * /usr/bin/python3 /opt/collector/collector.py --downloader=cpp --config=/opt/config.ini >> /tmp/collector.log 2>&1")| crontab
+# the collector runs as a long lived daemon from daemon.sh, it no longer needs a crontab entry
+# (crontab -l ; echo "* * * * * /usr/bin/python3 /opt/collector/collector.py --downloader=cpp --config=/opt/config.ini >> /tmp/collector.log 2>&1")| crontab
 
 service cron start  
 service cron status
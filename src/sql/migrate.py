@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import sqlite3
+import argparse
+
+# seconds to wait on the write lock while another container is migrating
+BUSY_TIMEOUT = 60
+
+
+def add_column(table:str, column:str, definition:str):
+    # ALTER TABLE ADD COLUMN has no IF NOT EXISTS, a column already there is left alone
+    def statement(connection) -> None:
+        columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return statement
+
+
+# Each migration is (version, description, statements). The applied version is
+# kept in `PRAGMA user_version`, so migrations only run once per database and
+# never drop existing rows. A statement is an sql string or a callable taking
+# the connection, both must be safe to run again. Append new migrations at the
+# end, never edit one that has already shipped.
+MIGRATIONS = [
+    (1, "create pred_table and trading_table", [
+        """CREATE TABLE IF NOT EXISTS pred_table (
+            id INTEGER PRIMARY KEY,
+            c TEXT,
+            p TEXT,
+            tt INTEGER,
+            et INTEGER,
+            ep FLOAT,
+            tp FLOAT,
+            cp FLOAT,
+            ps FLOAT,
+            a FLOAT,
+            cpr FLOAT,
+            dp FLOAT,
+            mp FLOAT,
+            ia INTEGER
+        )""",
+        """CREATE TABLE IF NOT EXISTS trading_table (
+            id INTEGER PRIMARY KEY,
+            oid INTEGER,
+            sid INTEGER,
+            s TEXT,
+            si TEXT,
+            st TEXT,
+            a FLOAT,
+            abq FLOAT,
+            cp FLOAT,
+            bp FLOAT,
+            obq FLOAT,
+            ebq FLOAT,
+            cbqq FLOAT,
+            sp FLOAT,
+            asq FLOAT,
+            osq FLOAT,
+            esq FLOAT,
+            csqq FLOAT,
+            up FLOAT,
+            rp FLOAT,
+            ut INTEGER,
+            ia INTEGER,
+            ie INTEGER,
+            tty TEXT
+        )""",
+    ]),
+    (2, "add indexes for the bot lookups", [
+        # PredTable.get_predictions: WHERE c = ? ORDER BY ia DESC LIMIT 1
+        "CREATE INDEX IF NOT EXISTS idx_pred_table_c_ia ON pred_table (c, ia DESC)",
+        # TradingTable.get_position_data: WHERE s = ? AND st != 'CLOSED' AND tty = ?
+        # AND ie IS NULL ORDER BY ia DESC, st is carried so the filter is resolved in the index
+        """CREATE INDEX IF NOT EXISTS idx_trading_table_open_position
+            ON trading_table (s, tty, ia DESC, st) WHERE ie IS NULL""",
+        # TradingTable.get_position_data / get_current_position_data by orderId
+        "CREATE INDEX IF NOT EXISTS idx_trading_table_oid_ia ON trading_table (oid, ia DESC)",
+        # lookups by id use the INTEGER PRIMARY KEY (rowid), no index needed
+    ]),
+    (3, "one pred_table row per crypto for the collector upsert", [
+        "DELETE FROM pred_table WHERE id NOT IN (SELECT MAX(id) FROM pred_table GROUP BY c)",
+        "DROP INDEX IF EXISTS idx_pred_table_c_ia",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_pred_table_c ON pred_table (c)",
+    ]),
+    (4, "create feed_state for conditional feed downloads", [
+        """CREATE TABLE IF NOT EXISTS feed_state (
+            src TEXT PRIMARY KEY,
+            etag TEXT,
+            lm TEXT,
+            h TEXT,
+            ua INTEGER
+        )""",
+    ]),
+    (5, "create symbol_info for the shared exchange info cache", [
+        """CREATE TABLE IF NOT EXISTS symbol_info (
+            m TEXT NOT NULL,
+            s TEXT NOT NULL,
+            st TEXT,
+            f TEXT,
+            ua INTEGER,
+            PRIMARY KEY (m, s)
+        ) WITHOUT ROWID""",
+    ]),
+    (6, "create pred_history, the append-only prediction time series", [
+        # d is the utc day of ca, leading the key so a day is one contiguous range to compact or drop
+        """CREATE TABLE IF NOT EXISTS pred_history (
+            d INTEGER NOT NULL,
+            c TEXT NOT NULL,
+            ca INTEGER NOT NULL,
+            p TEXT,
+            tt INTEGER,
+            et INTEGER,
+            ep FLOAT,
+            tp FLOAT,
+            cp FLOAT,
+            ps FLOAT,
+            a FLOAT,
+            cpr FLOAT,
+            dp FLOAT,
+            mp FLOAT,
+            PRIMARY KEY (d, c, ca)
+        ) WITHOUT ROWID""",
+        # days already downsampled, r is the resolution in seconds they were kept at
+        """CREATE TABLE IF NOT EXISTS pred_history_days (
+            d INTEGER PRIMARY KEY,
+            r INTEGER,
+            n INTEGER,
+            ua INTEGER
+        )""",
+    ]),
+    (7, "add the buy / sell fill times to trading_table", [
+        # epoch seconds the bid and the ask got FILLED, ia is when the bid was placed
+        add_column("trading_table", "bft", "INTEGER"),
+        add_column("trading_table", "sft", "INTEGER"),
+    ]),
+]
+
+
+def get_version(connection) -> int:
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(dbname:str, target:int=None) -> int:
+
+    if target is None:
+        target = MIGRATIONS[-1][0]
+
+    connection = sqlite3.connect(dbname, timeout=BUSY_TIMEOUT, isolation_level=None)
+    try:
+        version = get_version(connection)
+        print(f"[migrate] - {dbname} at version {version}")
+        for mversion, description, statements in MIGRATIONS:
+            if mversion <= version or mversion > target:
+                continue
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # every bot container migrates the shared database on start, another
+                # one may have applied it while this one waited on the write lock
+                version = get_version(connection)
+                if mversion <= version:
+                    connection.execute("ROLLBACK")
+                    continue
+                print(f"[migrate] - applying {mversion}: {description}")
+                for sql in statements:
+                    if callable(sql):
+                        sql(connection)
+                    else:
+                        connection.execute(sql)
+                connection.execute(f"PRAGMA user_version = {int(mversion)}")
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                connection.execute("ROLLBACK")
+                raise
+            version = mversion
+        connection.execute("ANALYZE")
+        print(f"[migrate] - {dbname} at version {version}")
+    finally:
+        connection.close()
+
+    return version
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="migrate",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="python migrate.py --database=/opt/db/tradingbot.db"
+    )
+
+    parser.add_argument(
+        '--database',
+        dest='database',
+        type=str,
+        default=os.environ.get("DATABASE_NAME"),
+        help='sqlite database path (defaults to $DATABASE_NAME)'
+    )
+
+    parser.add_argument(
+        '--target',
+        dest='target',
+        type=int,
+        help='migrate up to this version'
+    )
+
+    args = parser.parse_args()
+    if not args.database:
+        print(f"No database .. use --database or set DATABASE_NAME")
+        sys.exit(1)
+
+    migrate(args.database, target=args.target)
@@ -7,49 +7,8 @@ create_db(){
 }
 
 create_tables(){
-   echo "creating tables .."
-   sqlite3 -batch $DATABASE_NAME "CREATE TABLE IF NOT EXISTS pred_table (
-      id INTEGER PRIMARY KEY,
-      c TEXT,
-      p TEXT,
-      tt INTEGER,
-      et INTEGER,
-      ep FLOAT,
-      tp FLOAT,
-      cp FLOAT,
-      ps FLOAT,
-      a FLOAT,
-      cpr FLOAT,
-      dp FLOAT,
-      mp FLOAT,
-      ia INTEGER
-   );"
-   sqlite3 -batch $DATABASE_NAME "CREATE TABLE IF NOT EXISTS trading_table(
-      id INTEGER PRIMARY KEY,
-      oid INTEGER,
-      sid INTEGER,
-      s TEXT,
-      si TEXT,
-      st TEXT,
-      a FLOAT,      
-      abq FLOAT,
-      cp FLOAT,
-      bp FLOAT,
-      obq FLOAT,
-      ebq FLOAT,
-      cbqq FLOAT,
-      sp FLOAT,
-      asq FLOAT,
-      osq FLOAT,
-      esq FLOAT,
-      csqq FLOAT,
-      up FLOAT,
-      rp FLOAT,
-      ut INTEGER,
-      ia INTEGER,
-      ie INTEGER,
-      tty TEXT
-   );"
+   echo "migrating tables .."
+   python3 $(dirname "$0")/migrate.py --database=$DATABASE_NAME
    sqlite3 -batch $DATABASE_NAME ".tables"
    sqlite3 -batch $DATABASE_NAME ".schema"
 }
@@ -65,7 +24,7 @@ then
 		create_db
 elif [[ "$1" = "create_table" ]]
 then
-		create_table
+		create_tables
 elif [[ "$1" = "test" ]]
 then
 		create_db
@@ -73,9 +32,8 @@ then
 elif [[ "$1" = "drop_tables" ]]
 then
 		drop_tables
+else
+		# upgrade the schema in place, existing rows are kept
+		create_tables
 fi
-
-
-create_db
-create_tables
 #drop_tables
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the tests import the bot modules the way the bot does, from its own directory
+sys.path.insert(0, os.path.join(SRC_DIR, "tradingbot"))
+sys.path.insert(0, os.path.join(SRC_DIR, "sql"))
+
+# sqlite query script run by hand, not a test module
+collect_ignore = ["test_tables.py"]
+
+
+@pytest.fixture
+def dbname(tmp_path) -> str:
+    """A database at the latest schema, as populate.sh leaves it."""
+
+    from migrate import migrate
+    dbname = str(tmp_path / "tradingbot.db")
+    migrate(dbname)
+    return dbname
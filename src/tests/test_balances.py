@@ -0,0 +1,134 @@
+import json
+import time
+import logging
+
+import pytest
+
+from binance.exceptions import BinanceAPIException
+
+from api.balances import BalanceCache
+from api.binance_spot import BinanceSpotAPI
+from lib import TradingBotClient
+
+
+LOGGER = logging.getLogger("test_balances")
+
+
+def api_error(code:int, msg:str, status_code:int=400) -> BinanceAPIException:
+    return BinanceAPIException(None, status_code, json.dumps({"code": code, "msg": msg}))
+
+
+def account(free:str, update_time:int=1) -> dict:
+    return {
+        "accountType": "SPOT", "updateTime": update_time,
+        "balances": [{"asset": "BTC", "free": free, "locked": "0"}, {"asset": "USDT", "free": "100", "locked": "0"}]
+    }
+
+
+class FakeExchange:
+    """Stands in for the python-binance `Client`, sells above the free balance are refused."""
+
+    def __init__(self, free:str):
+        self.free = free
+        self.accounts = 0
+        self.orders = []
+
+    def get_account(self) -> dict:
+        self.accounts += 1
+        return account(self.free, update_time=self.accounts)
+
+    def get_exchange_info(self) -> dict:
+        return {"symbols": [{
+            "symbol": "BTCUSDT", "status": "TRADING", "baseAsset": "BTC", "quoteAsset": "USDT",
+            "baseAssetPrecision": 8, "quotePrecision": 8, "filters": [
+                {"filterType": "LOT_SIZE", "minQty": "0.00001000", "maxQty": "9000.00000000", "stepSize": "0.00001000"},
+                {"filterType": "PRICE_FILTER", "tickSize": "0.01000000"},
+            ]
+        }]}
+
+    def create_order(self, **params) -> dict:
+        self.orders.append(params)
+        if float(params["quantity"]) > float(self.free):
+            raise api_error(-2010, "Account has insufficient balance for requested action.")
+        return {"symbol": params["symbol"], "orderId": len(self.orders), "status": "NEW", **params}
+
+
+@pytest.fixture
+def exchange(monkeypatch):
+    exchange = FakeExchange(free="0.50000000")
+    monkeypatch.setattr(BinanceSpotAPI, "connect_client", lambda self, config: exchange)
+    return exchange
+
+
+@pytest.fixture
+def config(dbname) -> dict:
+    return {
+        "settings": {"sdk": "binance_spot", "trading_mode": "test", "user_stream": "0", "depth_stream": "0"},
+        "credentials": {"binance_api_key": "", "binance_api_secret": ""},
+        "database": {"dbname": dbname},
+        "trading": {"trading_pair": "BTCUSDT", "symbol": "btc", "amount": "10", "trade_type": "spot"},
+    }
+
+
+def test_balance_cache_expires_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = BalanceCache(ttl=60)
+    assert not cache.is_valid()
+
+    cache.load_account(account("0.5"))
+    assert cache.is_valid()
+    assert cache.get("btc") == {"asset": "BTC", "free": "0.5", "locked": "0"}
+
+    now[0] += 59
+    assert cache.is_valid()
+    now[0] += 1
+    assert not cache.is_valid()
+
+
+def test_balance_cache_invalidate_unless_streaming():
+    cache = BalanceCache()
+    cache.load_account(account("0.5"))
+    cache.invalidate()
+    assert not cache.is_valid()
+
+    cache.set_streaming(True)
+    cache.load_account(account("0.5"))
+    cache.invalidate()
+    assert cache.is_valid()
+
+
+def test_balance_cache_keeps_newer_stream_updates():
+    cache = BalanceCache()
+    cache.on_account_position({"u": 5, "B": [{"a": "BTC", "f": "0.2", "l": "0"}]})
+    # a REST response older than the event
+    cache.load_account(account("0.5", update_time=4))
+    assert cache.get("BTC")["free"] == "0.2"
+    cache.load_account(account("0.7", update_time=6))
+    assert cache.get("BTC")["free"] == "0.7"
+
+
+def test_get_balance_refresh_reads_the_exchange(exchange, config):
+    adapter = BinanceSpotAPI(config, LOGGER)
+    assert adapter.get_balance("btc")["free"] == "0.50000000"
+    exchange.free = "0.30000000"
+    assert adapter.get_balance("btc")["free"] == "0.50000000"
+    assert exchange.accounts == 1
+
+    assert adapter.get_balance("btc", refresh=True)["free"] == "0.30000000"
+    assert exchange.accounts == 2
+
+
+def test_close_order_insufficient_balance_reads_the_account_again(exchange, config):
+    bot = TradingBotClient(LOGGER, **config)
+    bot.sleep_buffer_min = bot.sleep_buffer_max = 0
+    # cached while the position was open
+    assert bot.get_balance("btc")["free"] == "0.50000000"
+    # part of it went elsewhere, nothing on this path invalidated the cache
+    exchange.free = "0.30000000"
+
+    result = bot.close_order(symbol="BTCUSDT", side="SELL", stype="LIMIT", quantity="0.5", price="43000.00")
+
+    assert result["status"] == "NEW"
+    assert exchange.accounts == 2
+    assert [order["quantity"] for order in exchange.orders] == ["0.50000000", "0.29999000"]
@@ -0,0 +1,142 @@
+import json
+import logging
+
+import pytest
+
+import exchange_info
+from db import SQLiteDB
+from exchange_info import ExchangeInfoCache, STALE_RETRY
+
+
+TTL = 3600
+LOGGER = logging.getLogger("test_exchange_info")
+
+
+class Clock:
+
+    def __init__(self, now:float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def symbol(name:str, status:str="TRADING") -> dict:
+    return {
+        "symbol": name, "status": status, "baseAsset": name[:-4], "quoteAsset": "USDT",
+        "baseAssetPrecision": 8, "quotePrecision": 8, "orderTypes": ["LIMIT"],
+        "filters": [{"filterType": "LOT_SIZE", "minQty": "0.001", "maxQty": "1000", "stepSize": "0.001"}]
+    }
+
+
+class FakeClient:
+
+    def __init__(self, symbols:list):
+        self.symbols = symbols
+        self.calls = 0
+        self.fail = False
+
+    def get_exchange_info(self) -> dict:
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("exchange unreachable")
+        return {"timezone": "UTC", "symbols": self.symbols}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(now=1_700_000_000)
+    monkeypatch.setattr(exchange_info, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def db(dbname):
+    return SQLiteDB(db=dbname, logger=LOGGER)
+
+
+@pytest.fixture
+def client():
+    return FakeClient([symbol("BTCUSDT"), symbol("SOLUSDT"), symbol("LUNAUSDT", status="BREAK")])
+
+
+def load_cache(db, client, dbname:str) -> ExchangeInfoCache:
+    return ExchangeInfoCache(db=db, client=client, logger=LOGGER, market="spot", ttl=TTL,
+                             lock_path=f"{dbname}.exchange-info.lock")
+
+
+def test_first_read_fetches_and_keeps_only_the_used_keys(db, client, dbname, clock):
+    cache = load_cache(db, client, dbname)
+    info = cache.get_symbol_info("btcusdt")
+    assert client.calls == 1
+    assert "orderTypes" not in info
+    assert info["filters"][0]["stepSize"] == "0.001"
+
+    row = db.select_one("SELECT * FROM symbol_info WHERE m = 'spot' AND s = 'SOLUSDT'")
+    assert row["st"] == "TRADING"
+    assert row["ua"] == 1_700_000_000
+    assert json.loads(row["f"])["baseAsset"] == "SOL"
+
+
+def test_other_bots_start_from_the_table(db, client, dbname, clock):
+    load_cache(db, client, dbname).get_symbol_info("BTCUSDT")
+    other = load_cache(db, client, dbname)
+    assert other.get_symbol_info("SOLUSDT")["symbol"] == "SOLUSDT"
+    assert other.get_symbol_info("SOLUSDT")["symbol"] == "SOLUSDT"
+    assert client.calls == 1
+
+
+def test_expired_rows_are_refreshed(db, client, dbname, clock):
+    cache = load_cache(db, client, dbname)
+    cache.get_symbol_info("BTCUSDT")
+    clock.now += TTL - 1
+    cache.get_symbol_info("BTCUSDT")
+    assert client.calls == 1
+
+    clock.now += 1
+    client.symbols = [symbol("BTCUSDT", status="HALT")]
+    assert cache.get_symbol_info("BTCUSDT")["status"] == "HALT"
+    assert client.calls == 2
+    # symbols no longer listed are dropped from the table
+    assert db.select_one("SELECT * FROM symbol_info WHERE s = 'SOLUSDT'") is None
+
+
+def test_failed_refresh_serves_the_expired_row(db, client, dbname, clock):
+    cache = load_cache(db, client, dbname)
+    cache.get_symbol_info("BTCUSDT")
+    clock.now += TTL
+    client.fail = True
+    assert cache.get_symbol_info("BTCUSDT")["symbol"] == "BTCUSDT"
+    assert client.calls == 2
+
+    # not tried again before STALE_RETRY
+    clock.now += STALE_RETRY - 1
+    assert cache.get_symbol_info("BTCUSDT")["symbol"] == "BTCUSDT"
+    assert client.calls == 2
+    clock.now += 1
+    client.fail = False
+    cache.get_symbol_info("BTCUSDT")
+    assert client.calls == 3
+
+
+def test_unlisted_symbol_is_not_refreshed_on_every_read(db, client, dbname, clock):
+    cache = load_cache(db, client, dbname)
+    assert cache.get_symbol_info("BTCUSDT") is not None
+    assert cache.get_symbol_info("NOPEUSDT") is None
+    assert client.calls == 2
+
+    for _ in range(5):
+        assert not cache.is_supported("NOPEUSDT")
+    assert client.calls == 2
+
+    clock.now += STALE_RETRY
+    client.symbols = client.symbols + [symbol("NOPEUSDT")]
+    assert cache.is_supported("NOPEUSDT")
+    assert client.calls == 3
+
+
+def test_is_supported_needs_trading_status(db, client, dbname, clock):
+    cache = load_cache(db, client, dbname)
+    assert cache.is_supported("BTCUSDT")
+    assert not cache.is_supported("LUNAUSDT")
+    assert client.calls == 1
@@ -0,0 +1,106 @@
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from fixedpoint import Fixed, FLOOR, CEILING, HALF_EVEN
+
+
+@pytest.mark.parametrize("value, units, places", [
+    ("0.00100000", 100000, 8),
+    ("-1.5", -15, 1),
+    ("+42", 42, 0),
+    (".5", 5, 1),
+    ("1e-05", 1, 5),
+    ("2.5E+3", 2500, 0),
+    (" 7 ", 7, 0),
+    (0.1, 1, 1),
+    (1e-07, 1, 7),
+    (3, 3, 0),
+])
+def test_parse(value, units, places):
+    fixed = Fixed.parse(value)
+    assert (fixed.units, fixed.places) == (units, places)
+
+
+@pytest.mark.parametrize("value", ["", "abc", "1.2.3", "1e", "None", "1e0.5", "--1", "1e+-2", "-", "1.e"])
+def test_parse_invalid(value):
+    with pytest.raises(ValueError):
+        Fixed.parse(value)
+
+
+def test_parse_to_places():
+    assert str(Fixed.parse("0.125", places=2)) == "0.12"
+    assert str(Fixed.parse("0.135", places=2)) == "0.14"
+    assert str(Fixed.parse("0.129", places=2, rounding=FLOOR)) == "0.12"
+
+
+@pytest.mark.parametrize("value, step, rounding, expected", [
+    ("1.23456789", "0.00100000", FLOOR, "1.234"),
+    ("1.23456789", "0.001", CEILING, "1.235"),
+    ("1.234", "0.001", CEILING, "1.234"),
+    ("1.2345", "0.001", HALF_EVEN, "1.234"),
+    ("1.2355", "0.001", HALF_EVEN, "1.236"),
+    ("-1.2345", "0.001", FLOOR, "-1.235"),
+    ("17", "5", FLOOR, "15"),
+    ("0.37", "0.25", HALF_EVEN, "0.25"),
+    ("0.375", "0.25", HALF_EVEN, "0.50"),
+])
+def test_quantize(value, step, rounding, expected):
+    assert Fixed.parse(value).quantize(step, rounding) == Fixed.parse(expected)
+
+
+def test_quantize_keeps_the_wider_scale():
+    assert str(Fixed.parse("1.23456789").quantize("0.001")) == "1.23400000"
+    assert str(Fixed.parse("0.0019").quantize("0.00100000")) == "0.00100000"
+
+
+@pytest.mark.parametrize("value, places, rounding, expected", [
+    ("1.5", 8, HALF_EVEN, "1.50000000"),
+    ("0.000000125", 8, HALF_EVEN, "0.00000012"),
+    ("0.000000135", 8, HALF_EVEN, "0.00000014"),
+    ("0.000000129", 8, FLOOR, "0.00000012"),
+    ("-0.000000121", 8, FLOOR, "-0.00000013"),
+    ("0.000000121", 8, CEILING, "0.00000013"),
+    ("0.5", 0, HALF_EVEN, "0"),
+    ("-1.5", 0, HALF_EVEN, "-2"),
+    ("12", 2, HALF_EVEN, "12.00"),
+    ("-0.05", 3, HALF_EVEN, "-0.050"),
+])
+def test_format(value, places, rounding, expected):
+    assert Fixed.parse(value).format(places, rounding) == expected
+
+
+def test_normalize():
+    assert str(Fixed.parse("0.00100000").normalize()) == "0.001"
+    assert str(Fixed.parse("100.00").normalize()) == "100"
+    assert str(Fixed.parse("0.000").normalize()) == "0"
+
+
+def test_arithmetic_is_exact():
+    qty = Fixed.parse("0.00123457")
+    assert str(qty * "43000.12000000") == str(Decimal("0.00123457") * Decimal("43000.12000000"))
+    assert str(Fixed.parse(0.1) + 0.2) == "0.3"
+    assert str(1 - Fixed.parse("0.25")) == "0.75"
+
+
+@pytest.mark.parametrize("value, other", [
+    ("1.0", 1),
+    ("1.00000000", Decimal("1")),
+    ("0.5", Decimal("0.50")),
+    ("0.5", 0.5),
+    ("-2.500", Decimal("-2.5")),
+    ("0", 0),
+])
+def test_hash_consistent_with_eq(value, other):
+    fixed = Fixed.parse(value)
+    assert fixed == other
+    assert hash(fixed) == hash(other)
+    assert hash(fixed) == hash(Decimal(value)) == hash(Fraction(Decimal(value)))
+
+
+def test_equal_values_share_dict_keys():
+    prices = {Fixed.parse("1.50"): "a", 2: "b", Decimal("0.1"): "c"}
+    assert prices[Fixed.parse("1.5")] == "a"
+    assert prices[Fixed.parse("2.000")] == "b"
+    assert prices[Fixed.parse("0.10")] == "c"
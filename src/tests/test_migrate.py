@@ -0,0 +1,80 @@
+import sqlite3
+import threading
+
+import migrate
+from migrate import MIGRATIONS, migrate as run_migrate, get_version
+
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def columns(dbname:str, table:str) -> list:
+    with sqlite3.connect(dbname) as db:
+        return [row[1] for row in db.execute(f"PRAGMA table_info({table})")]
+
+
+def version(dbname:str) -> int:
+    with sqlite3.connect(dbname) as db:
+        return get_version(db)
+
+
+def test_migrate_from_scratch_then_again(tmp_path):
+    dbname = str(tmp_path / "tradingbot.db")
+    assert run_migrate(dbname) == LATEST
+    assert run_migrate(dbname) == LATEST
+    assert version(dbname) == LATEST
+    assert {"bft", "sft"} <= set(columns(dbname, "trading_table"))
+
+
+def test_migrate_up_to_target(tmp_path):
+    dbname = str(tmp_path / "tradingbot.db")
+    assert run_migrate(dbname, target=6) == 6
+    assert "bft" not in columns(dbname, "trading_table")
+    assert run_migrate(dbname) == LATEST
+
+
+def test_add_column_already_there(tmp_path):
+    dbname = str(tmp_path / "tradingbot.db")
+    run_migrate(dbname, target=6)
+    with sqlite3.connect(dbname) as db:
+        db.execute("ALTER TABLE trading_table ADD COLUMN bft INTEGER")
+
+    assert run_migrate(dbname) == LATEST
+    assert columns(dbname, "trading_table").count("bft") == 1
+    assert "sft" in columns(dbname, "trading_table")
+
+
+def test_concurrent_migrators(tmp_path, monkeypatch):
+    dbname = str(tmp_path / "tradingbot.db")
+    run_migrate(dbname, target=6)
+
+    # both containers read version 6 before either takes the write lock
+    started = threading.Barrier(2, timeout=5)
+    first_read = threading.local()
+
+    def get_version_together(connection) -> int:
+        current = get_version(connection)
+        if not getattr(first_read, "done", False):
+            first_read.done = True
+            started.wait()
+        return current
+    monkeypatch.setattr(migrate, "get_version", get_version_together)
+
+    results, errors = [], []
+
+    def container() -> None:
+        try:
+            results.append(run_migrate(dbname))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=container) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert errors == []
+    assert results == [LATEST, LATEST]
+    assert version(dbname) == LATEST
+    assert columns(dbname, "trading_table").count("bft") == 1
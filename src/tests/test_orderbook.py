@@ -0,0 +1,156 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+
+import pytest
+import websockets
+
+from api.orderbook import OrderBook, OutOfSyncError, DepthStream
+
+
+SNAPSHOT = {"lastUpdateId": 102, "bids": [["10.0", "1"], ["9.0", "2"]], "asks": [["11.0", "1"], ["12.0", "1"]]}
+RESYNC_SNAPSHOT = {"lastUpdateId": 200, "bids": [["20.0", "1"]], "asks": [["21.0", "1"]]}
+
+
+def depth_event(first_id:int, final_id:int, bids:list=(), asks:list=()) -> dict:
+    return {"e": "depthUpdate", "s": "BTCUSDT", "U": first_id, "u": final_id, "b": list(bids), "a": list(asks)}
+
+
+@pytest.fixture
+def book():
+    book = OrderBook("BTCUSDT")
+    book.load_snapshot(SNAPSHOT)
+    return book
+
+
+def test_apply_event_without_snapshot():
+    with pytest.raises(OutOfSyncError):
+        OrderBook("BTCUSDT").apply_event(depth_event(1, 2))
+
+
+def test_apply_event_drops_events_older_than_the_snapshot(book):
+    assert book.apply_event(depth_event(95, 102, bids=[["8.0", "1"]])) is False
+    assert book.last_update_id == 102
+    assert not book.synced
+    assert book.as_dict(5)["bids"] == [["10.0", "1"], ["9.0", "2"]]
+
+
+def test_apply_event_first_event_must_cover_the_snapshot(book):
+    with pytest.raises(OutOfSyncError):
+        book.apply_event(depth_event(104, 106))
+
+
+def test_apply_event_first_event_straddling_the_snapshot(book):
+    assert book.apply_event(depth_event(101, 105, bids=[["10.0", "0"], ["9.5", "3"]], asks=[["11.0", "2"]]))
+    assert book.synced
+    assert book.last_update_id == 105
+    assert book.as_dict(5) == {
+        "lastUpdateId": 105, "bids": [["9.5", "3"], ["9.0", "2"]], "asks": [["11.0", "2"], ["12.0", "1"]]
+    }
+    assert book.get_price("bid") == "9.5"
+    assert book.get_price("ask", 1) == "12.0"
+
+
+def test_apply_event_gap_after_sync(book):
+    book.apply_event(depth_event(101, 105))
+    assert book.apply_event(depth_event(106, 108))
+    with pytest.raises(OutOfSyncError):
+        book.apply_event(depth_event(110, 111, bids=[["1.0", "1"]]))
+    # nothing of the event past the gap is applied
+    assert book.last_update_id == 108
+    assert book.get_price("bid", 2) is None
+
+
+class DepthServer:
+    """Local websocket server speaking the binance depth stream format, `handler` gets every connection."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.port = None
+        self.loop = None
+        self.stopped = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=asyncio.run, args=(self.serve(),), daemon=True)
+
+    async def serve(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.stopped = self.loop.create_future()
+        async with websockets.serve(self.handler, "127.0.0.1", 0) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self.ready.set()
+            await self.stopped
+
+    def __enter__(self):
+        self.thread.start()
+        assert self.ready.wait(5)
+        return f"ws://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.loop.call_soon_threadsafe(self.stopped.set_result, None)
+        self.thread.join(timeout=5)
+
+
+def wait_for(condition, timeout:float=5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_depth_stream_buffers_the_snapshot_and_resyncs_on_gap():
+    sent, loaded, resyncing = threading.Event(), threading.Event(), threading.Event()
+    snapshots = []
+    buffers = []
+
+    def snapshot() -> dict:
+        snapshots.append(time.monotonic())
+        if len(snapshots) == 1:
+            # still pending while the first events arrive, they must be buffered
+            sent.wait(5)
+            time.sleep(0.2)
+            return SNAPSHOT
+        resyncing.set()
+        time.sleep(0.2)
+        return RESYNC_SNAPSHOT
+
+    async def handler(ws, *args):
+        await ws.send(json.dumps(depth_event(95, 100, bids=[["8.0", "1"]])))
+        await ws.send(json.dumps(depth_event(101, 105, bids=[["10.0", "0"], ["9.5", "3"]], asks=[["11.0", "2"]])))
+        sent.set()
+        await asyncio.to_thread(loaded.wait, 5)
+        await ws.send(json.dumps(depth_event(106, 108, asks=[["11.5", "1"]])))
+        # 109 is missing
+        await ws.send(json.dumps(depth_event(110, 111, bids=[["1.0", "1"]])))
+        await asyncio.to_thread(resyncing.wait, 5)
+        await ws.send(json.dumps(depth_event(195, 200, bids=[["7.0", "1"]])))
+        await ws.send(json.dumps(depth_event(199, 203, bids=[["20.0", "0"], ["19.0", "4"]])))
+        await ws.wait_closed()
+
+    with DepthServer(handler) as url:
+        stream = DepthStream("BTCUSDT", snapshot, logging.getLogger("test_orderbook"), stream_url=url)
+        load_snapshot = stream.load_snapshot
+
+        async def spy(ws) -> list:
+            buffered = await load_snapshot(ws)
+            buffers.append([event["u"] for event in buffered])
+            loaded.set()
+            return buffered
+        stream.load_snapshot = spy
+
+        stream.start()
+        try:
+            assert wait_for(lambda: stream.book.last_update_id == 203)
+            book = stream.book.as_dict(5)
+            ready = stream.is_ready()
+        finally:
+            stream.stop()
+
+    assert ready
+    assert stream.resyncs == 1
+    assert len(snapshots) == 2
+    assert buffers == [[100, 105], [200, 203]]
+    assert book == {"lastUpdateId": 203, "bids": [["19.0", "4"]], "asks": [["21.0", "1"]]}
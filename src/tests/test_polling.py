@@ -0,0 +1,94 @@
+import time
+import random
+
+import pytest
+
+from polling import PollingPolicy, load_phases, DEFAULT_PHASES, IDLE, HOLD, BID, SELL, ERROR
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    random.seed(1234)
+
+
+def test_interval_starts_at_the_base():
+    policy = PollingPolicy()
+    for phase, (base, _) in DEFAULT_PHASES.items():
+        policy.reset(phase)
+        assert policy.interval(phase) == base
+
+
+@pytest.mark.parametrize("phase", [IDLE, HOLD, BID, SELL, ERROR])
+def test_interval_jitter_stays_within_base_and_cap(phase):
+    policy = PollingPolicy()
+    base, cap = policy.phases[phase]
+    previous = policy.interval(phase)
+    for _ in range(500):
+        sleep = policy.interval(phase)
+        # decorrelated jitter, uniform(base, previous * 3) capped
+        assert base <= sleep <= min(cap, previous * 3)
+        previous = sleep
+
+
+def test_interval_reaches_the_cap():
+    policy = PollingPolicy({BID: (0.5, 2)})
+    sleeps = [policy.interval(BID) for _ in range(200)]
+    assert max(sleeps) == 2
+    assert sleeps.count(2) > 100
+
+
+def test_entering_a_phase_starts_it_over():
+    policy = PollingPolicy({BID: (1, 100)})
+    for _ in range(20):
+        policy.interval(BID)
+    assert policy.interval(BID) > 1
+    policy.interval(SELL)
+    assert policy.interval(BID) == 1
+
+
+def test_error_keeps_growing_until_reset():
+    policy = PollingPolicy({ERROR: (1, 1000)})
+    for _ in range(20):
+        policy.interval(ERROR)
+    grown = policy.sleeps[ERROR]
+    assert grown > 1
+    # another phase in between doesn't start the backoff over
+    policy.interval(IDLE)
+    assert policy.sleeps[ERROR] == grown
+    assert 1 <= policy.interval(ERROR) <= min(1000, grown * 3)
+    policy.reset(ERROR)
+    assert policy.interval(ERROR) == 1
+
+
+def test_interval_clamped_to_the_deadline():
+    policy = PollingPolicy({IDLE: (5, 60)})
+    for _ in range(50):
+        policy.interval(IDLE)
+    sleep = policy.interval(IDLE, deadline=time.monotonic() + 7)
+    assert 5 <= sleep <= 7
+
+
+def test_interval_far_deadline_changes_nothing():
+    policy = PollingPolicy({IDLE: (5, 60)})
+    assert policy.interval(IDLE, deadline=time.monotonic() + 3600) == 5
+
+
+def test_clamp_never_goes_below_the_base():
+    policy = PollingPolicy({HOLD: (1, 5)})
+    # a passed deadline mustn't turn into a busy loop
+    assert policy.clamp(HOLD, 5, time.monotonic() - 10) == 1
+    assert policy.clamp(HOLD, 5, time.monotonic() + 0.2) == 1
+    assert 2.9 <= policy.clamp(HOLD, 5, time.monotonic() + 3) <= 3
+    assert policy.clamp(HOLD, 2, time.monotonic() + 3) == 2
+
+
+def test_cap():
+    policy = PollingPolicy({SELL: (0.5, 8)})
+    assert policy.cap(SELL) == 8
+    assert policy.cap(BID) == DEFAULT_PHASES[BID][1]
+
+
+def test_load_phases():
+    phases = load_phases({"poll_bid": "0.25,3", "poll_idle": "", "other": "1,2"})
+    assert phases == {BID: (0.25, 3.0)}
+    assert PollingPolicy(phases).phases[IDLE] == DEFAULT_PHASES[IDLE]
@@ -0,0 +1,172 @@
+import json
+import logging
+
+import pytest
+
+from binance.exceptions import BinanceAPIException
+
+from api import ratelimit
+from api.ratelimit import (
+    WeightBucket, RequestScheduler, ThrottledClient, request_weight, get_order_book_weight, HIGH, LOW
+)
+
+
+class Clock:
+    """`time` of the rate limiter, sleeping moves it forward."""
+
+    def __init__(self, now:float):
+        self.now = now
+        self.slept = []
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds:float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class Response:
+
+    def __init__(self, status_code:int=200, headers:dict=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # 10s into a minute window
+    clock = Clock(now=1_699_999_990.0)
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def scheduler(clock):
+    return RequestScheduler(logging.getLogger("test_ratelimit"), weight_limit=100, order_limit_10s=2, read_headroom=0.8)
+
+
+def test_bucket_rolls_over_at_the_window_boundary():
+    bucket = WeightBucket("weight", 100, 60, "x-mbx-used-weight-1m")
+    assert bucket.wait_time(90, 100, now=1_700_000_010.0) == 0
+    bucket.used += 90
+    # the window is aligned to the clock, not to the first request
+    assert bucket.wait_time(20, 100, now=1_700_000_030.0) == 10
+    assert bucket.wait_time(20, 100, now=1_700_000_039.5) == 0.5
+    assert bucket.wait_time(20, 100, now=1_700_000_040.0) == 0
+    assert bucket.used == 0
+
+
+def test_bucket_update_never_lowers_the_count():
+    bucket = WeightBucket("weight", 100, 60, "x-mbx-used-weight-1m")
+    bucket.roll(1_700_000_010.0)
+    bucket.used = 30
+    bucket.update(20, now=1_700_000_011.0)
+    assert bucket.used == 30
+    bucket.update(70, now=1_700_000_012.0)
+    assert bucket.used == 70
+    # a header from the next window starts it over
+    bucket.update(5, now=1_700_000_041.0)
+    assert bucket.used == 5
+
+
+@pytest.mark.parametrize("limit, weight", [(5, 5), (100, 5), (101, 25), (500, 25), (1000, 50), (5000, 250)])
+def test_order_book_weight(limit, weight):
+    assert get_order_book_weight(limit) == weight
+    assert request_weight("get_order_book", {"limit": limit}) == (weight, LOW, False)
+
+
+def test_reads_keep_the_headroom_for_orders(scheduler, clock):
+    assert scheduler.reserve(50) == 0
+    assert scheduler.reserve(30) == 0
+    # 80 of 100 used, reads stop at read_headroom
+    assert scheduler.reserve(1) == 50
+    assert scheduler.reserve(20, HIGH) == 0
+    assert scheduler.reserve(1, HIGH) == 50
+    assert scheduler.delayed == 2
+    assert scheduler.headroom() == {"weight": 0, "orders_10s": 2, "orders_1d": 160000, "blocked": 0}
+
+
+def test_acquire_waits_for_the_next_window(scheduler, clock):
+    scheduler.acquire(80)
+    scheduler.acquire(10)
+    assert clock.slept == [50]
+    assert scheduler.headroom()["weight"] == 90
+
+
+def test_order_count_window(scheduler, clock):
+    assert scheduler.reserve(1, HIGH, order=True) == 0
+    assert scheduler.reserve(1, HIGH, order=True) == 0
+    # the 10s order window is aligned too, 10s into the minute is the start of one
+    assert scheduler.reserve(1, HIGH, order=True) == 10
+    assert scheduler.reserve(1, HIGH) == 0
+    clock.now += 10
+    assert scheduler.reserve(1, HIGH, order=True) == 0
+    assert scheduler.headroom()["orders_1d"] == 160000 - 3
+
+
+def test_headers_count_the_other_bots_on_the_ip(scheduler, clock):
+    scheduler.reserve(10)
+    scheduler.update({"x-mbx-used-weight-1m": "75", "x-mbx-order-count-10s": "2"})
+    assert scheduler.headroom()["weight"] == 25
+    assert scheduler.reserve(10) == 50
+    assert scheduler.reserve(1, HIGH, order=True) == 10
+
+
+@pytest.mark.parametrize("status_code", [418, 429])
+def test_rate_limited_response_blocks_every_request(scheduler, clock, status_code):
+    response = Response(status_code, {"retry-after": "30"})
+    exc = BinanceAPIException(response, status_code, json.dumps({"code": -1003, "msg": "Too many requests"}))
+    scheduler.on_error(exc)
+
+    assert scheduler.reserve(1) == 30
+    assert scheduler.reserve(1, HIGH, order=True) == 30
+    assert scheduler.headroom()["blocked"] == 30
+    clock.now += 30
+    assert scheduler.reserve(1, HIGH, order=True) == 0
+
+
+def test_other_errors_dont_block(scheduler, clock):
+    scheduler.on_error(BinanceAPIException(Response(400), 400, json.dumps({"code": -2010, "msg": "insufficient"})))
+    scheduler.on_error(ConnectionError("reset"))
+    assert scheduler.reserve(1) == 0
+
+
+class FakeClient:
+    """Keeps the last response on itself the way python-binance does."""
+
+    def __init__(self):
+        self.response = None
+
+    @staticmethod
+    def _handle_response(response:Response) -> dict:
+        if response.status_code != 200:
+            raise BinanceAPIException(response, response.status_code, json.dumps({"code": -1003, "msg": "banned"}))
+        return {}
+
+    def get_account(self, headers:dict, status_code:int=200) -> dict:
+        self.response = Response(status_code, headers)
+        try:
+            return self._handle_response(self.response)
+        finally:
+            # another thread's request finishing in between
+            self.response = Response(200, {"x-mbx-used-weight-1m": "99"})
+
+    def get_server_time(self) -> dict:
+        return {"serverTime": 0}
+
+
+def test_throttled_client_reads_the_headers_of_its_own_response(scheduler, clock):
+    client = ThrottledClient(FakeClient(), scheduler)
+    client.get_account(headers={"x-mbx-used-weight-1m": "40"})
+    assert scheduler.headroom()["weight"] == 60
+
+    with pytest.raises(BinanceAPIException):
+        client.get_account(headers={"x-mbx-used-weight-1m": "41", "retry-after": "5"}, status_code=429)
+    assert scheduler.headroom() == {"weight": 40, "orders_10s": 2, "orders_1d": 160000, "blocked": 5}
+
+
+def test_throttled_client_passes_unweighted_calls_through(scheduler, clock):
+    client = ThrottledClient(FakeClient(), scheduler)
+    assert client.get_server_time() == {"serverTime": 0}
+    assert scheduler.headroom()["weight"] == 100
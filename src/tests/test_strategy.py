@@ -0,0 +1,45 @@
+import pytest
+
+from strategy import SpotStrategy
+
+
+class Settings:
+    bot = None
+    logger = None
+    trading_pair = "BTCUSDT"
+    symbol = "btc"
+    amount = "10"
+    trade_type = "spot"
+    policy = None
+    clock = None
+
+
+class NoWaits(SpotStrategy):
+
+    async def call(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    async def gather(self, *calls) -> list:
+        return [call() for call in calls]
+
+
+def test_runner_missing_a_hook_fails_when_built():
+    with pytest.raises(TypeError, match="buffer"):
+        NoWaits(Settings())
+
+
+def test_runner_with_every_hook():
+
+    class Runner(NoWaits):
+
+        async def buffer(self, phase=None, deadline=None):
+            pass
+
+        async def wait_for_predictions(self, phase=None, deadline=None):
+            pass
+
+        async def wait_order_details(self, orderId, phase=None):
+            return {}
+
+    runner = Runner(Settings())
+    assert runner.trading_pair == "BTCUSDT"
@@ -0,0 +1,91 @@
+import time
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from api.userstream import UserDataStream
+
+
+def execution_report(orderId:int, status:str, executed:str="0") -> dict:
+    return {
+        "e": "executionReport", "s": "BTCUSDT", "i": orderId, "c": "bot-1", "S": "BUY", "o": "LIMIT", "f": "GTC",
+        "p": "43000.00", "q": "0.001", "z": executed, "Z": "0", "X": status, "T": 1700000000000
+    }
+
+
+@pytest.fixture
+def stream():
+    stream = UserDataStream(client=None, logger=logging.getLogger("test_userstream"))
+    stream.running = True
+    stream.set_connected(True)
+    return stream
+
+
+def test_wait_order_async_wakes_on_the_fill_from_another_thread(stream):
+
+    def events() -> None:
+        time.sleep(0.05)
+        stream.on_execution_report(execution_report(7, "NEW"))
+        stream.on_execution_report(execution_report(8, "FILLED"))
+        time.sleep(0.05)
+        stream.on_execution_report(execution_report(7, "FILLED", executed="0.001"))
+
+    async def wait() -> tuple:
+        thread = threading.Thread(target=events)
+        start = time.monotonic()
+        thread.start()
+        order = await stream.wait_order_async(orderId=7, timeout=5)
+        thread.join()
+        return order, time.monotonic() - start
+
+    order, elapsed = asyncio.run(wait())
+    assert order["status"] == "FILLED"
+    assert order["executedQty"] == "0.001"
+    assert elapsed < 1
+    assert stream.waiters == {}
+
+
+def test_wait_order_async_events_on_the_same_loop(stream):
+
+    async def wait() -> list:
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, stream.on_execution_report, execution_report(1, "PARTIALLY_FILLED"))
+        loop.call_later(0.1, stream.on_execution_report, execution_report(2, "CANCELED"))
+        loop.call_later(0.15, stream.on_execution_report, execution_report(1, "FILLED"))
+        return await asyncio.gather(
+            stream.wait_order_async(orderId=1, timeout=5), stream.wait_order_async(orderId="2", timeout=5)
+        )
+
+    first, second = asyncio.run(wait())
+    assert first["status"] == "FILLED"
+    assert second["status"] == "CANCELED"
+    assert stream.waiters == {}
+
+
+def test_wait_order_async_returns_the_last_state_on_timeout(stream):
+    stream.on_execution_report(execution_report(3, "NEW"))
+    order = asyncio.run(stream.wait_order_async(orderId=3, timeout=0.05))
+    assert order["status"] == "NEW"
+    assert asyncio.run(stream.wait_order_async(orderId=4, timeout=0.05)) is None
+
+
+def test_wait_order_async_final_state_already_known(stream):
+    stream.on_execution_report(execution_report(5, "FILLED"))
+    start = time.monotonic()
+    assert asyncio.run(stream.wait_order_async(orderId=5, timeout=5))["status"] == "FILLED"
+    assert time.monotonic() - start < 0.5
+
+
+def test_wait_order_async_disconnect_wakes_the_waiters(stream):
+    stream.on_execution_report(execution_report(6, "NEW"))
+
+    async def wait():
+        asyncio.get_running_loop().call_later(0.05, stream.set_connected, False)
+        return await stream.wait_order_async(orderId=6, timeout=5)
+
+    start = time.monotonic()
+    # the orders seen are dropped with the connection, the caller asks REST
+    assert asyncio.run(wait()) is None
+    assert time.monotonic() - start < 1
@@ -0,0 +1,77 @@
+import random
+import asyncio
+import functools
+import threading
+
+from metrics import registry
+
+
+DEFAULT_TRIES = 3
+DEFAULT_DELAY = 2
+DEFAULT_BACKOFF = 2
+DEFAULT_MAX_DELAY = 30
+
+
+def async_retry(tries:int=DEFAULT_TRIES, delay:float=DEFAULT_DELAY, backoff:float=DEFAULT_BACKOFF,
+                max_delay:float=DEFAULT_MAX_DELAY, exceptions:tuple=(Exception,)):
+    """Coroutine counterpart of `retry.retry`, waits with `asyncio.sleep` so the loop keeps serving
+    other requests. The delay grows by `backoff` up to `max_delay`, with full jitter.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            attempt_delay = delay
+            for attempt in range(1, tries + 1):
+                try:
+                    return await fn(*args, **kwargs)
+                except exceptions:
+                    if attempt == tries:
+                        raise
+                registry.inc("exchange_retries_total")
+                await asyncio.sleep(random.uniform(0, attempt_delay))
+                attempt_delay = min(attempt_delay * backoff, max_delay)
+        return wrapper
+    return decorator
+
+
+def start_loop_thread(name:str) -> asyncio.AbstractEventLoop:
+    """Starts an event loop on a daemon thread and returns it."""
+
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    ready.wait()
+    return loop
+
+
+class SyncBridge:
+    """Blocking view of an object with coroutine methods.
+
+    Coroutine methods are submitted to `loop` and waited on, everything else is
+    returned as is. Lets the synchronous bot code share an async adapter whose
+    requests all run on one event loop. Must not be called from `loop` itself.
+    """
+
+    def __init__(self, target, loop:asyncio.AbstractEventLoop):
+        self.target = target
+        self.loop = loop
+
+    def __repr__(self):
+        return f"SyncBridge - {self.target}"
+
+    def __getattr__(self, name):
+        attr = getattr(self.target, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return asyncio.run_coroutine_threadsafe(attr(*args, **kwargs), self.loop).result()
+        return call
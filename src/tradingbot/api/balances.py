@@ -0,0 +1,80 @@
+import time
+import threading
+
+
+DEFAULT_BALANCE_TTL = 60
+
+
+class BalanceCache:
+    """Account balances keyed by asset, kept from `get_account` and the user data stream.
+
+    While the user data stream is connected `outboundAccountPosition` events keep
+    it current. Otherwise it is invalidated after every fill or order change and
+    expires after `ttl` seconds, so the next read does a single `get_account`.
+    Each asset keeps the time of its last update so a REST response older than a
+    stream event can't overwrite it.
+    """
+
+    def __init__(self, ttl:float=DEFAULT_BALANCE_TTL):
+        self.ttl = ttl
+        self.balances = {}
+        self.updated = {}
+        self.account_type = None
+        self.loaded_at = None
+        self.streaming = False
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f"BalanceCache - assets:{len(self.balances)} valid:{self.is_valid()}"
+
+    def is_valid(self) -> bool:
+        if self.loaded_at is None:
+            return False
+        return self.streaming or time.monotonic() - self.loaded_at < self.ttl
+
+    def invalidate(self) -> None:
+        """Called after a fill or an order change, a no-op while the stream reports them itself."""
+
+        with self.lock:
+            if not self.streaming:
+                self.loaded_at = None
+
+    def set_streaming(self, streaming:bool) -> None:
+        # events may have been missed around a reconnect, start over from REST
+        with self.lock:
+            self.streaming = streaming
+            self.loaded_at = None
+
+    def load_account(self, result:dict) -> None:
+        update_time = result.get("updateTime", 0)
+        with self.lock:
+            self.account_type = result.get("accountType", None)
+            for row in result["balances"]:
+                asset = row["asset"].upper()
+                if self.updated.get(asset, 0) > update_time:
+                    continue
+                self.balances[asset] = {"asset": row["asset"], "free": row["free"], "locked": row["locked"]}
+                self.updated[asset] = update_time
+            self.loaded_at = time.monotonic()
+
+    def on_account_position(self, event:dict) -> None:
+        update_time = event["u"]
+        with self.lock:
+            for row in event["B"]:
+                asset = row["a"].upper()
+                self.balances[asset] = {"asset": row["a"], "free": row["f"], "locked": row["l"]}
+                self.updated[asset] = update_time
+
+    def get(self, asset:str) -> dict:
+        with self.lock:
+            balance = self.balances.get(asset.upper(), None)
+            return dict(balance) if balance else None
+
+    def as_account(self) -> dict:
+        """Same shape as the REST `get_account` response, balances only."""
+
+        with self.lock:
+            return {
+                "accountType": self.account_type,
+                "balances": [dict(balance) for balance in self.balances.values()]
+            }
@@ -1,5 +1,4 @@
 import time
-import json
 from retry import retry
 
 from binance.client import Client
@@ -10,7 +9,6 @@ class BinanceFuturesAPI:
         
         self.config = config
         self.client = self.connect_client(**config['credentials'])
-        self.supported_pairs = self.load_supported_pairs()
 
         self.RETRY_COUNT = 5
         self.BUFFER_TIMEOUT = 1
@@ -18,12 +16,6 @@ class BinanceFuturesAPI:
 
         self.set_leverage(config)        
 
-    def load_supported_pairs(self):
-        supported_pairs = {}
-        with open(self.config['trading']['supported_pairs'], "r") as f:
-            supported_pairs = json.loads(f.read())
-        return supported_pairs
-
     def connect_client(self, **config) -> object:
         if config['settings']['trading_mode'] == 'test':
             return Client(
@@ -34,6 +26,10 @@ class BinanceFuturesAPI:
                 api_key=config['binance_api_key'], api_secret=config['binance_api_secret']
             )
 
+    @retry(tries=3, delay=2)
+    def get_exchange_info(self) -> dict:
+        return self.client.futures_exchange_info()
+
     @retry(tries=3, delay=2)
     def set_leverage(self, config:dict) -> None:
         # need to set a default leverage
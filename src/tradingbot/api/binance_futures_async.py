@@ -0,0 +1,116 @@
+from binance.client import AsyncClient
+
+from api.binance_futures import BinanceFuturesAPI
+from api.aio import async_retry
+
+
+class AsyncBinanceFuturesAPI(BinanceFuturesAPI):
+    """`BinanceFuturesAPI` on top of `AsyncClient`, `connect` must be awaited before any call."""
+
+    def __init__(self, **config):
+
+        self.config = config
+        self.client = None
+
+        self.RETRY_COUNT = 5
+        self.BUFFER_TIMEOUT = 1
+        self.BUFFER_MULT = 0.5
+
+    async def connect(self) -> None:
+        creds = self.config['credentials']
+        self.client = await AsyncClient.create(
+            api_key=creds['binance_api_key'], api_secret=creds['binance_api_secret'],
+            testnet=self.config['settings']['trading_mode'] == 'test'
+        )
+        await self.set_leverage(self.config)
+
+    async def close(self) -> None:
+        if self.client:
+            await self.client.close_connection()
+
+    @async_retry(tries=3, delay=2)
+    async def get_exchange_info(self) -> dict:
+        return await self.client.futures_exchange_info()
+
+    @async_retry(tries=3, delay=2)
+    async def set_leverage(self, config:dict) -> None:
+        # need to set a default leverage
+        await self.client.futures_change_leverage(
+            symbol=config['trading']['trading_pair'], leverage=1
+        )
+
+    @async_retry(tries=3, delay=2)
+    async def get_prices(self, symbol):
+        return await self.client.get_avg_price(symbol=symbol)
+
+    @async_retry(tries=3, delay=2)
+    async def set_order(self, symbol:str, side:str, type:str, quantity:float, price:float, timeInForce:str=None):
+
+        params = {}
+        if not timeInForce:
+            timeInForce = "GTC"
+
+        params['symbol'] = symbol
+        params['side'] = side
+        params['type'] = type
+        params['quantity'] = quantity
+        params['price'] = price
+        params['timeInForce'] = timeInForce
+
+        print(f"[set_order] - {params}")
+        return await self.client.futures_create_order(**params)
+
+    @async_retry(tries=3, delay=2)
+    async def close_order(self, symbol:str, side:str, type:str, quantity:float, reduceOnly:str=None):
+
+        params = {}
+        if not reduceOnly:
+            params['reduceOnly'] = 'true'
+
+        # flip side to close specific position
+        if side == "BUY":
+            params['side'] = "SELL"
+        else:
+            params['side'] = "BUY"
+
+        params['symbol'] = symbol
+        params['type'] = type
+        params['quantity'] = quantity
+
+        return await self.client.futures_create_order(**params)
+
+    @async_retry(tries=3, delay=2)
+    async def get_order_details(self, symbol:str, timestamp:int, orderId:int=None, origClientOrderId:str=None, recvWindow:int=None):
+
+        params = {}
+        params['symbol'] = symbol
+
+        if orderId:
+            params['orderId'] = orderId
+
+        if  origClientOrderId:
+            params['origClientOrderId'] =  origClientOrderId
+
+        if recvWindow:
+            params['recvWindow'] = recvWindow
+
+        return await self.client.futures_get_order(**params)
+
+    @async_retry(tries=3, delay=2)
+    async def get_current_position(self, symbol:str):
+        account = await self.client.futures_account()
+        result = {}
+        for item in account['positions']:
+            if item['symbol'] != symbol: continue
+            iM = float(item['initialMargin'])
+            uP = float(item['unrealizedProfit'])
+            result['updateTime'] = item['updateTime']
+            result['initialMargin'] = iM
+            result['unrealizedProfit'] = uP
+            result['roE'] = (uP / iM) * 100
+            break
+        return result
+
+    @async_retry(tries=3, delay=2)
+    async def cancel_order(self, symbol:str) -> dict:
+        return await self.client.futures_cancel_all_open_orders(symbol=symbol)
@@ -1,42 +1,72 @@
 import time
-import json
+import uuid
+import logging
 from retry import retry
 
 from binance.client import Client
-from prettytable import PrettyTable
+from binance.exceptions import BinanceAPIException
+
+from api.orderbook import DepthStream, DEFAULT_STREAM_URL, TESTNET_STREAM_URL, DEFAULT_SNAPSHOT_LIMIT
+from api.userstream import UserDataStream, FINAL_ORDER_STATUS
+from api.balances import BalanceCache, DEFAULT_BALANCE_TTL
+from api.ratelimit import ThrottledClient, load_scheduler
+from render import LazyJson, LazyTable, log_table
+from metrics import registry
 
 import datetime
 
+# placing / cancelling an order is retried only once the previous try is known not to have gone through
+ORDER_TRIES = 3
+ORDER_RETRY_DELAY = 2
+ORDER_NOT_FOUND = -2013
+
+
+def new_client_order_id() -> str:
+    # binance allows up to 36 characters out of [.A-Z:/a-z0-9_-]
+    return f"tb-{uuid.uuid4().hex}"
+
+
+def is_retryable(exc:Exception) -> bool:
+    """True when the exchange may not have acted on the request.
+
+    A network error or a 5xx leaves the outcome unknown, a 429 / 418 was refused
+    before reaching the matching engine, any other api error is a final rejection.
+    """
+
+    if not isinstance(exc, BinanceAPIException):
+        return True
+    return exc.status_code >= 500 or exc.status_code in (418, 429)
+
+
 class BinanceSpotAPI:
     def __init__(self, config, logger):
         self.config = config
-        self.client = self.connect_client(config)
-        self.supported_pairs = self.load_supported_pairs()
+        self.logger = logger
+
+        # every request goes through the rate limiter
+        self.scheduler = load_scheduler(config['settings'], logger)
+        self.client = ThrottledClient(self.connect_client(config), self.scheduler)
 
         self.RETRY_COUNT = 5
         self.BUFFER_TIMEOUT = 1
         self.BUFFER_MULT = 0.5
 
-        self.logger = logger
+        # local order books kept from the depth stream, keyed by symbol
+        self.depth_streams = {}
+        if int(config['settings'].get('depth_stream', 0)):
+            self.start_depth_stream(config['trading']['trading_pair'])
 
-    def load_supported_pairs(self):
-        supported_pairs = {}
-        with open(self.config['trading']['supported_pairs'], "r") as f:
-            supported_pairs = json.loads(f.read())
-        return supported_pairs
-
-    def render_tbl(self, result, field_names):
+        # balances by asset, kept current by the user stream when it runs
+        self.balances = BalanceCache(ttl=float(config['settings'].get('balance_ttl', DEFAULT_BALANCE_TTL)))
 
-        tbl = PrettyTable()
-        tbl.field_names = field_names
-        for row in result:
-            field_val = []
-            for k in field_names:
-                field_val.append(row.get(k, "-"))
-            if field_val:
-                tbl.add_row(field_val)
+        # order state from executionReport events
+        self.user_stream = None
+        if int(config['settings'].get('user_stream', 0)):
+            self.start_user_stream()
 
-        self.logger.info(f"\n{tbl}")
+    def render_tbl(self, result, field_names):
+        # a table only when debugging, key=value records otherwise
+        log_table(self.logger, result, field_names)
     
     def connect_client(self, config) -> object:
         creds = config['credentials']
@@ -49,19 +79,67 @@ class BinanceSpotAPI:
                 api_key=creds['binance_api_key'], api_secret=creds['binance_api_secret']
             )
     
+    def get_headroom(self) -> dict:
+        return self.scheduler.headroom()
+
+    def get_stream_url(self, key:str) -> str:
+        default_url = TESTNET_STREAM_URL if self.config['settings']['trading_mode'] == 'test' else DEFAULT_STREAM_URL
+        return self.config['settings'].get(key, default_url)
+
+    def start_depth_stream(self, symbol:str, loop=None) -> DepthStream:
+
+        if symbol in self.depth_streams:
+            return self.depth_streams[symbol]
+
+        stream = DepthStream(
+            symbol=symbol, logger=self.logger,
+            snapshot=lambda: self.client.get_order_book(symbol=symbol, limit=DEFAULT_SNAPSHOT_LIMIT),
+            stream_url=self.get_stream_url('depth_stream_url')
+        )
+        stream.start(loop=loop)
+        self.depth_streams[symbol] = stream
+        return stream
+
+    def start_user_stream(self, loop=None) -> UserDataStream:
+        if not self.user_stream:
+            self.user_stream = UserDataStream(
+                client=self.client, logger=self.logger, stream_url=self.get_stream_url('user_stream_url'),
+                balances=self.balances
+            )
+            self.user_stream.start(loop=loop)
+        return self.user_stream
+
+    def wait_order_details(self, symbol:str, orderId:int, timeout:float) -> dict:
+        """Waits on the user data stream for the order to finish, None when the stream can't tell."""
+
+        if not self.user_stream or not self.user_stream.is_ready():
+            return None
+
+        result = self.user_stream.wait_order(orderId=orderId, timeout=timeout)
+        if not result or result["symbol"] != symbol:
+            # no events seen for it, e.g. placed while the stream was reconnecting
+            return self.get_order_details(symbol=symbol, orderId=orderId)
+
+        self.on_order_details(result)
+        self.logger.info(f"[order details] - stream - {result}")
+        return result
+
+    def load_order_book(self, symbol:str, limit:int) -> dict:
+        # in memory book when the stream is synced, REST otherwise
+        stream = self.depth_streams.get(symbol, None)
+        if stream and stream.is_ready():
+            return stream.book.as_dict(limit)
+        return self.client.get_order_book(symbol=symbol, limit=limit)
+
     @retry(tries=3, delay=2)
     def get_prices(self, symbol):
         return self.client.get_avg_price(symbol=symbol)
 
-    @retry(tries=3, delay=2)
-    def set_order(self, symbol:str, side:str, stype:str, quantity:float, price:float, timeInForce:str=None):
+    def order_params(self, symbol:str, side:str, stype:str, quantity:float, price:float, timeInForce:str=None) -> dict:
 
         if not timeInForce:
             timeInForce = "GTC"
 
-        if not side:
-            side = "BUY"
-
         if not stype:
             stype = "LIMIT"
 
@@ -72,38 +150,64 @@ class BinanceSpotAPI:
         params['timeInForce'] = timeInForce
         params['quantity'] = quantity
         params['price'] = price
+        return params
+
+    def create_order(self, params:dict) -> dict:
+        """Places the order at most once.
+
+        It is sent with its own `newClientOrderId`, when a try fails without a final
+        answer the order is looked up by that id before being sent again.
+        """
+
+        params['newClientOrderId'] = new_client_order_id()
+        for attempt in range(1, ORDER_TRIES + 1):
+            try:
+                if attempt > 1:
+                    order = self.find_order(symbol=params['symbol'], client_order_id=params['newClientOrderId'])
+                    if order:
+                        return order
+                return self.client.create_order(**params)
+            except Exception as exc:
+                if attempt == ORDER_TRIES or not is_retryable(exc):
+                    raise
+                registry.inc("exchange_retries_total")
+                self.logger.warning(f"[create_order] - {exc} - checking {params['newClientOrderId']} before resending")
+                time.sleep(ORDER_RETRY_DELAY)
+
+    def find_order(self, symbol:str, client_order_id:str) -> dict:
+        try:
+            return self.client.get_order(symbol=symbol, origClientOrderId=client_order_id)
+        except BinanceAPIException as exc:
+            if exc.code == ORDER_NOT_FOUND:
+                return None
+            raise
 
-        self.logger.debug(f"[set_order] - params: {params}")
-        result = self.client.create_order(**params)
+    def set_order(self, symbol:str, side:str, stype:str, quantity:float, price:float, timeInForce:str=None):
+
+        params = self.order_params(
+            symbol=symbol, side=side if side else "BUY", stype=stype, quantity=quantity, price=price, timeInForce=timeInForce
+        )
+        self.logger.debug("[set_order] - params: %s", params)
+        result = self.create_order(params)
+        self.balances.invalidate()
         self.render_tbl(result=[result], 
             field_names=['symbol', 'orderId', 'type', 'side', 'transactTime', 'price', 'origQty', 'executedQty', 'status']
         )
-        self.logger.debug(f"[set_order] - result: {json.dumps(result, indent=2)}")
+        self.logger.debug("[set_order] - result: %s", LazyJson(result))
         return result     
 
-    @retry(tries=3, delay=2)
     def close_order(self, symbol:str, side:str, stype:str, quantity:float, price:float):
 
-        if not side:
-            side = "SELL"
-
-        if not stype:
-            stype = "LIMIT"
-
-        params = {}
-        params['symbol'] = symbol
-        params['side'] = side
-        params['type'] = stype
-        params['timeInForce'] = "GTC"
-        params['quantity'] = quantity
-        params['price'] = price
-
-        self.logger.debug(f"[close_order] - params: {params}")
-        result = self.client.create_order(**params)
+        params = self.order_params(
+            symbol=symbol, side=side if side else "SELL", stype=stype, quantity=quantity, price=price
+        )
+        self.logger.debug("[close_order] - params: %s", params)
+        result = self.create_order(params)
+        self.balances.invalidate()
         self.render_tbl(result=[result],
             field_names=['symbol', 'orderId', 'type', 'side', 'transactTime', 'price', 'origQty', 'executedQty', 'status']
         )
-        self.logger.debug(f"[close_order] - result: {result}")
+        self.logger.debug("[close_order] - result: %s", result)
         return result
 
     @retry(tries=3, delay=2)
@@ -115,16 +219,23 @@ class BinanceSpotAPI:
             params['orderId'] = orderId
 
         result = self.client.get_order(**params)
-        
-        self.logger.info("[order details]")
-        self.logger.info(f"result - {result}")
+        self.on_order_details(result)
+        self.render_order_details(result)
+        return result
+
+    def on_order_details(self, result:dict) -> None:
+        # a fill moved the balances, the next read refetches them once
+        if float(result.get("executedQty", 0)) > 0:
+            self.balances.invalidate()
+
+    def render_order_details(self, result:dict) -> None:
+        self.logger.debug("[order details] - result - %s", result)
         self.render_tbl(result=[result], 
             field_names=[
                 'symbol', 'orderId', 'type', 'side', 'updateTime', 'price', 
                 'origQuoteOrderQty', 'origQty', 'executedQty', 'status'
             ]
         )
-        return result
         
     @retry(tries=3, delay=2)
     def get_current_position(self, symbol:str):
@@ -135,38 +246,31 @@ class BinanceSpotAPI:
         self.logger.info(f"[get_order_book] - index:{index}")
         if not limit:
             limit = 10
-        
+
+        orderbook = self.load_order_book(symbol=symbol, limit=limit)
+        return self.select_order_book_price(
+            orderbook=orderbook, amount=amount, symbol=symbol, position_type=position_type, index=index
+        )
+
+    def select_order_book_price(self, orderbook:dict, amount:int, symbol:str, position_type:str, index:int=None):
+
         if index is None:
             if position_type == "bid":
                 index = 0
             if position_type == "ask":
                 index = 9
 
-        orderbook = self.client.get_order_book(symbol=symbol, limit=limit)
         self.logger.info(f"Trading Pair: {symbol} - index:{index}")
-        tbl = PrettyTable()
-
-        if position_type == "bid":
-            tbl.field_names = ["idx", "bid", "bid_quantity"]
-        elif position_type == "ask":
-            tbl.field_names = ["idx", "ask", "ask_quantity"]
-        
-        idx = 0
-        for b, a in zip(orderbook["bids"], orderbook["asks"]):
-
-            if idx == index:
-                if position_type == "bid":
-                    tbl.add_row([idx, str("=>")+str(b[0])+str("<="), b[1]])
-                elif position_type == "ask":
-                    tbl.add_row([idx, str("=>")+str(a[0])+str("<="), a[1]])
-            else:
-                if position_type == "bid":
-                    tbl.add_row([idx, b[0], b[1]])
-                elif position_type == "ask":
-                    tbl.add_row([idx, a[0], a[1]])
-            idx += 1
-
-        self.logger.info(f"\n{tbl}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            levels = orderbook["bids"] if position_type == "bid" else orderbook["asks"]
+            rows = []
+            for idx, (price, quantity) in enumerate(levels):
+                rows.append({
+                    "idx": idx,
+                    position_type: f"=>{price}<=" if idx == index else price,
+                    f"{position_type}_quantity": quantity
+                })
+            self.logger.debug("%s", LazyTable(rows, ["idx", position_type, f"{position_type}_quantity"]))
         order = None
         if position_type == "bid":
             order = orderbook["bids"][index][0]
@@ -177,13 +281,46 @@ class BinanceSpotAPI:
         
         return order
 
-    @retry(tries=3, delay=2)
     def cancel_order(self, symbol:str, orderId:int) -> dict:
-        return self.client.cancel_order(symbol=symbol, orderId=orderId)
+        result = self.cancel_once(symbol=symbol, orderId=orderId)
+        self.balances.invalidate()
+        return result
+
+    def cancel_once(self, symbol:str, orderId:int) -> dict:
+        # a retry first checks whether the order is already done, a second cancel of it would be rejected
+        for attempt in range(1, ORDER_TRIES + 1):
+            try:
+                if attempt > 1:
+                    order = self.client.get_order(symbol=symbol, orderId=orderId)
+                    if order['status'] in FINAL_ORDER_STATUS:
+                        return order
+                return self.client.cancel_order(symbol=symbol, orderId=orderId)
+            except Exception as exc:
+                if attempt == ORDER_TRIES or not is_retryable(exc):
+                    raise
+                registry.inc("exchange_retries_total")
+                self.logger.warning(f"[cancel_order] - {exc} - checking {orderId} before resending")
+                time.sleep(ORDER_RETRY_DELAY)
+
+    def get_account(self, refresh:bool=False) -> dict:
+        # refresh reads it from the exchange even when the cache looks current
+        if refresh or not self.balances.is_valid():
+            self.balances.load_account(self.client.get_account())
+        return self.balances.as_account()
+
+    def get_balance(self, asset:str, refresh:bool=False) -> dict:
+        if refresh or not self.balances.is_valid():
+            self.get_account(refresh=refresh)
+        return self.balances.get(asset)
     
     def show_account(self, symbol:str=None) -> str:
         
-        result = self.client.get_account()
+        result = self.get_account()
+        self.render_account(result=result, symbol=symbol)
+        return result
+
+    def render_account(self, result:dict, symbol:str=None) -> None:
+
         balances = result["balances"]
 
         tbl_results = []
@@ -200,7 +337,10 @@ class BinanceSpotAPI:
         self.render_tbl(result=tbl_results, 
             field_names=["asset", "free", "locked"]
         )
-        return result
+
+    @retry(tries=3, delay=2)
+    def get_exchange_info(self) -> dict:
+        return self.client.get_exchange_info()
 
     def get_symbol_info(self, trading_pair:str) -> dict:
         return self.client.get_symbol_info(trading_pair)
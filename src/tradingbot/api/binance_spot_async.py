@@ -0,0 +1,241 @@
+import asyncio
+
+from binance.client import AsyncClient
+
+from binance.exceptions import BinanceAPIException
+
+from api.binance_spot import BinanceSpotAPI, ORDER_TRIES, ORDER_RETRY_DELAY, ORDER_NOT_FOUND, new_client_order_id, is_retryable
+from api.aio import async_retry, SyncBridge
+from api.orderbook import DepthStream, DEFAULT_SNAPSHOT_LIMIT
+from api.userstream import UserDataStream, FINAL_ORDER_STATUS
+from api.balances import BalanceCache, DEFAULT_BALANCE_TTL
+from api.ratelimit import AsyncThrottledClient, load_scheduler
+from render import LazyJson
+from metrics import registry
+
+
+class AsyncBinanceSpotAPI(BinanceSpotAPI):
+    """`BinanceSpotAPI` on top of `AsyncClient`.
+
+    Same method surface, the exchange calls are coroutines and many of them can be
+    in flight on one event loop. `connect` must be awaited on the loop that will
+    run the calls before anything else.
+    """
+
+    def __init__(self, config, logger):
+        self.config = config
+        self.logger = logger
+        self.scheduler = load_scheduler(config['settings'], logger)
+        self.client = None
+        self.loop = None
+
+        self.RETRY_COUNT = 5
+        self.BUFFER_TIMEOUT = 1
+        self.BUFFER_MULT = 0.5
+        self.depth_streams = {}
+        self.balances = BalanceCache(ttl=float(config['settings'].get('balance_ttl', DEFAULT_BALANCE_TTL)))
+        self.user_stream = None
+
+    async def connect(self) -> None:
+        creds = self.config['credentials']
+        client = await AsyncClient.create(
+            api_key=creds['binance_api_key'], api_secret=creds['binance_api_secret'],
+            testnet=self.config['settings']['trading_mode'] == 'test'
+        )
+        # every request goes through the rate limiter
+        self.client = AsyncThrottledClient(client, self.scheduler)
+        self.loop = asyncio.get_running_loop()
+
+        settings = self.config['settings']
+        if int(settings.get('depth_stream', 0)):
+            self.start_depth_stream(self.config['trading']['trading_pair'], loop=self.loop)
+        if int(settings.get('user_stream', 0)):
+            self.start_user_stream(loop=self.loop)
+
+    async def close(self) -> None:
+        for stream in self.depth_streams.values():
+            stream.stop()
+        if self.user_stream:
+            self.user_stream.stop()
+        if self.client:
+            await self.client.close_connection()
+
+    def start_depth_stream(self, symbol:str, loop=None) -> DepthStream:
+
+        if symbol in self.depth_streams:
+            return self.depth_streams[symbol]
+
+        # the snapshot is fetched from an executor thread, the request itself runs on self.loop
+        client = SyncBridge(self.client, self.loop)
+        stream = DepthStream(
+            symbol=symbol, logger=self.logger,
+            snapshot=lambda: client.get_order_book(symbol=symbol, limit=DEFAULT_SNAPSHOT_LIMIT),
+            stream_url=self.get_stream_url('depth_stream_url')
+        )
+        stream.start(loop=loop or self.loop)
+        self.depth_streams[symbol] = stream
+        return stream
+
+    def start_user_stream(self, loop=None) -> UserDataStream:
+        if not self.user_stream:
+            self.user_stream = UserDataStream(
+                client=SyncBridge(self.client, self.loop), logger=self.logger,
+                stream_url=self.get_stream_url('user_stream_url'), balances=self.balances
+            )
+            self.user_stream.start(loop=loop or self.loop)
+        return self.user_stream
+
+    async def wait_order_details(self, symbol:str, orderId:int, timeout:float) -> dict:
+        """Waits on the user data stream for the order to finish, None when the stream can't tell."""
+
+        if not self.user_stream or not self.user_stream.is_ready():
+            return None
+
+        result = await self.user_stream.wait_order_async(orderId=orderId, timeout=timeout)
+
+        if not result or result["symbol"] != symbol:
+            # no events seen for it, e.g. placed while the stream was reconnecting
+            return await self.get_order_details(symbol=symbol, orderId=orderId)
+
+        self.on_order_details(result)
+        self.logger.info(f"[order details] - stream - {result}")
+        return result
+
+    async def load_order_book(self, symbol:str, limit:int) -> dict:
+        # in memory book when the stream is synced, REST otherwise
+        stream = self.depth_streams.get(symbol, None)
+        if stream and stream.is_ready():
+            return stream.book.as_dict(limit)
+        return await self.client.get_order_book(symbol=symbol, limit=limit)
+
+    @async_retry(tries=3, delay=2)
+    async def get_prices(self, symbol):
+        return await self.client.get_avg_price(symbol=symbol)
+
+    async def create_order(self, params:dict) -> dict:
+        # placed at most once, see `BinanceSpotAPI.create_order`
+        params['newClientOrderId'] = new_client_order_id()
+        for attempt in range(1, ORDER_TRIES + 1):
+            try:
+                if attempt > 1:
+                    order = await self.find_order(symbol=params['symbol'], client_order_id=params['newClientOrderId'])
+                    if order:
+                        return order
+                return await self.client.create_order(**params)
+            except Exception as exc:
+                if attempt == ORDER_TRIES or not is_retryable(exc):
+                    raise
+                registry.inc("exchange_retries_total")
+                self.logger.warning(f"[create_order] - {exc} - checking {params['newClientOrderId']} before resending")
+                await asyncio.sleep(ORDER_RETRY_DELAY)
+
+    async def find_order(self, symbol:str, client_order_id:str) -> dict:
+        try:
+            return await self.client.get_order(symbol=symbol, origClientOrderId=client_order_id)
+        except BinanceAPIException as exc:
+            if exc.code == ORDER_NOT_FOUND:
+                return None
+            raise
+
+    async def set_order(self, symbol:str, side:str, stype:str, quantity:float, price:float, timeInForce:str=None):
+
+        params = self.order_params(
+            symbol=symbol, side=side if side else "BUY", stype=stype, quantity=quantity, price=price, timeInForce=timeInForce
+        )
+        self.logger.debug("[set_order] - params: %s", params)
+        result = await self.create_order(params)
+        self.balances.invalidate()
+        self.render_tbl(result=[result],
+            field_names=['symbol', 'orderId', 'type', 'side', 'transactTime', 'price', 'origQty', 'executedQty', 'status']
+        )
+        self.logger.debug("[set_order] - result: %s", LazyJson(result))
+        return result
+
+    async def close_order(self, symbol:str, side:str, stype:str, quantity:float, price:float):
+
+        params = self.order_params(
+            symbol=symbol, side=side if side else "SELL", stype=stype, quantity=quantity, price=price
+        )
+        self.logger.debug("[close_order] - params: %s", params)
+        result = await self.create_order(params)
+        self.balances.invalidate()
+        self.render_tbl(result=[result],
+            field_names=['symbol', 'orderId', 'type', 'side', 'transactTime', 'price', 'origQty', 'executedQty', 'status']
+        )
+        self.logger.debug("[close_order] - result: %s", result)
+        return result
+
+    @async_retry(tries=3, delay=2)
+    async def get_order_details(self, symbol:str, orderId:int=None):
+
+        params = {}
+        params['symbol'] = symbol
+        if orderId:
+            params['orderId'] = orderId
+
+        result = await self.client.get_order(**params)
+        self.on_order_details(result)
+        self.render_order_details(result)
+        return result
+
+    @async_retry(tries=3, delay=2)
+    async def get_current_position(self, symbol:str):
+        return await self.client.get_avg_price(symbol=symbol)
+
+    async def get_order_book(self, amount:int, symbol:str, position_type:str, index:int=None, limit:int=None):
+
+        self.logger.info(f"[get_order_book] - index:{index}")
+        if not limit:
+            limit = 10
+
+        orderbook = await self.load_order_book(symbol=symbol, limit=limit)
+        return self.select_order_book_price(
+            orderbook=orderbook, amount=amount, symbol=symbol, position_type=position_type, index=index
+        )
+
+    async def cancel_order(self, symbol:str, orderId:int) -> dict:
+        result = await self.cancel_once(symbol=symbol, orderId=orderId)
+        self.balances.invalidate()
+        return result
+
+    async def cancel_once(self, symbol:str, orderId:int) -> dict:
+        # a retry first checks whether the order is already done, see `BinanceSpotAPI.cancel_once`
+        for attempt in range(1, ORDER_TRIES + 1):
+            try:
+                if attempt > 1:
+                    order = await self.client.get_order(symbol=symbol, orderId=orderId)
+                    if order['status'] in FINAL_ORDER_STATUS:
+                        return order
+                return await self.client.cancel_order(symbol=symbol, orderId=orderId)
+            except Exception as exc:
+                if attempt == ORDER_TRIES or not is_retryable(exc):
+                    raise
+                registry.inc("exchange_retries_total")
+                self.logger.warning(f"[cancel_order] - {exc} - checking {orderId} before resending")
+                await asyncio.sleep(ORDER_RETRY_DELAY)
+
+    async def get_account(self, refresh:bool=False) -> dict:
+        # refresh reads it from the exchange even when the cache looks current
+        if refresh or not self.balances.is_valid():
+            self.balances.load_account(await self.client.get_account())
+        return self.balances.as_account()
+
+    async def get_balance(self, asset:str, refresh:bool=False) -> dict:
+        if refresh or not self.balances.is_valid():
+            await self.get_account(refresh=refresh)
+        return self.balances.get(asset)
+
+    async def show_account(self, symbol:str=None) -> str:
+        result = await self.get_account()
+        self.render_account(result=result, symbol=symbol)
+        return result
+
+    @async_retry(tries=3, delay=2)
+    async def get_exchange_info(self) -> dict:
+        return await self.client.get_exchange_info()
+
+    async def get_symbol_info(self, trading_pair:str) -> dict:
+        return await self.client.get_symbol_info(trading_pair)
+
+    async def get_open_orders(self, symbol:str) -> dict:
+        return await self.client.get_open_orders(symbol=symbol)
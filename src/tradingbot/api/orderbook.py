@@ -0,0 +1,262 @@
+import json
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+
+import websockets
+
+
+DEFAULT_STREAM_URL = "wss://stream.binance.com:9443/ws"
+TESTNET_STREAM_URL = "wss://testnet.binance.vision/ws"
+DEFAULT_UPDATE_SPEED = "100ms"
+DEFAULT_SNAPSHOT_LIMIT = 1000
+RECONNECT_DELAY = 1
+RECONNECT_DELAY_MAX = 30
+
+
+class OutOfSyncError(Exception):
+    pass
+
+
+class BookSide:
+    """One side of the book as parallel arrays sorted best price first.
+
+    `keys` holds the float price (negated for bids) in ascending order, so the best
+    level is always index 0 and a price lookup is a bisect.
+    """
+
+    def __init__(self, descending:bool):
+        self.sign = -1 if descending else 1
+        self.keys = []
+        self.levels = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self) -> None:
+        self.keys = []
+        self.levels = []
+
+    def load(self, levels:list) -> None:
+        self.clear()
+        for price, qty in levels:
+            self.update(price, qty)
+
+    def update(self, price:str, qty:str) -> None:
+        key = self.sign * float(price)
+        i = bisect_left(self.keys, key)
+        exists = i < len(self.keys) and self.keys[i] == key
+        if float(qty) == 0:
+            if exists:
+                del self.keys[i]
+                del self.levels[i]
+        elif exists:
+            self.levels[i] = [price, qty]
+        else:
+            self.keys.insert(i, key)
+            self.levels.insert(i, [price, qty])
+
+    def level(self, index:int) -> list:
+        if index < len(self.levels):
+            return self.levels[index]
+        return None
+
+    def top(self, limit:int) -> list:
+        return [list(level) for level in self.levels[:limit]]
+
+
+class OrderBook:
+    """Local order book kept in sync from a REST snapshot plus diff depth events.
+
+    Follows the binance procedure: events older than the snapshot are dropped, the
+    first applied event must straddle `lastUpdateId + 1` and every following event
+    must start right after the previous one, anything else is a gap.
+    """
+
+    def __init__(self, symbol:str):
+        self.symbol = symbol
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.last_update_id = None
+        self.synced = False
+        self.updated_at = None
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f"OrderBook - {self.symbol} - lastUpdateId:{self.last_update_id} synced:{self.synced}"
+
+    def reset(self) -> None:
+        with self.lock:
+            self.synced = False
+            self.last_update_id = None
+            self.bids.clear()
+            self.asks.clear()
+
+    def load_snapshot(self, snapshot:dict) -> None:
+        with self.lock:
+            self.bids.load(snapshot["bids"])
+            self.asks.load(snapshot["asks"])
+            self.last_update_id = snapshot["lastUpdateId"]
+            self.synced = False
+            self.updated_at = time.monotonic()
+
+    def apply_event(self, event:dict) -> bool:
+        """Applies a depthUpdate event, returns False if it was older than the book."""
+
+        with self.lock:
+            if self.last_update_id is None:
+                raise OutOfSyncError(f"{self.symbol} - no snapshot loaded")
+
+            first_id, final_id = event["U"], event["u"]
+            if final_id <= self.last_update_id:
+                return False
+
+            expected_id = self.last_update_id + 1
+            if self.synced and first_id != expected_id:
+                raise OutOfSyncError(f"{self.symbol} - expected update {expected_id} got {first_id}")
+            if not self.synced and not (first_id <= expected_id <= final_id):
+                raise OutOfSyncError(f"{self.symbol} - update {first_id}..{final_id} doesn't cover {expected_id}")
+
+            for price, qty in event["b"]:
+                self.bids.update(price, qty)
+            for price, qty in event["a"]:
+                self.asks.update(price, qty)
+
+            self.last_update_id = final_id
+            self.synced = True
+            self.updated_at = time.monotonic()
+            return True
+
+    def get_price(self, position_type:str, index:int=0) -> str:
+        side = self.bids if position_type == "bid" else self.asks
+        with self.lock:
+            level = side.level(index)
+        return level[0] if level else None
+
+    def as_dict(self, limit:int) -> dict:
+        """Same shape as the REST `get_order_book` response."""
+
+        with self.lock:
+            return {
+                "lastUpdateId": self.last_update_id,
+                "bids": self.bids.top(limit),
+                "asks": self.asks.top(limit)
+            }
+
+
+class DepthStream:
+    """Keeps an `OrderBook` synced from the `<symbol>@depth` stream on a thread or an event loop.
+
+    `snapshot` is a callable returning the REST order book, `stream_url` can point
+    to any server speaking the binance stream format.
+    """
+
+    def __init__(self, symbol:str, snapshot, logger, stream_url:str=DEFAULT_STREAM_URL,
+                    update_speed:str=DEFAULT_UPDATE_SPEED):
+        self.symbol = symbol
+        self.snapshot = snapshot
+        self.logger = logger
+        self.url = f"{stream_url.rstrip('/')}/{symbol.lower()}@depth@{update_speed}"
+        self.book = OrderBook(symbol)
+
+        self.resyncs = 0
+        self.running = False
+        self.thread = None
+        self.loop = None
+        self.task = None
+
+    def __repr__(self):
+        return f"DepthStream - {self.url}"
+
+    def is_ready(self) -> bool:
+        return self.running and self.book.synced
+
+    def start(self, loop=None) -> None:
+        """Runs on a background thread, or as a task of `loop` when given."""
+
+        if self.running:
+            return
+        self.running = True
+        if loop:
+            self.task = loop.create_task(self.stream())
+            return
+        self.thread = threading.Thread(target=self.run, name=f"depth-{self.symbol.lower()}", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        self.book.reset()
+        if self.task:
+            self.task.cancel()
+        if self.loop:
+            self.loop.call_soon_threadsafe(lambda: [t.cancel() for t in asyncio.all_tasks(self.loop)])
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self.stream())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    async def stream(self) -> None:
+
+        delay = RECONNECT_DELAY
+        while self.running:
+            try:
+                async with websockets.connect(self.url) as ws:
+                    self.logger.info(f"[depth_stream] - connected {self.url}")
+                    delay = RECONNECT_DELAY
+                    await self.sync(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.logger.warning(f"[depth_stream] - {self.symbol} disconnected: {exc}")
+
+            self.book.reset()
+            if self.running:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    async def sync(self, ws) -> None:
+
+        while self.running:
+            buffered = await self.load_snapshot(ws)
+            try:
+                for event in buffered:
+                    self.book.apply_event(event)
+                async for message in ws:
+                    self.book.apply_event(json.loads(message))
+                return
+            except OutOfSyncError as exc:
+                self.resyncs += 1
+                self.logger.warning(f"[depth_stream] - resync: {exc}")
+
+    async def load_snapshot(self, ws) -> list:
+        """Fetches a REST snapshot while buffering the stream events received meanwhile."""
+
+        self.book.reset()
+        loop = asyncio.get_running_loop()
+        pending = loop.run_in_executor(None, self.snapshot)
+        buffered = []
+        while True:
+            recv = asyncio.ensure_future(ws.recv())
+            done, _ = await asyncio.wait({recv, pending}, return_when=asyncio.FIRST_COMPLETED)
+            if recv in done:
+                buffered.append(json.loads(recv.result()))
+            if pending in done:
+                if recv not in done:
+                    # cancelling recv() doesn't drop the message, the stream resumes at it
+                    recv.cancel()
+                    try:
+                        buffered.append(json.loads(await recv))
+                    except asyncio.CancelledError:
+                        pass
+                break
+
+        self.book.load_snapshot(await pending)
+        return buffered
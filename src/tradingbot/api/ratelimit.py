@@ -0,0 +1,261 @@
+import time
+import asyncio
+import functools
+import threading
+
+from binance.exceptions import BinanceAPIException
+
+from metrics import registry
+
+
+# binance spot defaults, see GET /api/v3/exchangeInfo rateLimits
+DEFAULT_WEIGHT_LIMIT = 6000
+DEFAULT_ORDER_LIMIT_10S = 50
+DEFAULT_ORDER_LIMIT_1D = 160000
+# share of the weight window reads may use, the rest is kept for orders
+DEFAULT_READ_HEADROOM = 0.8
+DEFAULT_RETRY_AFTER = 60
+
+HIGH = "high"
+LOW = "low"
+
+# (weight, priority, places an order) per client method, the response headers
+# correct the count so these only have to be close
+REQUEST_WEIGHTS = {
+    "get_avg_price": (2, LOW, False),
+    # python-binance reads the whole exchangeInfo for a single symbol too
+    "get_symbol_info": (20, LOW, False),
+    "get_exchange_info": (20, LOW, False),
+    "get_account": (20, LOW, False),
+    "get_open_orders": (6, LOW, False),
+    "get_order": (4, HIGH, False),
+    "create_order": (1, HIGH, True),
+    "cancel_order": (1, HIGH, False),
+    "stream_get_listen_key": (1, HIGH, False),
+    "stream_keepalive": (1, HIGH, False),
+}
+
+
+def get_order_book_weight(limit:int=100) -> int:
+    if limit <= 100:
+        return 5
+    if limit <= 500:
+        return 25
+    if limit <= 1000:
+        return 50
+    return 250
+
+
+class WeightBucket:
+    """Used weight of one fixed rate limit window.
+
+    Binance counts per IP in windows aligned to the clock, so the bucket refills
+    all at once at the window boundary.
+    """
+
+    def __init__(self, name:str, limit:int, interval:int, header:str):
+        self.name = name
+        self.limit = limit
+        self.interval = interval
+        self.header = header
+        self.window = None
+        self.used = 0
+
+    def __repr__(self):
+        return f"WeightBucket - {self.name} - {self.used}/{self.limit}"
+
+    def roll(self, now:float) -> None:
+        window = now - now % self.interval
+        if window != self.window:
+            self.window = window
+            self.used = 0
+
+    def wait_time(self, weight:int, ceiling:float, now:float) -> float:
+        self.roll(now)
+        if self.used + weight <= ceiling:
+            return 0
+        return self.window + self.interval - now
+
+    def update(self, used:int, now:float) -> None:
+        # the header counts every client on the IP, never lower our own count
+        self.roll(now)
+        self.used = max(self.used, used)
+
+
+class RequestScheduler:
+    """Central rate limiter for the exchange requests of a process.
+
+    Each request reserves its weight before it is sent. Reads only use the first
+    `read_headroom` share of the weight window and are delayed to the next window
+    past it, orders and order checks may use the whole window. The used weight
+    and order counts from the response headers keep the buckets in line with the
+    other bots sharing the IP, a 429/418 blocks every request until `Retry-After`.
+    """
+
+    def __init__(self, logger, weight_limit:int=DEFAULT_WEIGHT_LIMIT, order_limit_10s:int=DEFAULT_ORDER_LIMIT_10S,
+                    order_limit_1d:int=DEFAULT_ORDER_LIMIT_1D, read_headroom:float=DEFAULT_READ_HEADROOM):
+        self.logger = logger
+        self.read_headroom = read_headroom
+        self.weight = WeightBucket("weight", weight_limit, 60, "x-mbx-used-weight-1m")
+        self.orders = [
+            WeightBucket("orders_10s", order_limit_10s, 10, "x-mbx-order-count-10s"),
+            WeightBucket("orders_1d", order_limit_1d, 86400, "x-mbx-order-count-1d"),
+        ]
+        self.blocked_until = 0
+        self.delayed = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f"RequestScheduler - {self.headroom()}"
+
+    def reserve(self, weight:int, priority:str=LOW, order:bool=False) -> float:
+        """Reserves the request when it fits, otherwise returns how long to wait before trying again."""
+
+        now = time.time()
+        with self.lock:
+            if now < self.blocked_until:
+                return self.blocked_until - now
+
+            ceiling = self.weight.limit if priority == HIGH else self.weight.limit * self.read_headroom
+            delay = self.weight.wait_time(weight, ceiling, now)
+            if order:
+                for bucket in self.orders:
+                    delay = max(delay, bucket.wait_time(1, bucket.limit, now))
+            if delay:
+                self.delayed += 1
+                registry.inc("exchange_request_delays_total", priority=priority)
+                return delay
+
+            self.weight.used += weight
+            if order:
+                for bucket in self.orders:
+                    bucket.used += 1
+            return 0
+
+    def acquire(self, weight:int, priority:str=LOW, order:bool=False) -> None:
+        while True:
+            delay = self.reserve(weight, priority, order)
+            if not delay:
+                return
+            self.logger.debug(f"[ratelimit] - {priority} request delayed {delay:.2f}s - {self.headroom()}")
+            time.sleep(delay)
+
+    async def acquire_async(self, weight:int, priority:str=LOW, order:bool=False) -> None:
+        while True:
+            delay = self.reserve(weight, priority, order)
+            if not delay:
+                return
+            self.logger.debug(f"[ratelimit] - {priority} request delayed {delay:.2f}s - {self.headroom()}")
+            await asyncio.sleep(delay)
+
+    def update(self, headers) -> None:
+        if headers is None:
+            return
+        now = time.time()
+        with self.lock:
+            for bucket in [self.weight] + self.orders:
+                used = headers.get(bucket.header, None)
+                if used is not None:
+                    bucket.update(int(used), now)
+                    registry.set("exchange_window_used", bucket.used, bucket=bucket.name)
+
+    def on_error(self, exc:Exception) -> None:
+        if not isinstance(exc, BinanceAPIException) or exc.status_code not in (418, 429):
+            return
+        headers = getattr(exc.response, "headers", None) or {}
+        retry_after = int(headers.get("retry-after", DEFAULT_RETRY_AFTER))
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.time() + retry_after)
+        self.logger.warning(f"[ratelimit] - {exc.status_code} from the exchange, blocking requests for {retry_after}s")
+
+    def headroom(self) -> dict:
+        """Weight and orders left in the current windows."""
+
+        now = time.time()
+        with self.lock:
+            result = {}
+            for bucket in [self.weight] + self.orders:
+                bucket.roll(now)
+                result[bucket.name] = bucket.limit - bucket.used
+            result["blocked"] = max(0, round(self.blocked_until - now, 2))
+            return result
+
+
+def load_scheduler(settings:dict, logger) -> RequestScheduler:
+    return RequestScheduler(
+        logger=logger,
+        weight_limit=int(settings.get('weight_limit', DEFAULT_WEIGHT_LIMIT)),
+        order_limit_10s=int(settings.get('order_limit_10s', DEFAULT_ORDER_LIMIT_10S)),
+        order_limit_1d=int(settings.get('order_limit_1d', DEFAULT_ORDER_LIMIT_1D)),
+        read_headroom=float(settings.get('read_headroom', DEFAULT_READ_HEADROOM))
+    )
+
+
+def request_weight(name:str, kwargs:dict) -> tuple:
+    if name == "get_order_book":
+        return get_order_book_weight(kwargs.get("limit", 100)), LOW, False
+    return REQUEST_WEIGHTS.get(name, None)
+
+
+class ThrottledClient:
+    """`Client` whose requests go through a `RequestScheduler`.
+
+    Methods without a known weight are passed through untouched.
+    """
+
+    def __init__(self, client, scheduler:RequestScheduler):
+        self.client = client
+        self.scheduler = scheduler
+        self.watch_responses()
+
+    def watch_responses(self) -> None:
+        # the used weight is read off each response as the client handles it, `client.response`
+        # is shared by every thread / task using the client and may already be another request's
+        handle_response = getattr(self.client, "_handle_response", None)
+        if handle_response is None:
+            return
+
+        def update(response):
+            self.scheduler.update(getattr(response, "headers", None))
+            return handle_response(response)
+        self.client._handle_response = update
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr) or (name not in REQUEST_WEIGHTS and name != "get_order_book"):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            weight, priority, order = request_weight(name, kwargs)
+            self.scheduler.acquire(weight, priority, order)
+            registry.inc("exchange_request_weight_total", weight, method=name)
+            try:
+                result = registry.timed("exchange_request", lambda: attr(*args, **kwargs), method=name)
+            except Exception as exc:
+                self.scheduler.on_error(exc)
+                raise
+            return result
+        return call
+
+
+class AsyncThrottledClient(ThrottledClient):
+    """`AsyncClient` whose requests go through a `RequestScheduler`."""
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr) or (name not in REQUEST_WEIGHTS and name != "get_order_book"):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            weight, priority, order = request_weight(name, kwargs)
+            await self.scheduler.acquire_async(weight, priority, order)
+            registry.inc("exchange_request_weight_total", weight, method=name)
+            try:
+                result = await registry.timed_async("exchange_request", attr(*args, **kwargs), method=name)
+            except Exception as exc:
+                self.scheduler.on_error(exc)
+                raise
+            return result
+        return call
@@ -0,0 +1,214 @@
+import json
+import time
+import asyncio
+import threading
+
+import websockets
+
+from api.orderbook import DEFAULT_STREAM_URL, RECONNECT_DELAY, RECONNECT_DELAY_MAX
+
+
+# binance expires a listenKey after 60 minutes without a keepalive
+KEEPALIVE_INTERVAL = 30 * 60
+FINAL_ORDER_STATUS = ("FILLED", "CANCELED", "REJECTED", "EXPIRED", "EXPIRED_IN_MATCH")
+
+
+class UserDataStream:
+    """Tracks order state from the user data stream on a thread or an event loop.
+
+    `executionReport` events are kept in `orders` keyed by orderId, in the same
+    shape as the REST `get_order` response. The map is cleared on every disconnect
+    so a state read from it never misses events, callers fall back to REST for
+    orders it doesn't know. Threads wait on `wait_order`, coroutines on
+    `wait_order_async`, both are woken by the events of their order.
+    `outboundAccountPosition` events update `balances` when a `BalanceCache` is
+    given.
+    """
+
+    def __init__(self, client, logger, stream_url:str=DEFAULT_STREAM_URL, balances=None):
+        self.client = client
+        self.logger = logger
+        self.stream_url = stream_url.rstrip('/')
+        self.balances = balances
+
+        self.orders = {}
+        # orderId -> [(loop, asyncio.Event)] of the coroutines waiting on it
+        self.waiters = {}
+        self.condition = threading.Condition()
+        self.connected = False
+        self.running = False
+        self.thread = None
+        self.loop = None
+        self.task = None
+
+    def __repr__(self):
+        return f"UserDataStream - {self.stream_url} - connected:{self.connected}"
+
+    def is_ready(self) -> bool:
+        return self.running and self.connected
+
+    def start(self, loop=None) -> None:
+        """Runs on a background thread, or as a task of `loop` when given."""
+
+        if self.running:
+            return
+        self.running = True
+        if loop:
+            self.task = loop.create_task(self.stream())
+            return
+        self.thread = threading.Thread(target=self.run, name="user-data-stream", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        self.set_connected(False)
+        if self.task:
+            self.task.cancel()
+        if self.loop:
+            self.loop.call_soon_threadsafe(lambda: [t.cancel() for t in asyncio.all_tasks(self.loop)])
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def set_connected(self, connected:bool) -> None:
+        with self.condition:
+            self.connected = connected
+            if not connected:
+                self.orders = {}
+            self.condition.notify_all()
+            self.wake(*self.waiters)
+        if self.balances:
+            self.balances.set_streaming(connected)
+
+    def get_order(self, orderId:int) -> dict:
+        with self.condition:
+            order = self.orders.get(int(orderId), None)
+            return dict(order) if order else None
+
+    def wait_order(self, orderId:int, timeout:float) -> dict:
+        """Blocks until the order reaches a final status or `timeout` expires.
+
+        Returns the last known state, or None if the stream has no events for it.
+        """
+
+        orderId = int(orderId)
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                order = self.orders.get(orderId, None)
+                if order and order["status"] in FINAL_ORDER_STATUS:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.connected:
+                    break
+                self.condition.wait(remaining)
+            return dict(order) if order else None
+
+    async def wait_order_async(self, orderId:int, timeout:float) -> dict:
+        """`wait_order` for a coroutine, it sleeps until an event of the order arrives."""
+
+        orderId = int(orderId)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        event = asyncio.Event()
+        with self.condition:
+            self.waiters.setdefault(orderId, []).append((loop, event))
+        try:
+            while True:
+                with self.condition:
+                    order = self.orders.get(orderId, None)
+                    if (order and order["status"] in FINAL_ORDER_STATUS) or not self.connected:
+                        break
+                    event.clear()
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            with self.condition:
+                waiters = self.waiters.get(orderId, [])
+                waiters.remove((loop, event))
+                if not waiters:
+                    self.waiters.pop(orderId, None)
+        return self.get_order(orderId)
+
+    def wake(self, *orderIds) -> None:
+        # called holding the condition, the events belong to the loops of the waiters
+        for orderId in orderIds:
+            for loop, event in self.waiters.get(orderId, []):
+                loop.call_soon_threadsafe(event.set)
+
+    def on_execution_report(self, event:dict) -> None:
+        order = {
+            "symbol": event["s"],
+            "orderId": event["i"],
+            "clientOrderId": event["c"],
+            "side": event["S"],
+            "type": event["o"],
+            "timeInForce": event["f"],
+            "price": event["p"],
+            "origQty": event["q"],
+            "executedQty": event["z"],
+            "cummulativeQuoteQty": event["Z"],
+            "status": event["X"],
+            "updateTime": event["T"]
+        }
+        with self.condition:
+            self.orders[order["orderId"]] = order
+            self.condition.notify_all()
+            self.wake(order["orderId"])
+
+    def run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self.stream())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    async def stream(self) -> None:
+
+        delay = RECONNECT_DELAY
+        loop = asyncio.get_running_loop()
+        while self.running:
+            keepalive = None
+            try:
+                listen_key = await loop.run_in_executor(None, self.client.stream_get_listen_key)
+                async with websockets.connect(f"{self.stream_url}/{listen_key}") as ws:
+                    self.logger.info(f"[user_stream] - connected")
+                    self.set_connected(True)
+                    delay = RECONNECT_DELAY
+                    keepalive = asyncio.ensure_future(self.keepalive(listen_key))
+                    async for message in ws:
+                        event = json.loads(message)
+                        if event.get("e") == "executionReport":
+                            self.on_execution_report(event)
+                        elif event.get("e") == "outboundAccountPosition" and self.balances:
+                            self.balances.on_account_position(event)
+                        elif event.get("e") == "listenKeyExpired":
+                            self.logger.warning(f"[user_stream] - listenKey expired, reconnecting")
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.logger.warning(f"[user_stream] - disconnected: {exc}")
+            finally:
+                if keepalive:
+                    keepalive.cancel()
+
+            self.set_connected(False)
+            if self.running:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    async def keepalive(self, listen_key:str) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            try:
+                await loop.run_in_executor(None, lambda: self.client.stream_keepalive(listen_key))
+            except Exception as exc:
+                self.logger.warning(f"[user_stream] - keepalive failed: {exc}")
@@ -3,14 +3,16 @@ import sys
 import configparser
 import argparse
 import time
+import asyncio
 import traceback
-from decimal import Decimal, getcontext
 
-import random
-from random import randint
-
-from utils import Monitoring
+from utils import load_monitoring
 from lib import TradingBotClient
+from notify import PredictionListener, DEFAULT_NOTIFY_DIR, DEFAULT_NOTIFY_TIMEOUT
+from metrics import registry, load_exporter
+from profiling import PhaseClock, load_profiler
+from polling import PollingPolicy, load_phases, IDLE, BID, ERROR
+from strategy import SpotStrategy
 
 DEFAULT_LOGNAME="tradingbot"
 DEFAULT_LOGDIR="/tmp"
@@ -21,16 +23,32 @@ DEFAULT_SELL_INDEX = 9
 DEFAULT_BYPASS_ELAPSED_TIME_EXP=0
 DEFAULT_ELAPSED_TIME_EXP=60
 
-SLEEP_BUFFER_MIN=0.01
-SLEEP_BUFFER_MAX=5
-
 BACK_OFF_START_COUNT=1
-BACK_OFF_MULTIPLIER=0.5
 BACK_OFF_LIMIT=100
 
+
+class InlineSpotRunner(SpotStrategy):
+    """`SpotStrategy` of the single pair bot, every call and wait blocks the bot thread."""
+
+    async def call(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    async def gather(self, *calls) -> list:
+        return self.bot.gather(*calls)
+
+    async def buffer(self, phase:str=IDLE, deadline:float=None) -> None:
+        self.settings.buffer(phase, deadline)
+
+    async def wait_for_predictions(self, phase:str=IDLE, deadline:float=None) -> None:
+        self.settings.wait_for_predictions(phase, deadline)
+
+    async def wait_order_details(self, orderId:int, phase:str=BID) -> dict:
+        return self.settings.wait_order_details(orderId, phase)
+
+
 class Bot:
 
-    def __init__(self, config):
+    def __init__(self, config, logger=None, bot=None, listen:bool=True, profiler=None):
 
         self.config = config
         
@@ -40,16 +58,19 @@ class Bot:
         self.logname = config['trading']['trading_pair'].lower()
 
         # logging
-        log = Monitoring(logdir=self.logdir, debug=int(config['app']['debug']))
-        self.logger = log.get_logger(self.logname)
+        if logger:
+            self.logger = logger
+        else:
+            log = load_monitoring(config)
+            self.logger = log.get_logger(self.logname)
 
-        # sleep buffers
-        self.sleep_buffer_min = float(config['settings'].get('sleep_buffer_min', SLEEP_BUFFER_MIN))
-        self.sleep_buffer_max = float(config['settings'].get('sleep_buffer_max', SLEEP_BUFFER_MAX))
         self.back_off_start_count = float(config['settings'].get('back_off_start_count', BACK_OFF_START_COUNT))
 
+        # wait intervals picked from what the bot is waiting on
+        self.policy = PollingPolicy({ERROR: (self.back_off_start_count, BACK_OFF_LIMIT), **load_phases(config['settings'])})
+
         # get tradingpair info
-        self.bot = TradingBotClient(self.logger, **config)
+        self.bot = bot if bot else TradingBotClient(self.logger, **config)
 
         # trade settings
         self.buy_delay = int(config['trading'].get('buy_delay', DEFAULT_BUY_DELAY))
@@ -68,24 +89,73 @@ class Bot:
         self.bypass_elapsed_time_exp = int(config['trading'].get('bypass_elapsed_time_exp', DEFAULT_BYPASS_ELAPSED_TIME_EXP))
         self.elapsed_time_exp = int(config['trading'].get('elapsed_time_exp', DEFAULT_ELAPSED_TIME_EXP))
 
+        # prediction change notifications from the collector, falls back to polling
+        self.notify_timeout = float(config['settings'].get('notify_timeout', DEFAULT_NOTIFY_TIMEOUT))
+        self.listener = None
+        if listen and int(config['settings'].get('notify', 1)):
+            try:
+                self.listener = PredictionListener(
+                    name=self.logname, logger=self.logger,
+                    notify_dir=config['settings'].get('notify_dir', DEFAULT_NOTIFY_DIR)
+                )
+            except OSError as exc:
+                self.logger.warning(f"prediction notifications disabled, polling instead - {exc}")
+
+        # histograms of the exchange / db calls, served or written when configured
+        load_exporter(config['settings'], self.logger)
+
+        # profiling toggled at runtime by SIGUSR1 / SIGUSR2 or the metrics port, the engine passes its own
+        self.profiler = profiler if profiler else load_profiler(config['settings'], self.logname, self.logger)
+        self.clock = PhaseClock(self.trading_pair)
+
     def __repr__(self):
         return f"BotRunner - {self.run_forever}"
             
-    def buffer(self) -> None:
-        sleep_time = random.uniform(self.sleep_buffer_min, self.sleep_buffer_max)
-        self.logger.debug(f"sleep .. {sleep_time}")
+    def mark(self, phase:str) -> None:
+        # every wait is a safe point to switch the phase clock and start / stop the profiler
+        self.clock.enter(phase)
+        self.profiler.tick()
+
+    def buffer(self, phase:str=IDLE, deadline:float=None) -> None:
+        self.mark(phase)
+        sleep_time = self.policy.interval(phase, deadline)
+        self.logger.debug(f"[{phase}] sleep .. {sleep_time}")
+        registry.observe("poll_sleep_seconds", sleep_time, phase=phase)
         time.sleep(sleep_time)
 
+    def wait_for_predictions(self, phase:str=IDLE, deadline:float=None) -> None:
+        if not self.listener:
+            self.buffer(phase, deadline)
+            return
+
+        self.mark(phase)
+        # a notification wakes the bot up, the timeout only bounds the wait
+        timeout = self.notify_timeout if phase == IDLE else self.policy.interval(phase)
+        if deadline is not None:
+            timeout = self.policy.clamp(phase, timeout, deadline)
+        notified = self.listener.wait(symbol=self.symbol, timeout=timeout)
+        self.logger.debug(f"[wait_for_predictions] - {'notified' if notified else 'timeout'}")
+
+    def wait_order_details(self, orderId:int, phase:str=BID) -> dict:
+        # fill updates come from the user data stream when available, REST polling otherwise
+        details = self.bot.wait_order_details(
+            symbol=self.trading_pair, orderId=orderId, timeout=self.policy.cap(phase)
+        )
+        if details is None:
+            self.buffer(phase)
+            details = self.bot.get_order_details(symbol=self.trading_pair, orderId=orderId)
+        return details
+
     def backoff(self) -> None:
-        sleep_time = self.back_off_start_count + (self.back_off_start_count * BACK_OFF_MULTIPLIER)
+        self.mark(ERROR)
+        sleep_time = self.policy.interval(ERROR)
         self.logger.debug(f"[backoff] sleep .. {sleep_time}")
+        registry.observe("poll_sleep_seconds", sleep_time, phase=ERROR)
         time.sleep(sleep_time)
-        self.back_off_start_count += sleep_time
-        if self.back_off_start_count >= BACK_OFF_LIMIT:
-            self.back_off_start_count = BACK_OFF_START_COUNT
 
     def run(self, args):
 
+        self.profiler.install()
         while True:
             try:
                 if self.trade_type == "spot":
@@ -101,284 +171,10 @@ class Bot:
                 self.backoff()
 
     def run_spot(self):
+        # the shared lifecycle, alone on its loop so the blocking calls and sleeps don't stall anything else
+        asyncio.run(InlineSpotRunner(self).run_spot())
 
-        # check lotsize
-        if not self.bot.is_allowed_lotsize(trading_pair=self.trading_pair, amount=self.amount):
-            self.logger.info(f"Stopping bot..")
-            self.buffer()
-            return            
-
-        # show account
-        self.bot.show_account()
-        transactionId = 0
-
-        while True:
-        
-            # get predictions
-            predictions = self.bot.get_predictions(symbol=self.symbol)
-            if not predictions:
-                self.logger.info(f"no scraped predictions yet for {self.trading_pair} in pred_table")
-                self.buffer()
-                continue
-
-            try:
-                if int(predictions[0]['elapsed_time(min)']) <= self.buy_delay:
-                    self.logger.info(f"prediction is still less < {self.buy_delay} min(s) for {self.trading_pair} in pred_table")
-                    self.buffer()
-                    continue
-            except:
-                if predictions[0]['position'] == 'none' and predictions[0]['elapsed_time(min)'] == "-":
-                    self.logger.info(f"skipping .. {self.trading_pair} - no predictions yet ..")
-                    self.buffer()
-                    continue
-
-            # get open orders and get highest bid
-            bid_price = self.bot.get_order_book(amount=self.amount, symbol=self.trading_pair, position_type="bid")
-
-            # check if notonial size is okay
-            if not self.bot.is_allowed_notional_size(
-                    trading_pair=self.trading_pair, amount=self.amount, price=bid_price
-                ):
-                self.buffer()
-                continue
-
-            # place "bid" order
-            order = self.bot.set_order(
-                symbol=self.trading_pair, side="BUY", stype="LIMIT", 
-                quantity=self.amount, price=bid_price, timeInForce="GTC"
-            )
-
-            # generated transaction id
-            result = self.bot.save_requested_position({
-                "transactionId": transactionId,
-                "symbol": self.trading_pair,
-                "tradingType": self.trade_type,
-                "side": "BUY",
-                "amount": self.amount,
-                "orderId": order["orderId"],
-                "status": order["status"],
-                "buyPrice": bid_price,
-                "origBuyQty": float(order["origQty"]),
-                "executedBuyQty": float(order["executedQty"]),
-                "cummulativeBuyQuoteQty": float(order["cummulativeQuoteQty"])
-            })
-
-            transactionId = result["id"]
-            orderId = order["orderId"]
-            self.logger.info(f"[start] new transactionId: {transactionId}")
-
-            buyUpdateData = {
-                "transactionId": transactionId,
-                "orderId": orderId,
-                "status": order["status"]
-            }
-
-            bid_status = False            
-            for _ in range(self.bid_retry):
-
-                self.buffer()
-
-                details = self.bot.get_order_details(symbol=self.trading_pair, orderId=orderId)               
-                status = details["status"]
-
-                buyUpdateData["status"] = status
-                buyUpdateData["origBuyQty"] = float(details['executedQty'])
-                buyUpdateData["executedBuyQty"] = float(details['origQty'])
-                buyUpdateData["cummulativeBuyQuoteQty"] = float(details['cummulativeQuoteQty'])
-                
-                if status != "FILLED":
-                    self.logger.info(f"[{_}][bid] waiting order to be filled ..")
-                    self.bot.render_tbl(
-                        result=[{
-                            "trading_pair": self.trading_pair, "bid": bid_price, "status": status
-                        }], field_names=[
-                            "trading_pair", "bid", "status", "executedBuyQty", "origBuyQty", "percentage"
-                        ]
-                    )
-                    self.bot.save_requested_position(buyUpdateData)
-                
-                if status == "PARTIALLY_FILLED":
-                    self.logger.info(f"[{_}][bid] order partially filled ..")                    
-                    # update actual buy quantity
-                    buyUpdateData["buyPrice"] = float(details['price'])
-                    buyUpdateData["actualBuyQty"] = float(details['cummulativeQuoteQty']) / float(details['price'])
-                    self.bot.save_requested_position(buyUpdateData, render=True)
-
-                if status == "FILLED":
-                    self.logger.info(f"[{_}][bid] order filled ..")
-                    bid_status = True                   
-                    # update actual buy quantity
-                    buyUpdateData["buyPrice"] = float(details['price'])
-                    buyUpdateData["actualBuyQty"] = float(details['cummulativeQuoteQty']) / float(details['price'])
-                    self.bot.save_requested_position(buyUpdateData, render=True)
-                    break
-
-            # skip next steps if bid is unsuccessful
-            if bid_status == False:
-                self.logger.info(f"cancelling orderId: {orderId} @ bid: {bid_price}")
-                result = self.bot.cancel_order(symbol=self.trading_pair, orderId=orderId)
-                buyUpdateData['status'] = result['status']
-                self.bot.save_requested_position(buyUpdateData)
-                continue
-            
-            # buy check point
-            self.bot.show_account(symbol=self.symbol)
-            self.logger.info(f"[{_}][buy] transaction summary")
-            self.bot.render_tbl(result=[{
-                    "trading_pair": self.trading_pair, 
-                    "quantity": details['executedQty'], 
-                    "bid_price": bid_price,
-                    "total_amount": float(bid_price) * float( buyUpdateData["executedBuyQty"])
-                }],  
-                field_names=["trading_pair", "quantity", "bid_price", "total_amount"]
-            )
-
-            # wait for selling
-            sell_signal = False
-            while True:
-
-                # get predictions
-                predictions = self.bot.get_predictions(symbol=self.symbol)
-
-                # calculate current price - profit/loss
-                profitData = self.bot.get_profit(transactionId=transactionId, bid_price=bid_price)
-                profitData['transactionId'] = transactionId
-                profitData['status'] = status
-
-                # if position is `none` bot will force close the position
-                sell_signal = True if predictions[0]['position'] == 'none' else False
-                # get current elapsed_time
-                elapsed_time = float(predictions[0]['elapsed_time(min)'])
-                
-                if float(elapsed_time) >= float(self.elapsed_time_exp):
-                    sell_signal = True
-                    self.logger.info(f"[sell_signal] reached elapsed_time force sell: {self.trading_pair} position")
-                else:
-                    self.logger.info(f"[sell_signal] waiting for sell signal for {self.trading_pair}")
-                    self.logger.info(f"[sell_signal] sell(?):{'Yes' if sell_signal else 'No'}")
-                    self.logger.info("[sell_signal] unrealized profit: {unrealizedProfit}".format(**profitData))
-
-                self.bot.save_requested_position(profitData)
-
-                if sell_signal:
-                    break
-
-                self.buffer()
 
-            sellUpdateData = {
-                "transactionId": transactionId,
-                "orderId": orderId
-            }
-            
-            sell_index = self.sell_index
-            while sell_signal:
-
-                self.buffer()
-                if sell_index > 0:
-                    sell_index -= 1
-                
-                # get the actual executed buy quantity aka "SELL" amount
-                sell_data = self.bot.get_order_status(transactionId=transactionId)
-                original_sell_amount = float(sell_data['abq'])
-
-                # need to check if there are coins that were partially filled, need to sell those remaining coins also
-                sell_amount = self.bot.check_remaining_coins(symbol=self.symbol, sell_amount=original_sell_amount)
-
-                # get open orders and get highest bid
-                sell_price = self.bot.get_order_book(
-                    amount=sell_amount, symbol=self.trading_pair, position_type="ask", index=sell_index
-                )
-
-                # check if notonial size is okay
-                if not self.bot.is_allowed_notional_size(
-                    trading_pair=self.trading_pair, amount=sell_amount, price=sell_price
-                ):
-                    continue
-
-                # place "ask" order
-                sell_order = self.bot.close_order(
-                    symbol=self.trading_pair, side="SELL", stype="LIMIT", 
-                    quantity=sell_amount, price=sell_price
-                )
-
-                if not sell_order:
-                    continue
-
-                sell_amount = sell_order['origQty']
-                
-                sellId = sell_order["orderId"]
-                status = sell_order["status"]
-                sellUpdateData["side"] = "SELL"
-                sellUpdateData["status"] = status
-                sellUpdateData["sellId"] = sellId
-                sellUpdateData["sellPrice"] = sell_price                
-
-                for _ in range(self.sell_retry):
-
-                    self.buffer()
-                    details = self.bot.get_order_details(symbol=self.trading_pair, orderId=sellId)
-                    status = details["status"]
-
-                    # calculate current price - profit/loss
-                    profitData = self.bot.get_profit(transactionId=transactionId, bid_price=bid_price)
-                    # update sell data
-                    sellUpdateData["status"] = status
-                    sellUpdateData["unrealizedProfit"] = profitData['unrealizedProfit']
-                    sellUpdateData["origSellQty"] = details["origQty"]
-                    sellUpdateData["executedSellQty"] = details["executedQty"]
-                    sellUpdateData["cummulativeSellQuoteQty"] = details["cummulativeQuoteQty"]
-
-                    if status != "FILLED":
-                        self.logger.info(f"[{_}][sell] waiting order to be filled ..")                        
-                        self.bot.save_requested_position(sellUpdateData)
-                    
-                    if status == "PARTIALLY_FILLED":
-                        self.logger.info(f"[{_}][sell] order partially filled ..")                        
-                        # update actual sell quantity
-                        sellUpdateData["sellPrice"] = float(details['price'])
-                        sellUpdateData["actualSellQty"] = float(float(details['cummulativeQuoteQty']) / float(details['price']))
-                        self.bot.save_requested_position(sellUpdateData)
-
-                    if status == "FILLED": 
-                        # set precision
-                        getcontext().prec = self.bot.base_asset_precision                        
-                        # update actual sell quantity
-                        sellUpdateData["sellPrice"] = float(details['price'])
-                        sellUpdateData["actualSellQty"] = "{:.{precision}f}".format(Decimal(sell_amount), precision=self.bot.base_asset_precision)
-                        break
-
-                # refresh retry to next available sell price iteration
-                if status != "FILLED":
-                    cancel_order = self.bot.cancel_order(symbol=self.trading_pair, orderId=sellId)
-                    sellUpdateData["status"] = cancel_order["status"]                    
-                    self.bot.save_requested_position(sellUpdateData)
-                    continue
-
-                if status == "FILLED":
-                    self.logger.info(f"[{_}][sell] transaction summary")
-                    # update actual sell quantity
-                    sellUpdateData["sellPrice"] = float(details['price'])
-                    sellUpdateData["actualSellQty"] = float(details['cummulativeQuoteQty']) / float(details['price'])
-                    # calculate current price - profit/loss
-                    profitData = self.bot.get_profit(transactionId=transactionId, bid_price=bid_price, sell_price=sell_price)
-                    sellUpdateData["unrealizedProfit"] = profitData['unrealizedProfit']
-                    sellUpdateData["realizedProfit"] = profitData['realizedProfit']                 
-                    sellUpdateData["isExpired"] = 1
-                    sellUpdateData["status"] = "CLOSED"
-                    self.logger.info(f"[{_}][sell] transaction saved..")
-                    self.bot.save_requested_position(sellUpdateData, render=True)
-                    break                
-
-                
-            self.bot.show_account(symbol=self.symbol)
-            self.buffer()
-            if not self.run_forever:
-                break
-            
-            self.logger.info(f"[end] finish transactionId: {transactionId}")
-            # create new transaction
-            transactionId = 0
-                    
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(
@@ -1,18 +1,39 @@
 import os
 import sqlite3
 import traceback
+import threading
 import time
 
+from metrics import registry, statement_labels
+
 
 MAX_RETRY_COUNT = 5
+# sqlite3 keeps an LRU of prepared statements keyed by sql text, bound
+# parameters keep the sql text stable so hot queries are parsed only once
+STATEMENT_CACHE_SIZE = 256
+
+# connection pragmas, overridable from config.ini [database]
+DEFAULT_JOURNAL_MODE = "wal"
+DEFAULT_BUSY_TIMEOUT = 5000
+DEFAULT_SYNCHRONOUS = "normal"
+DEFAULT_CACHE_SIZE = -16000
+DEFAULT_MMAP_SIZE = 134217728
+DEFAULT_TEMP_STORE = "memory"
+
+JOURNAL_MODES = ("delete", "truncate", "persist", "memory", "wal", "off")
+SYNCHRONOUS_MODES = ("off", "normal", "full", "extra")
+TEMP_STORE_MODES = ("default", "file", "memory")
 
 class SQLiteDB:
 
-    def __init__(self, db, logger):
+    def __init__(self, db, logger, config:dict=None):
         self.dbname = db
+        self.logger = logger
+        self.load_pragmas(config or {})
+        # one connection shared by every thread, statements are serialized on it
+        self.lock = threading.RLock()
         self.db = self.connect()
         self.retry_count = 1
-        self.logger = logger
 
     def __del__(self):
         self.db.close()
@@ -23,8 +44,33 @@ class SQLiteDB:
             d[col[0]] = row[idx]
         return d
 
+    def load_pragmas(self, config:dict) -> None:
+        self.journal_mode = self.get_choice(config, 'journal_mode', DEFAULT_JOURNAL_MODE, JOURNAL_MODES)
+        self.busy_timeout = int(config.get('busy_timeout', DEFAULT_BUSY_TIMEOUT))
+        self.synchronous = self.get_choice(config, 'synchronous', DEFAULT_SYNCHRONOUS, SYNCHRONOUS_MODES)
+        self.cache_size = int(config.get('cache_size', DEFAULT_CACHE_SIZE))
+        self.mmap_size = int(config.get('mmap_size', DEFAULT_MMAP_SIZE))
+        self.temp_store = self.get_choice(config, 'temp_store', DEFAULT_TEMP_STORE, TEMP_STORE_MODES)
+
+    def get_choice(self, config:dict, key:str, default:str, choices:tuple) -> str:
+        # pragma values can't be bound as parameters, only allow known keywords
+        value = str(config.get(key, default)).lower()
+        if value not in choices:
+            raise ValueError(f"Invalid [database] {key}: {value} - expected one of {choices}")
+        return value
+
     def connect(self) -> object:
-        db = sqlite3.connect(self.dbname)
+        db = sqlite3.connect(
+            self.dbname, timeout=self.busy_timeout / 1000, cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False
+        )
+        db.row_factory = self.dict_factory
+        db.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        db.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        db.execute(f"PRAGMA synchronous = {self.synchronous}")
+        db.execute(f"PRAGMA cache_size = {self.cache_size}")
+        db.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        db.execute(f"PRAGMA temp_store = {self.temp_store}")
         return db
 
     def reconnect(self) -> object:
@@ -35,33 +81,53 @@ class SQLiteDB:
     def purge_tables(self) -> None:
         return NotImplemented
 
-    def execute_sql_with_retry(self, sql, commit=False, fetch_one=False) -> object:
+    def execute_sql_with_retry(self, sql, params=(), commit=False, fetch_one=False, many=False) -> object:
+        operation, table = statement_labels(sql)
+        # includes the wait for the connection lock, that is where contention between pairs shows
+        return registry.timed(
+            "db_query", lambda: self.execute(sql, params, commit, fetch_one, many), operation=operation, table=table
+        )
+
+    def execute(self, sql, params, commit, fetch_one, many) -> object:
         while True:
-            try:
-                if commit:
-                    cur = self.db.cursor()
-                    cur.execute(sql)
-                    self.db.commit()
-                    return
-                else:
-                    self.db.row_factory = self.dict_factory
-                    cur = self.db.cursor()
-                    cur.execute(sql)
-                    if fetch_one:                       
-                        return cur.fetchone()
-                    else:
-                        return cur.fetchall()
-            except sqlite3.Error:
-                self.logger.info(f"Database connection error. Retrying... sleep::{self.retry_count}")
-                time.sleep(self.retry_count)
-                self.retry_count = min(self.retry_count * 2, MAX_RETRY_COUNT)
+            with self.lock:
+                try:
+                    return self.run_statement(sql, params, commit, fetch_one, many)
+                except sqlite3.Error:
+                    registry.inc("db_retries_total")
+                    self.logger.info(f"Database connection error. Retrying... sleep::{self.retry_count}")
+                    sleep_time = self.retry_count
+                    self.retry_count = min(self.retry_count * 2, MAX_RETRY_COUNT)
+            # the lock is released for the backoff, the other pairs keep using the connection meanwhile
+            time.sleep(sleep_time)
+            with self.lock:
                 self.reconnect()
 
-    def insert(self, sql) -> None:
-        self.execute_sql_with_retry(sql, commit=True)
+    def run_statement(self, sql, params, commit, fetch_one, many) -> object:
+        cur = self.db.cursor()
+        if commit:
+            if many:
+                cur.executemany(sql, params)
+                self.db.commit()
+                return cur.rowcount
+            cur.execute(sql, params)
+            self.db.commit()
+            return cur.lastrowid
+        cur.execute(sql, params)
+        if fetch_one:
+            return cur.fetchone()
+        return cur.fetchall()
+
+    def insert(self, sql, params=()) -> int:
+        # returns the rowid of the last inserted row
+        return self.execute_sql_with_retry(sql, params=params, commit=True)
+
+    def insert_many(self, sql, params_seq) -> int:
+        # returns the number of rows changed
+        return self.execute_sql_with_retry(sql, params=list(params_seq), commit=True, many=True)
 
-    def select(self, sql) -> dict:
-        return self.execute_sql_with_retry(sql)
+    def select(self, sql, params=()) -> dict:
+        return self.execute_sql_with_retry(sql, params=params)
 
-    def select_one(self, sql) -> dict:
-        return self.execute_sql_with_retry(sql, commit=False, fetch_one=True)
\ No newline at end of file
+    def select_one(self, sql, params=()) -> dict:
+        return self.execute_sql_with_retry(sql, params=params, commit=False, fetch_one=True)
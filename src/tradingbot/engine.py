@@ -0,0 +1,290 @@
+import sys
+import asyncio
+import logging
+import argparse
+import traceback
+import configparser
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from db import SQLiteDB
+from utils import load_monitoring
+from lib import TradingBotClient, load_fanout_executor
+from bot import Bot
+from metrics import registry, load_exporter
+from profiling import load_profiler
+from polling import IDLE, BID, ERROR
+from strategy import SpotStrategy
+from notify import PredictionListener, DEFAULT_NOTIFY_DIR
+from api.binance_spot import BinanceSpotAPI
+from api.binance_spot_async import AsyncBinanceSpotAPI
+from api.aio import SyncBridge
+
+DEFAULT_LOGNAME = "engine"
+DEFAULT_WORKERS = 8
+SUPPORTED_SDKS = ('binance_spot', 'binance_spot_async')
+
+
+class PairLogger(logging.LoggerAdapter):
+    """Shared engine logger that prefixes every record with the trading pair."""
+
+    def process(self, msg, kwargs):
+        return f"[{self.extra['pair']}] {msg}", kwargs
+
+
+class TradingEngine:
+    """Runs the spot lifecycle of many trading pairs as coroutines in one process.
+
+    All pairs share one exchange client, one db connection and one logger. Blocking
+    sdk and db calls run on a small thread pool, sleeps and waits on predictions or
+    fills are coroutine waits that don't hold a thread.
+
+    Pairs are listed in `[engine] pairs`, each `[trading:<PAIR>]` section overrides
+    the keys of `[trading]` for that pair.
+    """
+
+    def __init__(self, config):
+
+        self.config = config
+        engine_conf = config['engine']
+        self.pairs = [p.strip().upper() for p in engine_conf['pairs'].split(",") if p.strip()]
+        if not self.pairs:
+            raise ValueError("[engine] pairs is empty")
+
+        log = load_monitoring(config)
+        self.logger = log.get_logger(engine_conf.get('logname', DEFAULT_LOGNAME))
+        load_exporter(config['settings'], self.logger)
+        self.profiler = load_profiler(config['settings'], engine_conf.get('logname', DEFAULT_LOGNAME), self.logger)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(engine_conf.get('workers', DEFAULT_WORKERS)), thread_name_prefix="engine"
+        )
+        # side by side reads of every pair, a pool per pair would add fanout_workers threads each
+        self.fanout = load_fanout_executor(config['settings'])
+
+        # shared exchange client and db writer
+        self.db = SQLiteDB(db=config['database']['dbname'], logger=self.logger, config=config['database'])
+        self.client = None
+
+        self.listener = None
+        self.events = {}
+        self.runners = []
+
+    def __repr__(self):
+        return f"TradingEngine - pairs:{len(self.pairs)}"
+
+    def pair_config(self, pair:str) -> dict:
+        config = {section: dict(self.config[section]) for section in self.config.sections()}
+        config['trading'] = dict(self.config['trading'])
+        config['trading']['trading_pair'] = pair
+        override = f"trading:{pair}"
+        if self.config.has_section(override):
+            config['trading'].update(self.config[override])
+        return config
+
+    def load_client(self) -> BinanceSpotAPI:
+        config = self.pair_config(self.pairs[0])
+        sdk = config['settings']['sdk']
+        if sdk not in SUPPORTED_SDKS:
+            raise ValueError(f"engine only supports the {', '.join(SUPPORTED_SDKS)} sdks, got {sdk}")
+        # the streams are started on the engine loop instead of their own threads
+        config['settings']['depth_stream'] = 0
+        config['settings']['user_stream'] = 0
+        if sdk == 'binance_spot_async':
+            return AsyncBinanceSpotAPI(config, self.logger)
+        return BinanceSpotAPI(config, self.logger)
+
+    async def connect_client(self, loop) -> None:
+        """Loads the shared client, the async one connects on the engine loop and is bridged
+        for the pair bots, whose calls run on the executor."""
+
+        client = await loop.run_in_executor(self.executor, self.load_client)
+        if isinstance(client, AsyncBinanceSpotAPI):
+            await client.connect()
+            client = SyncBridge(client, loop)
+        self.client = client
+
+    def load_runners(self) -> list:
+        runners = []
+        for pair in self.pairs:
+            config = self.pair_config(pair)
+            logger = PairLogger(self.logger, {"pair": pair})
+            client = TradingBotClient(logger, client=self.client, db=self.db, executor=self.fanout, **config)
+            bot = Bot(config=config, logger=logger, bot=client, listen=False, profiler=self.profiler)
+            runners.append(SpotPairRunner(engine=self, bot=bot))
+        return runners
+
+    def start_streams(self, loop) -> None:
+        settings = self.config['settings']
+        if int(settings.get('user_stream', 0)):
+            self.client.start_user_stream(loop=loop)
+        if int(settings.get('depth_stream', 0)):
+            for pair in self.pairs:
+                self.client.start_depth_stream(pair, loop=loop)
+
+    def start_listener(self, loop) -> None:
+        settings = self.config['settings']
+        if not int(settings.get('notify', 1)):
+            return
+        try:
+            self.listener = PredictionListener(
+                name=DEFAULT_LOGNAME, logger=self.logger, notify_dir=settings.get('notify_dir', DEFAULT_NOTIFY_DIR)
+            )
+        except OSError as exc:
+            self.logger.warning(f"prediction notifications disabled, polling instead - {exc}")
+            return
+        loop.add_reader(self.listener.sock.fileno(), self.on_notification)
+
+    def on_notification(self) -> None:
+        cryptos = self.listener.drain()
+        for symbol, event in self.events.items():
+            # an empty payload means `everything changed`
+            if not cryptos or symbol in cryptos:
+                event.set()
+
+    def get_event(self, symbol:str) -> asyncio.Event:
+        symbol = symbol.lower()
+        if symbol not in self.events:
+            self.events[symbol] = asyncio.Event()
+        return self.events[symbol]
+
+    async def call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        # the pairs all run on the loop thread, that is the one profiled
+        self.profiler.install()
+        await self.connect_client(loop)
+        self.runners = await loop.run_in_executor(self.executor, self.load_runners)
+        self.start_streams(loop)
+        self.start_listener(loop)
+        self.logger.info(f"[engine] - running {len(self.runners)} pair(s): {','.join(self.pairs)}")
+        try:
+            await asyncio.gather(*(runner.run() for runner in self.runners))
+        finally:
+            if self.listener:
+                loop.remove_reader(self.listener.sock.fileno())
+                self.listener.close()
+            if isinstance(self.client, SyncBridge):
+                await self.client.target.close()
+            self.executor.shutdown(wait=False)
+            self.fanout.shutdown(wait=False)
+
+
+class SpotPairRunner(SpotStrategy):
+    """The `SpotStrategy` lifecycle of one trading pair on the engine loop.
+
+    Calls run on the engine executor, sleeps and waits on predictions or fills are
+    coroutine waits.
+    """
+
+    render_tables = False
+
+    def __init__(self, engine:TradingEngine, bot:Bot):
+        super().__init__(bot)
+        self.engine = engine
+        self.prediction_event = engine.get_event(self.symbol)
+
+    def __repr__(self):
+        return f"SpotPairRunner - {self.trading_pair}"
+
+    async def call(self, fn, *args, **kwargs):
+        return await self.engine.call(fn, *args, **kwargs)
+
+    async def gather(self, *calls) -> list:
+        return list(await asyncio.gather(*(self.call(fn) for fn in calls)))
+
+    def mark(self, phase:str) -> None:
+        self.clock.enter(phase)
+        self.engine.profiler.tick()
+
+    async def buffer(self, phase:str=IDLE, deadline:float=None) -> None:
+        self.mark(phase)
+        sleep_time = self.policy.interval(phase, deadline)
+        self.logger.debug(f"[{phase}] sleep .. {sleep_time}")
+        registry.observe("poll_sleep_seconds", sleep_time, phase=phase)
+        await asyncio.sleep(sleep_time)
+
+    async def backoff(self) -> None:
+        self.mark(ERROR)
+        sleep_time = self.policy.interval(ERROR)
+        self.logger.debug(f"[backoff] sleep .. {sleep_time}")
+        registry.observe("poll_sleep_seconds", sleep_time, phase=ERROR)
+        await asyncio.sleep(sleep_time)
+
+    async def wait_for_predictions(self, phase:str=IDLE, deadline:float=None) -> None:
+        if not self.engine.listener:
+            await self.buffer(phase, deadline)
+            return
+
+        self.mark(phase)
+        # a notification wakes the pair up, the timeout only bounds the wait
+        timeout = self.settings.notify_timeout if phase == IDLE else self.policy.interval(phase)
+        if deadline is not None:
+            timeout = self.policy.clamp(phase, timeout, deadline)
+        try:
+            await asyncio.wait_for(self.prediction_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.prediction_event.clear()
+
+    async def wait_order_details(self, orderId:int, phase:str=BID) -> dict:
+        # read fills from the in memory user data stream state, REST polling otherwise
+        stream = getattr(self.bot.client, "user_stream", None)
+        if stream and stream.is_ready():
+            # woken by the executionReport of the order, no wakeups while nothing happens
+            order = await stream.wait_order_async(orderId=orderId, timeout=self.policy.cap(phase))
+            if order:
+                self.logger.info(f"[order details] - stream - {order}")
+                return order
+        else:
+            await self.buffer(phase)
+        return await self.call(self.bot.get_order_details, symbol=self.trading_pair, orderId=orderId)
+
+    async def run(self) -> None:
+
+        while True:
+            try:
+                if self.trade_type == "spot":
+                    await self.run_spot()
+                    if not self.settings.run_forever:
+                        break
+                else:
+                    self.logger.info("Nothing to run.. ")
+                    await self.buffer()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if not self.settings.run_forever:
+                    break
+                self.logger.warning(f"Error running bot.. - {exc}")
+                self.logger.info(traceback.format_exc())
+                await self.backoff()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="tradingbot engine",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="python engine.py --config=config.ini"
+    )
+
+    parser.add_argument(
+        '--config',
+        dest='config',
+        type=str,
+        help='config path'
+    )
+
+    args = parser.parse_args()
+    config = configparser.ConfigParser()
+    config.read(args.config)
+
+    engine = TradingEngine(config=config)
+    try:
+        asyncio.run(engine.run())
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,105 @@
+import json
+import time
+import fcntl
+
+from models import SymbolInfoTable
+
+
+DEFAULT_EXCHANGE_INFO_TTL = 86400
+# an expired row kept after a failed refresh, or a symbol the exchange doesn't list,
+# is served from memory for this long before the next try
+STALE_RETRY = 300
+# only what the bot reads, the rest of the exchange info isn't kept
+SYMBOL_INFO_KEYS = ("symbol", "status", "baseAsset", "quoteAsset", "baseAssetPrecision", "quotePrecision", "filters")
+TRADING_STATUS = "TRADING"
+
+
+class ExchangeInfoCache:
+    """Symbol filters of every listed pair, kept in the `symbol_info` table for `ttl` seconds.
+
+    All bots using the same database share it: once one of them has fetched the
+    exchange info the others start from the table without any REST call. The
+    refresh is serialized with a lock file next to the database so bots restarting
+    together only fetch once. The symbols read are also kept in memory, each until
+    its row expires, and so are the ones missing from a refresh.
+    """
+
+    def __init__(self, db, client, logger, market:str, ttl:int=DEFAULT_EXCHANGE_INFO_TTL, lock_path:str=None):
+        self.db = db
+        self.client = client
+        self.logger = logger
+        self.market = market
+        self.ttl = ttl
+        self.lock_path = lock_path
+        self.tbl = SymbolInfoTable()
+        # symbol -> (expires at, filters)
+        self.symbols = {}
+
+    def __repr__(self):
+        return f"ExchangeInfoCache - {self.market} - symbols:{len(self.symbols)}"
+
+    def is_fresh(self, row:dict) -> bool:
+        # the same expiry as the in memory entries
+        return row is not None and row["ua"] + self.ttl > time.time()
+
+    def load(self, symbol:str, fresh:bool=True) -> dict:
+        row = self.tbl.get_symbol_info(db=self.db, market=self.market, symbol=symbol)
+        if row is None or (fresh and not self.is_fresh(row)):
+            return None
+        expires_at = row["ua"] + self.ttl if fresh else int(time.time()) + STALE_RETRY
+        info = json.loads(row["f"])
+        self.symbols[symbol] = (expires_at, info)
+        return info
+
+    def get_symbol_info(self, symbol:str) -> dict:
+        """Filters of `symbol`, None when the exchange doesn't list it."""
+
+        symbol = symbol.upper()
+        expires_at, info = self.symbols.get(symbol, (0, None))
+        if expires_at > time.time():
+            return info
+
+        info = self.load(symbol)
+        if info:
+            return info
+
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # another bot may have refreshed it while we waited on the lock
+                info = self.load(symbol)
+                if not info and self.refresh():
+                    info = self.symbols.get(symbol, (0, None))[1]
+                elif not info:
+                    # keep trading on the expired row rather than not starting at all
+                    info = self.load(symbol, fresh=False)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        if info is None:
+            # not listed, no lock or refresh again for it until the retry
+            self.symbols[symbol] = (time.time() + STALE_RETRY, None)
+        return info
+
+    def refresh(self) -> bool:
+        try:
+            result = self.client.get_exchange_info()
+        except Exception as err:
+            self.logger.warning(f"[exchange_info] - refresh failed - {err}")
+            return False
+
+        ua = int(time.time())
+        symbols = {}
+        rows = []
+        for item in result["symbols"]:
+            info = {k: item[k] for k in SYMBOL_INFO_KEYS if k in item}
+            symbols[item["symbol"]] = (ua + self.ttl, info)
+            rows.append((item["symbol"], item.get("status", None), json.dumps(info, separators=(",", ":"))))
+
+        self.tbl.save_symbols(db=self.db, market=self.market, rows=rows, ua=ua)
+        self.logger.info(f"[exchange_info] - cached {len(rows)} {self.market} symbols")
+        self.symbols = symbols
+        return True
+
+    def is_supported(self, symbol:str) -> bool:
+        info = self.get_symbol_info(symbol)
+        return info is not None and info.get("status", TRADING_STATUS) == TRADING_STATUS
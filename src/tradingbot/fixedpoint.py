@@ -0,0 +1,167 @@
+from fractions import Fraction
+from functools import lru_cache, total_ordering
+
+
+FLOOR = "floor"
+CEILING = "ceiling"
+HALF_EVEN = "half_even"
+
+
+def divide(n:int, d:int, rounding:str=HALF_EVEN) -> int:
+    # n / d for d > 0, rounded to an integer
+    q, r = divmod(n, d)
+    if not r or rounding == FLOOR:
+        return q
+    if rounding == CEILING:
+        return q + 1
+    twice = 2 * r
+    return q + 1 if twice > d or (twice == d and q % 2) else q
+
+
+@lru_cache(maxsize=4096, typed=True)
+def parse_value(value) -> tuple:
+    """(units, places) of a decimal string such as "0.00100000" or "1e-05", or of a float.
+
+    Cached, the same prices and sizes keep coming back from the exchange and the db.
+    """
+
+    text = repr(value) if isinstance(value, float) else str(value)
+    mantissa, e, exponent = text.strip().lower().partition("e")
+    sign = -1 if mantissa.startswith("-") else 1
+    whole, _, fraction = mantissa[1:].partition(".") if mantissa[:1] in "+-" else mantissa.partition(".")
+    exponent_digits = exponent[1:] if exponent[:1] in "+-" else exponent
+    if not (whole + fraction).isdigit() or (e and not exponent_digits.isdigit()):
+        raise ValueError(f"invalid fixed point value: {text!r}")
+    units = sign * int(whole + fraction)
+    places = len(fraction) - int(exponent or 0)
+    if places < 0:
+        return units * 10 ** -places, 0
+    return units, places
+
+
+@total_ordering
+class Fixed:
+    """A decimal number stored as `units` x 10^-`places`.
+
+    Sums, differences and products are exact integer arithmetic, rounding only
+    happens in `rescale` / `quantize` / `format`, with the mode given there. No
+    decimal context is involved, so it is safe to use from any thread. Strings,
+    ints and floats (through their shortest repr) are accepted wherever a Fixed
+    is.
+
+    Values keep the scale of their inputs rather than being held at the
+    symbol's stepSize / tickSize scale: a product carries the places of both
+    factors and is rounded once, when it is quantized or formatted for the
+    wire. Rescaling every product would round twice in `get_profit`.
+    """
+
+    __slots__ = ("units", "places")
+
+    def __init__(self, units:int, places:int=0):
+        self.units = units
+        self.places = places
+
+    @classmethod
+    def parse(cls, value, places:int=None, rounding:str=HALF_EVEN) -> "Fixed":
+        if type(value) is Fixed:
+            fixed = value
+        elif type(value) is int:
+            fixed = cls(value)
+        else:
+            fixed = cls(*parse_value(value))
+        return fixed if places is None else fixed.rescale(places, rounding)
+
+    def rescale(self, places:int, rounding:str=HALF_EVEN) -> "Fixed":
+        if places >= self.places:
+            return Fixed(self.units * 10 ** (places - self.places), places)
+        return Fixed(divide(self.units, 10 ** (self.places - places), rounding), places)
+
+    def quantize(self, step:"Fixed", rounding:str=FLOOR) -> "Fixed":
+        """The multiple of `step` (a tickSize / stepSize) next to this value, FLOOR by default."""
+
+        step = Fixed.parse(step)
+        places = max(self.places, step.places)
+        size = step.rescale(places).units
+        return Fixed(divide(self.rescale(places).units, size, rounding) * size, places)
+
+    def normalize(self) -> "Fixed":
+        # without the trailing zeros, "0.00100000" -> "0.001"
+        units, places = self.units, self.places
+        while places and not units % 10:
+            units //= 10
+            places -= 1
+        return Fixed(units, places)
+
+    def format(self, places:int, rounding:str=HALF_EVEN) -> str:
+        """Wire string with exactly `places` decimals, as "{:.{places}f}" of a Decimal would give."""
+
+        if places == self.places:
+            return str(self)
+        return str(self.rescale(places, rounding))
+
+    def align(self, other) -> tuple:
+        if type(other) is not Fixed:
+            other = Fixed.parse(other)
+        if self.places == other.places:
+            return self.units, other.units, self.places
+        places = max(self.places, other.places)
+        return self.rescale(places).units, other.rescale(places).units, places
+
+    def __add__(self, other):
+        a, b, places = self.align(other)
+        return Fixed(a + b, places)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        a, b, places = self.align(other)
+        return Fixed(a - b, places)
+
+    def __rsub__(self, other):
+        a, b, places = self.align(other)
+        return Fixed(b - a, places)
+
+    def __mul__(self, other):
+        if type(other) is not Fixed:
+            other = Fixed.parse(other)
+        return Fixed(self.units * other.units, self.places + other.places)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Fixed(-self.units, self.places)
+
+    def __abs__(self):
+        return Fixed(abs(self.units), self.places)
+
+    def __eq__(self, other):
+        try:
+            a, b, _ = self.align(other)
+        except (ValueError, TypeError):
+            return NotImplemented
+        return a == b
+
+    def __lt__(self, other):
+        a, b, _ = self.align(other)
+        return a < b
+
+    def __hash__(self):
+        # equal to the hash of the same value as an int, Fraction or Decimal
+        if not self.units % 10 ** self.places:
+            return hash(self.units // 10 ** self.places)
+        return hash(Fraction(self.units, 10 ** self.places))
+
+    def __bool__(self):
+        return self.units != 0
+
+    def __float__(self):
+        return self.units / 10 ** self.places
+
+    def __str__(self):
+        if not self.places:
+            return str(self.units)
+        digits = str(abs(self.units)).rjust(self.places + 1, "0")
+        return f"{'-' if self.units < 0 else ''}{digits[:-self.places]}.{digits[-self.places:]}"
+
+    def __repr__(self):
+        return f"Fixed('{self}')"
@@ -1,28 +1,49 @@
-import math
 import random
 import time
-import json
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from db import SQLiteDB
 from models import PredTable, TradingTable
+from exchange_info import ExchangeInfoCache, DEFAULT_EXCHANGE_INFO_TTL
+from render import LazyJson
+from metrics import InstrumentedClient
+from fixedpoint import Fixed, HALF_EVEN
 
 from api.binance_futures import BinanceFuturesAPI
 from api.binance_spot import BinanceSpotAPI
+from api.binance_spot_async import AsyncBinanceSpotAPI
+from api.binance_futures_async import AsyncBinanceFuturesAPI
+from api.aio import SyncBridge, start_loop_thread
 
-from decimal import Decimal, getcontext
+from functools import partial
 
 SLEEP_BUFFER_MIN=0.01
 SLEEP_BUFFER_MAX=5
+FANOUT_WORKERS=4
+# adapter calls that reach the exchange, timed per method
+EXCHANGE_CALLS = (
+    "get_prices", "set_order", "get_order_details", "wait_order_details", "get_current_position",
+    "close_order", "cancel_order", "get_order_book", "load_order_book", "show_account", "get_account",
+    "get_balance", "get_open_orders", "get_exchange_info"
+)
+
+
+def load_fanout_executor(settings:dict) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=int(settings.get('fanout_workers', FANOUT_WORKERS)), thread_name_prefix="fanout"
+    )
+
 
 class TradingBotClient:
-    def __init__(self, logger, **config):
+    def __init__(self, logger, client=None, db=None, executor=None, **config):
 
         self.config = config
         self.sdk = config['settings']['sdk']
         self.logger = logger
 
-        self.client = self.load_sdk_client(sdk=self.sdk)
-        self.db = SQLiteDB(db=config['database']['dbname'], logger=logger)
+        # exchange client, db and fanout pool can be shared between pairs running in one process
+        self.client = InstrumentedClient(client if client else self.load_sdk_client(sdk=self.sdk), EXCHANGE_CALLS)
+        self.db = db if db else SQLiteDB(db=config['database']['dbname'], logger=logger, config=config['database'])
 
         tf_conf = config['trading']
         self.trading_pair = tf_conf['trading_pair']
@@ -30,25 +51,63 @@ class TradingBotClient:
         self.trade_type = tf_conf["trade_type"]
 
         self.trd_tbl = TradingTable(self.logger)
-        self.trading_info = self.client.get_symbol_info(trading_pair=self.trading_pair)
-        self.logger.info(f"[trading_filter] - {json.dumps(self.trading_info, indent=2)}")
+        # symbol filters shared by every bot on the database, REST only once they expire
+        self.exchange_info = ExchangeInfoCache(
+            db=self.db, client=self.client, logger=self.logger, market=self.trade_type,
+            ttl=int(tf_conf.get('exchange_info_ttl', DEFAULT_EXCHANGE_INFO_TTL)),
+            lock_path=f"{config['database']['dbname']}.exchange-info.lock"
+        )
+        self.trading_info = self.exchange_info.get_symbol_info(self.trading_pair)
+        self.logger.debug("[trading_filter] - %s", LazyJson(self.trading_info))
 
         self.base_asset_precision = self.trading_info["baseAssetPrecision"]
         self.quote_precision = self.trading_info["quotePrecision"]
-        self.step_size = float(self.get_filter_value("LOT_SIZE", "stepSize"))
-        self.tick_size = float(self.get_filter_value("PRICE_FILTER", "tickSize"))
+        # quantities / prices are scaled integers on the stepSize / tickSize grid, no decimal context involved
+        self.step_size = Fixed.parse(self.get_filter_value("LOT_SIZE", "stepSize")).normalize()
+        self.tick_size = Fixed.parse(self.get_filter_value("PRICE_FILTER", "tickSize")).normalize()
 
         self.sleep_buffer_min = SLEEP_BUFFER_MIN
         self.sleep_buffer_max = SLEEP_BUFFER_MAX
 
+        # independent exchange / db reads are issued side by side
+        self.executor = executor if executor else load_fanout_executor(config['settings'])
+
     def load_sdk_client(self, sdk):
         if sdk == 'binance_futures':
             return BinanceFuturesAPI(**self.config)
         elif sdk == 'binance_spot':
             return BinanceSpotAPI(self.config, self.logger)
+        elif sdk in ('binance_spot_async', 'binance_futures_async'):
+            return self.load_async_client(sdk)
         else:
             self.logger.debug(f"SDK not supported")
 
+    def load_async_client(self, sdk) -> SyncBridge:
+        # requests run on a loop thread owned by the client, the bot keeps calling it synchronously
+        if sdk == 'binance_futures_async':
+            api = AsyncBinanceFuturesAPI(**self.config)
+        else:
+            api = AsyncBinanceSpotAPI(self.config, self.logger)
+        loop = start_loop_thread(name=f"{sdk}-loop")
+        client = SyncBridge(api, loop)
+        client.connect()
+        return client
+
+    def gather(self, *calls) -> list:
+        """Runs independent calls concurrently and returns their results in order.
+
+        The first call runs on the calling thread so nested gathers can't starve the
+        pool, the first exception raised is re-raised once all the calls are done.
+        """
+
+        futures = [self.executor.submit(call) for call in calls[1:]]
+        try:
+            results = [calls[0]()]
+        finally:
+            for future in futures:
+                future.exception()
+        return results + [future.result() for future in futures]
+
     def buffer(self) -> None:
         sleep_time = random.uniform(self.sleep_buffer_min, self.sleep_buffer_max)
         self.logger.debug(f"sleep .. {sleep_time}")
@@ -69,7 +128,7 @@ class TradingBotClient:
     def set_order(self, symbol:str, side:str, stype:str, quantity:float, 
                                         price:float, timeInForce:str=None):
         
-        if not self.client.supported_pairs.get(symbol, None):
+        if not self.exchange_info.is_supported(symbol):
             self.logger.debug(f"Current sdk doesn't support this pair: {symbol}")
             return
 
@@ -93,6 +152,12 @@ class TradingBotClient:
         elif self.trade_type == "spot":
             return self.client.get_order_details(symbol=symbol, orderId=orderId)
 
+    def wait_order_details(self, symbol:str, orderId:int, timeout:float) -> dict:
+        # only the spot sdk tracks orders from the user data stream
+        if self.trade_type == "spot" and hasattr(self.client, "wait_order_details"):
+            return self.client.wait_order_details(symbol=symbol, orderId=orderId, timeout=timeout)
+        return None
+
     def get_current_position(self, symbol=str):
         return self.client.get_current_position(symbol=symbol)
 
@@ -105,10 +170,7 @@ class TradingBotClient:
             )
         elif self.trade_type == "spot":
 
-            # set precision
-            getcontext().prec = self.base_asset_precision
-
-            quantity = "{:.{precision}f}".format(Decimal(quantity), precision=self.base_asset_precision)
+            quantity = self.format_quantity(quantity)
             while True:
                 self.logger.info(f"[close_order] - quantity:{quantity} - price:{price}")
                 try:
@@ -120,19 +182,19 @@ class TradingBotClient:
                     
                     log_error = traceback.format_exc()
                     if 'insufficient balance for requested action' in log_error:
+                        # the cached balance was wrong, the order never got far enough to invalidate it
+                        balance = self.get_balance(self.trading_info["baseAsset"], refresh=True)
                         # trim down order
-                        remaining_quantity = self.check_remaining_coins(symbol, quantity)
-                        adjusted_q = Decimal(remaining_quantity) - Decimal(self.step_size)
-                        quantity = "{:.{precision}f}".format(adjusted_q, precision=self.base_asset_precision)                        
+                        remaining_quantity = self.check_remaining_coins(symbol, quantity, balance=balance)
+                        quantity = self.format_quantity(Fixed.parse(remaining_quantity) - self.step_size)
 
                     if 'Precision' in log_error:
-                        # adjust precision                        
-                        quantity = "{:.{precision}f}".format(Decimal(quantity), precision=self.base_asset_precision)
+                        # adjust precision
+                        quantity = self.format_quantity(quantity)
 
                     if 'Filter failure: LOT_SIZE' in log_error:
                         # adjust sell_amount to correct LOT_SIZE
-                        adjusted_q = math.floor(Decimal(quantity))
-                        quantity = "{:.{precision}f}".format(adjusted_q, precision=self.base_asset_precision)
+                        quantity = Fixed.parse(quantity).quantize(1).format(self.base_asset_precision)
                     
                     else:
                         self.logger.warning(f"[close_order] - {log_error}")
@@ -152,6 +214,8 @@ class TradingBotClient:
     def get_predictions(self, symbol:str):
         tbl = PredTable() 
         result = tbl.get_predictions(db=self.db, symbol=symbol)
+        if not result:
+            return []
         return tbl.deserialize(result)
 
     def get_position_data(self, symbol:str, tty:str, orderId:int=None):
@@ -192,8 +256,21 @@ class TradingBotClient:
             amount=amount, symbol=symbol, position_type=position_type, index=index, limit=limit
         )
     
+    def load_order_book(self, symbol:str, limit:int=None) -> dict:
+        return self.client.load_order_book(symbol=symbol, limit=limit if limit else 10)
+
+    def select_order_book_price(self, orderbook:dict, amount:int, symbol:str, position_type:str, index:int=None):
+        return self.client.select_order_book_price(
+            orderbook=orderbook, amount=amount, symbol=symbol, position_type=position_type, index=index
+        )
+
     def show_account(self, symbol:str=None):
         return self.client.show_account(symbol)
+
+    def get_balance(self, asset:str, refresh:bool=False) -> dict:
+        # assets the account never held have no row, same as an empty balance
+        balance = self.client.get_balance(asset, refresh=refresh)
+        return balance if balance else {"asset": asset.upper(), "free": 0, "locked": 0}
     
     def get_order_status(self, transactionId:int):
         return self.trd_tbl.get_order_status(db=self.db, transactionId=transactionId)
@@ -205,35 +282,36 @@ class TradingBotClient:
         buyPriceValue = None
         sellPriceValue = None
 
-        price_data = self.get_prices(symbol=self.trading_pair)
-        orderData = self.get_order_status(transactionId)
-
-        # set precision
-        getcontext().prec = self.base_asset_precision
+        price_data, orderData = self.gather(
+            partial(self.get_prices, symbol=self.trading_pair),
+            partial(self.get_order_status, transactionId)
+        )
 
         if bid_price:            
-            # compute for the current profit
-            buyPriceValue = Decimal(orderData['abq']) * Decimal(bid_price)
-            currentPriceValue = Decimal(orderData['abq']) * Decimal(price_data["price"])            
+            # compute for the current profit, exact products of the scaled integers
+            buyQty = Fixed.parse(orderData['abq'])
+            buyPriceValue = buyQty * Fixed.parse(bid_price)
+            currentPriceValue = buyQty * Fixed.parse(price_data["price"])
             # unrealized profit
             uP = currentPriceValue - buyPriceValue            
-            unrealizedProfit = "{:.{precision}f}".format(uP, precision=self.base_asset_precision)
+            unrealizedProfit = uP.format(self.base_asset_precision)
 
         if sell_price:
 
             # compute for the current profit                        
-            buyPriceValue = Decimal(orderData['abq']) * Decimal(bid_price)
-            currentPriceValue = Decimal(orderData['abq']) * Decimal(price_data["price"])            
-            sellPriceValue = Decimal(orderData['asq']) * Decimal(sell_price)            
+            buyQty = Fixed.parse(orderData['abq'])
+            buyPriceValue = buyQty * Fixed.parse(bid_price)
+            currentPriceValue = buyQty * Fixed.parse(price_data["price"])
+            sellPriceValue = Fixed.parse(orderData['asq']) * Fixed.parse(sell_price)
 
             # unrealized profit
-            uP = Decimal(currentPriceValue) - Decimal(buyPriceValue)
-            unrealizedProfit = "{:.{precision}f}".format(uP, precision=self.base_asset_precision)
+            uP = currentPriceValue - buyPriceValue
+            unrealizedProfit = uP.format(self.base_asset_precision)
             self.logger.info(f"[get_profit] => unrealizedProfit: {currentPriceValue} - {buyPriceValue} = {unrealizedProfit}")
 
             # actual realized profit            
-            rP = Decimal(sellPriceValue) - Decimal(buyPriceValue)
-            realizedProfit = "{:.{precision}f}".format(rP, precision=self.base_asset_precision)
+            rP = sellPriceValue - buyPriceValue
+            realizedProfit = rP.format(self.base_asset_precision)
             self.logger.info(f"[get_profit] => realizedProfit: {sellPriceValue} - {buyPriceValue} = {realizedProfit}")
 
         return {            
@@ -260,15 +338,16 @@ class TradingBotClient:
 
         for d in self.trading_info["filters"]:
             if d["filterType"] == "LOT_SIZE":
-                min_lotsize = float(d['minQty'])
-                max_lotsize = float(d['maxQty'])
-                step_size = float(d['stepSize'])
+                min_lotsize = Fixed.parse(d['minQty'])
+                max_lotsize = Fixed.parse(d['maxQty'])
+                step_size = Fixed.parse(d['stepSize'])
 
         if min_lotsize and max_lotsize and step_size:
-            if float(amount) < min_lotsize:
+            amount = Fixed.parse(amount)
+            if amount < min_lotsize:
                 self.logger.warning(f"Amount: {amount} is less than min allowed LOT_SIZE: {min_lotsize}")
                 return False            
-            if float(amount) > max_lotsize:
+            if amount > max_lotsize:
                 self.logger.warning(f"Amount: {amount} is greater than max allowed LOT_SIZE: {max_lotsize}")
                 return False
             
@@ -292,16 +371,16 @@ class TradingBotClient:
         
         for d in self.trading_info["filters"]:
             if d["filterType"] == "NOTIONAL":
-                min_notional_size = float(d['minNotional'])
-                max_notional_size = float(d['maxNotional'])
+                min_notional_size = Fixed.parse(d['minNotional'])
+                max_notional_size = Fixed.parse(d['maxNotional'])
         
         if min_notional_size and max_notional_size:
             # 19000 x 0.00002 = 0.38 < 10 (MIN_NOTIONAL.minNotional)
-            notional_size = float(price) * float(amount)
-            if float(notional_size) < min_notional_size:
+            notional_size = Fixed.parse(price) * Fixed.parse(amount)
+            if notional_size < min_notional_size:
                 self.logger.warning(f"Price: {price} x Amount: {amount} = {notional_size} is less than min allowed NOTIONAL_SIZE: {min_notional_size}")
                 return False
-            if float(notional_size) > max_notional_size: 
+            if notional_size > max_notional_size: 
                 self.logger.warning(f"Price: {price} x Amount: {amount} = {notional_size} is greater than max allowed NOTIONAL_SIZE: {max_notional_size}")
                 return False
 
@@ -321,7 +400,7 @@ class TradingBotClient:
             self.logger.warning(f"trading pair not supported - {self.trading_pair}")
             return False
         
-        trimmed_quantity = math.floor((float(quantity) / float(self.step_size)) * float(self.step_size))
+        trimmed_quantity = Fixed.parse(quantity).quantize(self.step_size)
         return trimmed_quantity
 
     def get_trimmed_price_precision(self, price):
@@ -330,35 +409,31 @@ class TradingBotClient:
             self.logger.warning(f"trading pair not supported - {self.trading_pair}")
             return False
     
-        trimmed_price = round(price / self.tick_size) * self.tick_size
+        trimmed_price = Fixed.parse(price).quantize(self.tick_size, HALF_EVEN)
         return trimmed_price
 
+    def format_quantity(self, quantity) -> str:
+        # down to a stepSize multiple, written with the base asset precision
+        return Fixed.parse(quantity).quantize(self.step_size).format(self.base_asset_precision)
 
-    def check_remaining_coins(self, symbol:str, sell_amount:int) -> int:
-
-        result = self.client.show_account(symbol)
-        if not result:
-            return sell_amount
 
-        remaining_coins = 0
-        for row in result["balances"]:
-            if symbol.upper() != row['asset'].upper(): continue
-            remaining_coins = row["free"]
-            break
+    def check_remaining_coins(self, symbol:str, sell_amount:int, balance:dict=None) -> int:
 
+        if balance is None:
+            balance = self.get_balance(symbol)
+        remaining_coins = balance["free"]
 
-        updated_sell_amount = 0
-        getcontext().prec = self.base_asset_precision
-        if Decimal(sell_amount) < Decimal(remaining_coins):
-            remaining_coins_plus_sell_amount = "{:.{precision}f}".format(Decimal(remaining_coins), precision=self.base_asset_precision)
-            updated_sell_amount = Decimal(remaining_coins)
+        sell_amount = Fixed.parse(sell_amount)
+        remaining_coins = Fixed.parse(remaining_coins)
+        if sell_amount < remaining_coins:
+            updated_sell_amount = remaining_coins
         else:            
-            if Decimal(sell_amount) == Decimal(remaining_coins):
-                updated_sell_amount = Decimal(sell_amount)
+            if sell_amount == remaining_coins:
+                updated_sell_amount = sell_amount
             else:
-                updated_sell_amount = Decimal(remaining_coins)
+                updated_sell_amount = remaining_coins
         
-        s_updated_sell_amount = "{:.{precision}f}".format(updated_sell_amount, precision=self.base_asset_precision)
+        s_updated_sell_amount = updated_sell_amount.format(self.base_asset_precision)
         self.logger.info(f"[check_remaining_coins] -  final -> {s_updated_sell_amount}")
 
         return s_updated_sell_amount
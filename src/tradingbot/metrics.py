@@ -0,0 +1,269 @@
+import os
+import re
+import time
+import bisect
+import logging
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# seconds, covers a cached read up to a slow order placement with retries
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DEFAULT_METRICS_INTERVAL = 15
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+
+class Histogram:
+    """Counts per bucket, made cumulative when rendered."""
+
+    def __init__(self, buckets:tuple=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value:float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms of one process, rendered in the Prometheus text format.
+
+    Samples are keyed by name and a sorted tuple of label pairs, an update is a
+    dict lookup and an addition under one lock so it can sit on every request.
+    """
+
+    def __init__(self, prefix:str="tradingbot"):
+        self.prefix = prefix
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.exporting = False
+
+    def __repr__(self):
+        return f"MetricsRegistry - {len(self.counters)} counters - {len(self.histograms)} histograms"
+
+    def inc(self, name:str, value:float=1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name:str, value:float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name:str, value:float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key, None)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def timed(self, name:str, fn, **labels):
+        """Calls `fn`, observing its duration as `<name>_seconds` and counting it in `<name>_total`
+        and, when it raises, `<name>_errors_total`.
+        """
+
+        start = time.perf_counter()
+        try:
+            return fn()
+        except Exception:
+            self.inc(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+            self.inc(f"{name}_total", **labels)
+
+    async def timed_async(self, name:str, coro, **labels):
+        start = time.perf_counter()
+        try:
+            return await coro
+        except Exception:
+            self.inc(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+            self.inc(f"{name}_total", **labels)
+
+    def render(self) -> str:
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(
+                ((key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self.histograms.items()),
+                key=lambda item: item[0]
+            )
+
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for kind, samples in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in samples:
+                name = f"{self.prefix}_{name}"
+                header(name, kind)
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), counts, total, count, buckets in histograms:
+            name = f"{self.prefix}_{name}"
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels:tuple) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels)
+    return "{" + pairs + "}"
+
+
+# process wide registry, like the logging module every component reports to the same one
+registry = MetricsRegistry()
+
+
+STATEMENT_RE = re.compile(r"^\s*(\w+)(?:.*?\b(?:FROM|INTO|UPDATE)\s+(\w+))?", re.IGNORECASE | re.DOTALL)
+
+
+@functools.lru_cache(maxsize=512)
+def statement_labels(sql:str) -> tuple:
+    """(operation, table) of a statement, the sql text is stable with bound parameters so this is cached."""
+
+    match = STATEMENT_RE.match(sql)
+    if not match:
+        return "other", "-"
+    operation = match.group(1).lower()
+    table = match.group(2) if match.group(2) else "-"
+    if operation == "update":
+        table = sql.split()[1]
+    return operation, table
+
+
+class InstrumentedClient:
+    """Times the exchange calls of a client, every other attribute is passed through."""
+
+    def __init__(self, client, methods:tuple, metrics:MetricsRegistry=registry):
+        self.client = client
+        self.methods = methods
+        self.metrics = metrics
+
+    def __repr__(self):
+        return f"InstrumentedClient - {self.client!r}"
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name not in self.methods or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return self.metrics.timed("client_call", lambda: attr(*args, **kwargs), method=name)
+        return call
+
+
+class RetryCounter(logging.Handler):
+    """Counts the retries logged by the `retry` package, which logs a warning before each one."""
+
+    def __init__(self, metrics:MetricsRegistry=registry):
+        super().__init__(level=logging.WARNING)
+        self.metrics = metrics
+
+    def emit(self, record):
+        self.metrics.inc("exchange_retries_total")
+
+
+logging.getLogger("retry.api").addHandler(RetryCounter())
+
+
+# POST paths of the metrics port mapped to callables returning a short status, see `register_control`
+CONTROLS = {}
+
+
+def register_control(path:str, fn) -> None:
+    CONTROLS[path] = fn
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        fn = CONTROLS.get(self.path.split("?")[0], None)
+        if fn is None:
+            self.send_error(404)
+            return
+        body = f"{fn()}\n".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_metrics_file(path:str, metrics:MetricsRegistry=registry) -> None:
+    # written aside and renamed so a scraper never reads half a file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(metrics.render())
+    os.replace(tmp_path, path)
+
+
+def load_exporter(settings:dict, logger, metrics:MetricsRegistry=registry) -> None:
+    """Serves the registry on `metrics_port` and/or writes it to `metrics_file` every `metrics_interval`
+    seconds. Only the first call of a process starts them, the engine's bots share one exporter.
+    """
+
+    port = int(settings.get('metrics_port', 0))
+    path = settings.get('metrics_file', None)
+    with metrics.lock:
+        if metrics.exporting or not (port or path):
+            return
+        metrics.exporting = True
+
+    if port:
+        host = settings.get('metrics_host', DEFAULT_METRICS_HOST)
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"[metrics] - serving on http://{host}:{port}/metrics")
+
+    if path:
+        interval = float(settings.get('metrics_interval', DEFAULT_METRICS_INTERVAL))
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    write_metrics_file(path, metrics)
+                except OSError as exc:
+                    logger.warning(f"[metrics] - writing {path} failed: {exc}")
+
+        threading.Thread(target=run, name="metrics-file", daemon=True).start()
+        logger.info(f"[metrics] - writing {path} every {interval}s")
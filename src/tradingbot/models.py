@@ -1,3 +1,6 @@
+import time
+
+
 class BaseTable:
  
     def __init__(self) -> None:
@@ -36,7 +39,7 @@ class PredTable(BaseTable):
 
     def get_predictions(self, db:object, symbol:str):
         return db.select_one(
-            f"SELECT * FROM pred_table WHERE c = '{symbol}' ORDER BY ia DESC LIMIT 1"
+            "SELECT * FROM pred_table WHERE c = ? ORDER BY ia DESC LIMIT 1", (symbol,)
         )
 
     
@@ -65,108 +68,136 @@ class TradingTable(BaseTable):
             'ut': 'updateTime',
             'ia': 'inserted_at',
             'ia': 'isExpired',
-            'tty': 'tradeType'
+            'tty': 'tradeType',
+            'bft': 'buyFilledAt',
+            'sft': 'sellFilledAt'
         }
 
         self.logger = logger
 
+        # (data key, column) pairs that can be updated on an existing position
+        self.update_columns = [
+            ('side', 'si'),
+            ('status', 'st'),
+            ('unrealizedProfit', 'up'),
+            ('updateTime', 'ut'),
+            ('currentPrice', 'cp'),
+            ('sellId', 'sid'),
+            ('origBuyQty', 'obq'),
+            ('executedBuyQty', 'ebq'),
+            ('cummulativeBuyQuoteQty', 'cbqq'),
+            ('sellPrice', 'sp'),
+            ('isExpired', 'ie'),
+            ('origSellQty', 'osq'),
+            ('executedSellQty', 'esq'),
+            ('cummulativeSellQuoteQty', 'csqq'),
+            ('actualBuyQty', 'abq'),
+            ('actualSellQty', 'asq'),
+            ('realizedProfit', 'rp'),
+            ('buyFilledAt', 'bft'),
+            ('sellFilledAt', 'sft'),
+        ]
+        self.insert_columns = ['oid', 's', 'si', 'st', 'a', 'bp', 'cp', 'ut', 'tty']
+
     def save_requested_position(self, db:object, data:dict):
-        result = db.select_one("SELECT * FROM trading_table WHERE id = {transactionId}".format(**data))
+        result = None
+        if data.get("transactionId", None):
+            result = db.select_one("SELECT * FROM trading_table WHERE id = ?", (data['transactionId'],))
         if result:
             set_query = []
-            if data.get("side", None):
-                set_query.append(f"si = '{data['side']}'")
-            if data.get("status", None):
-                set_query.append(f"st = '{data['status']}'")
-            if data.get("unrealizedProfit", None):
-                set_query.append(f"up = '{data['unrealizedProfit']}'")
-            if data.get("updateTime", None):
-                set_query.append(f"ut = '{data['updateTime']}'")
-            if data.get("currentPrice", None):
-                set_query.append(f"cp = '{data['currentPrice']}'")
-            if data.get("sellId", None):
-                set_query.append(f"sid = '{data['sellId']}'")
-            if data.get("origBuyQty", None):
-                set_query.append(f"obq = '{data['origBuyQty']}'")
-            if data.get("executedBuyQty", None):
-                set_query.append(f"ebq = '{data['executedBuyQty']}'")
-            if data.get("cummulativeBuyQuoteQty", None):
-                set_query.append(f"cbqq = '{data['cummulativeBuyQuoteQty']}'")
-            if data.get("entryPrice", None):
-                set_query.append(f"sp = '{data['sellPrice']}'")
-            if data.get("sellPrice", None):
-                set_query.append(f"sp = '{data['sellPrice']}'")
-            if data.get("isExpired", None):
-                set_query.append(f"ie = '{data['isExpired']}'")
-            if data.get("origSellQty", None):
-                set_query.append(f"osq = '{data['origSellQty']}'")
-            if data.get("executedSellQty", None):
-                set_query.append(f"esq = '{data['executedSellQty']}'")
-            if data.get("cummulativeSellQuoteQty", None):
-                set_query.append(f"csqq = '{data['cummulativeSellQuoteQty']}'")
-            if data.get("actualBuyQty", None):
-                set_query.append(f"abq = '{data['actualBuyQty']}'")
-            if data.get("actualSellQty", None):
-                set_query.append(f"asq = '{data['actualSellQty']}'")
-            if data.get("realizedProfit", None):
-                set_query.append(f"rp = '{data['realizedProfit']}'")
-
-            sql = "UPDATE trading_table SET {set_query} WHERE id = {transactionId}".format(
-                set_query=",".join(set_query), transactionId=data['transactionId']
-            )
-            self.logger.debug(f"[save_requested_position] - {sql}")
+            params = []
+            for key, column in self.update_columns:
+                if data.get(key, None):
+                    set_query.append(f"{column} = ?")
+                    params.append(data[key])
+
+            if not set_query:
+                return result
+
+            sql = "UPDATE trading_table SET {set_query} WHERE id = ?".format(set_query=", ".join(set_query))
+            params.append(data['transactionId'])
+            self.logger.debug(f"[save_requested_position] - {sql} - {params}")
             # update trading_table
-            db.insert(sql)
+            db.insert(sql, params)
         else:
-            sql = "INSERT INTO trading_table (oid, s, si, st, a, bp, cp, ut, ia, tty) "
             rows = {}
-            for k in self.dmapper:
-                row_key = self.dmapper[k]
+            for column in self.insert_columns:
+                row_key = self.dmapper[column]
                 if not data.get(row_key, None):
-                    rows[k] = ""
+                    rows[column] = ""
                 else:
-                    rows[k] = data[row_key]
-            rows['ia'] = "strftime(\'%s\',\'now\')"
-            sql += "VALUES ('{oid}', '{s}', '{si}', '{st}', '{a}', '{bp}', '{cp}', '{ut}', {ia}, '{tty}')".format(**rows)
-            self.logger.debug(f"[save_requested_position] - {sql}")
-            db.insert(sql)
-            # get lastrow insert
-            result = db.select_one("SELECT * FROM trading_table WHERE oid = {oid}".format(**rows))
-        
+                    rows[column] = data[row_key]
+            rows['ia'] = int(time.time())
+            sql = "INSERT INTO trading_table ({columns}) VALUES ({placeholders})".format(
+                columns=", ".join(rows), placeholders=", ".join("?" * len(rows))
+            )
+            self.logger.debug(f"[save_requested_position] - {sql} - {rows}")
+            # lastrowid saves a round trip to read back the inserted row
+            rows['id'] = db.insert(sql, tuple(rows.values()))
+            result = rows
+
         return result
 
     def get_position_data(self, db:object, symbol:str, tty:str, orderId:int=None):
         if not orderId:
             return db.select_one(
-            f"SELECT * FROM trading_table WHERE s = '{symbol}' \
-                AND st != 'CLOSED' AND tty = '{tty}' AND ie IS NULL ORDER BY ia DESC LIMIT 1"
+                "SELECT * FROM trading_table WHERE s = ? AND st != 'CLOSED' AND tty = ? "
+                "AND ie IS NULL ORDER BY ia DESC LIMIT 1", (symbol, tty)
             )
         else:
             return db.select_one(
-            f"SELECT * FROM trading_table WHERE oid = {orderId} \
-                AND tty = '{tty}' AND ie IS NULL ORDER BY ia DESC LIMIT 1"
+                "SELECT * FROM trading_table WHERE oid = ? AND tty = ? "
+                "AND ie IS NULL ORDER BY ia DESC LIMIT 1", (orderId, tty)
             )
 
     def expire_requested_position(self, db:object, transactionId:int):
-        return db.insert(f"UPDATE trading_table SET st = 'EXPIRED', ie = 1 WHERE id = {transactionId}")
+        return db.insert("UPDATE trading_table SET st = 'EXPIRED', ie = 1 WHERE id = ?", (transactionId,))
 
     def get_current_position_data(seld, db:object, orderId:int=None):
         return db.select_one(
-                f"SELECT * FROM trading_table WHERE oid = {orderId} AND ie IS NULL ORDER BY ia DESC LIMIT 1"
+                "SELECT * FROM trading_table WHERE oid = ? AND ie IS NULL ORDER BY ia DESC LIMIT 1", (orderId,)
             )
 
     def mark_position_closed(seld, db:object, transactionId:int=None):
         return db.insert(
-                f"UPDATE trading_table SET st = 'CLOSED' , ie = 2 WHERE id = {transactionId}"
+                "UPDATE trading_table SET st = 'CLOSED' , ie = 2 WHERE id = ?", (transactionId,)
             )
 
     def mark_position_cancelled(self, db:object, transactionId:int=None):
         return db.insert(
-                f"UPDATE trading_table SET st = 'CANCELED' , ie = 2 WHERE id = {transactionId}"
+                "UPDATE trading_table SET st = 'CANCELED' , ie = 2 WHERE id = ?", (transactionId,)
             )
     
     def get_order_status(self, db:object, transactionId:int):
         return db.select_one(
-            f"SELECT * FROM trading_table WHERE id = {transactionId}"
+            "SELECT * FROM trading_table WHERE id = ?", (transactionId,)
+        )
+
+
+class SymbolInfoTable(BaseTable):
+
+    def __init__(self):
+
+        self.dmapper = {
+            'm': 'market',
+            's': 'symbol',
+            'st': 'status',
+            'f': 'info',
+            'ua': 'updated_at'
+        }
+
+    def get_symbol_info(self, db:object, market:str, symbol:str):
+        return db.select_one(
+            "SELECT * FROM symbol_info WHERE m = ? AND s = ?", (market, symbol)
+        )
+
+    def save_symbols(self, db:object, market:str, rows:list, ua:int) -> int:
+        """Upserts (symbol, status, info) rows and drops the symbols the exchange no longer lists."""
+
+        count = db.insert_many(
+            """INSERT INTO symbol_info (m, s, st, f, ua) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(m, s) DO UPDATE SET st = excluded.st, f = excluded.f, ua = excluded.ua""",
+            [(market, s, st, f, ua) for s, st, f in rows]
         )
-    
\ No newline at end of file
+        db.insert("DELETE FROM symbol_info WHERE m = ? AND ua < ?", (market, ua))
+        return count
@@ -0,0 +1,68 @@
+import os
+import select
+import socket
+import time
+
+
+DEFAULT_NOTIFY_DIR = "/tmp/btb-notify"
+DEFAULT_NOTIFY_TIMEOUT = 60
+MAX_PAYLOAD_SIZE = 65536
+
+
+class PredictionListener:
+    """Receives prediction change notifications published by the collector.
+
+    Binds a unix datagram socket `<notify_dir>/<name>.sock`. Notifications sent
+    while the bot is busy stay queued in the socket, so a change written between
+    a read and the next `wait` is not lost.
+    """
+
+    def __init__(self, name:str, logger, notify_dir:str=DEFAULT_NOTIFY_DIR):
+        self.logger = logger
+        self.path = os.path.join(notify_dir, f"{name}.sock")
+
+        os.makedirs(notify_dir, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.sock.setblocking(False)
+
+    def __del__(self):
+        self.close()
+
+    def close(self) -> None:
+        if self.sock.fileno() == -1:
+            return
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def drain(self) -> set:
+        cryptos = set()
+        while True:
+            try:
+                payload = self.sock.recv(MAX_PAYLOAD_SIZE)
+            except BlockingIOError:
+                break
+            cryptos.update(c for c in payload.decode().split(",") if c)
+        return cryptos
+
+    def wait(self, symbol:str, timeout:float) -> bool:
+        """Blocks until `symbol` has new predictions or `timeout` expires, returns True if notified."""
+
+        symbol = symbol.lower()
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select([self.sock], [], [], remaining)
+            if not readable:
+                return False
+            cryptos = self.drain()
+            # an empty payload means `everything changed`
+            if not cryptos or symbol in cryptos:
+                return True
+            self.logger.debug(f"[notify] - skipped update for {','.join(sorted(cryptos))}")
@@ -0,0 +1,78 @@
+import time
+import random
+
+
+IDLE = "idle"
+HOLD = "hold"
+BID = "bid"
+SELL = "sell"
+ERROR = "error"
+
+# (base, cap) seconds per phase
+DEFAULT_PHASES = {
+    IDLE: (5, 60),
+    HOLD: (1, 5),
+    BID: (0.5, 5),
+    SELL: (0.5, 5),
+    ERROR: (1, 100),
+}
+
+
+class PollingPolicy:
+    """Picks how long to wait before polling again from what the bot is waiting on.
+
+    Each phase grows from its base towards its cap with decorrelated jitter
+    (`uniform(base, previous * 3)`), so a hot phase like a pending bid starts fast
+    and an idle bot settles at a slow rate. Entering another phase starts it over
+    from its base, except `ERROR` which keeps growing across retries until `reset`.
+    A deadline caps the interval so the bot doesn't sleep much past a known event.
+    """
+
+    def __init__(self, phases:dict=None):
+        self.phases = dict(DEFAULT_PHASES)
+        if phases:
+            self.phases.update(phases)
+        self.sleeps = {}
+        self.phase = None
+
+    def __repr__(self):
+        return f"PollingPolicy - {self.phase}"
+
+    def reset(self, phase:str) -> None:
+        self.sleeps.pop(phase, None)
+
+    def interval(self, phase:str, deadline:float=None) -> float:
+        """Seconds to wait in `phase`, `deadline` is a `time.monotonic()` value."""
+
+        if phase != self.phase and phase != ERROR:
+            self.reset(phase)
+        self.phase = phase
+
+        base, cap = self.phases[phase]
+        previous = self.sleeps.get(phase, None)
+        sleep = base if previous is None else min(cap, random.uniform(base, previous * 3))
+        self.sleeps[phase] = sleep
+
+        if deadline is not None:
+            sleep = self.clamp(phase, sleep, deadline)
+        return sleep
+
+    def cap(self, phase:str) -> float:
+        # the longest wait of a phase, also how long a fill is waited on from the stream
+        return self.phases[phase][1]
+
+    def clamp(self, phase:str, sleep:float, deadline:float) -> float:
+        # never below the base, a passed deadline shouldn't turn into a busy loop
+        base, _ = self.phases[phase]
+        return min(sleep, max(base, deadline - time.monotonic()))
+
+
+def load_phases(settings:dict) -> dict:
+    # poll_<phase>=<base>,<cap>
+    phases = {}
+    for phase in DEFAULT_PHASES:
+        value = settings.get(f"poll_{phase}", None)
+        if value:
+            base, cap = [float(v) for v in value.split(",")]
+            phases[phase] = (base, cap)
+    return phases
@@ -0,0 +1,187 @@
+import io
+import sys
+import time
+import signal
+import pstats
+import cProfile
+import threading
+import traceback
+import tracemalloc
+from collections import Counter
+
+from metrics import registry, register_control
+
+
+CPROFILE = "cprofile"
+SAMPLE = "sample"
+DEFAULT_PROFILE_MODE = CPROFILE
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_PROFILE_TOP = 25
+# frames kept per tracemalloc allocation, more is slower and uses more memory
+TRACEMALLOC_FRAMES = 10
+
+
+class Profiler:
+    """Profiling of a running bot, toggled by signals or the control port.
+
+    `toggle` starts or stops a cProfile of the bot thread, or a sampler that
+    records the bot thread's stack every `interval` seconds, and dumps the stats
+    to `logdir` when stopped. cProfile only follows the thread it is enabled on,
+    so a request from another thread is applied by the bot thread on its next
+    `tick`. `snapshot` takes a tracemalloc snapshot and logs the top allocations
+    grown since the previous one.
+    """
+
+    def __init__(self, logdir:str, name:str, logger, mode:str=DEFAULT_PROFILE_MODE,
+                    interval:float=DEFAULT_SAMPLE_INTERVAL, top:int=DEFAULT_PROFILE_TOP):
+        if mode not in (CPROFILE, SAMPLE):
+            raise ValueError(f"Invalid profile_mode: {mode} - expected one of {(CPROFILE, SAMPLE)}")
+        self.logdir = logdir
+        self.name = name
+        self.logger = logger
+        self.mode = mode
+        self.interval = interval
+        self.top = top
+
+        self.thread_id = threading.get_ident()
+        # re-entrant, a signal may land while the bot thread is in `tick`
+        self.lock = threading.RLock()
+        self.requested = False
+        self.running = False
+        self.profile = None
+        self.sampler = None
+        self.samples = None
+        self.started_at = None
+        self.previous_snapshot = None
+
+    def __repr__(self):
+        return f"Profiler - {self.mode} - running:{self.running}"
+
+    def install(self) -> None:
+        """Binds the profiler to the calling thread and installs the signal handlers,
+        SIGUSR1 toggles profiling and SIGUSR2 takes a tracemalloc snapshot.
+        """
+
+        self.thread_id = threading.get_ident()
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle())
+            signal.signal(signal.SIGUSR2, lambda signum, frame: self.snapshot())
+        register_control("/profile", self.toggle)
+        register_control("/tracemalloc", self.snapshot)
+
+    def toggle(self) -> str:
+        with self.lock:
+            self.requested = not self.requested
+            requested = self.requested
+        self.tick()
+        return f"profiling {'requested' if requested else 'stopping'} - {self.mode}"
+
+    def tick(self) -> None:
+        """Starts or stops the profiler as requested, a no-op off the bot thread in cProfile mode."""
+
+        if self.requested == self.running:
+            return
+        if self.mode == CPROFILE and threading.get_ident() != self.thread_id:
+            return
+        with self.lock:
+            if self.requested and not self.running:
+                self.start()
+            elif self.running and not self.requested:
+                self.stop()
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        self.running = True
+        if self.mode == CPROFILE:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            self.samples = Counter()
+            self.sampler = threading.Thread(target=self.sample, name="profiler-sampler", daemon=True)
+            self.sampler.start()
+        self.logger.info(f"[profile] - {self.mode} started")
+
+    def stop(self) -> None:
+        self.running = False
+        duration = time.time() - self.started_at
+        path = f"{self.logdir}/{self.name}-{time.strftime('%Y%m%d-%H%M%S')}"
+        if self.mode == CPROFILE:
+            self.profile.disable()
+            path = f"{path}.prof"
+            self.profile.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+            self.profile = None
+            summary = out.getvalue()
+        else:
+            self.sampler.join()
+            path = f"{path}.stacks"
+            # collapsed stacks, the input format of flamegraph.pl / speedscope
+            with open(path, "w") as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            summary = "\n".join(f"{count:>6} {stack.split(';')[-1]}" for stack, count in self.samples.most_common(self.top))
+            self.samples = None
+        self.logger.info(f"[profile] - {self.mode} stopped after {duration:.1f}s - {path}\n{summary}")
+
+    def sample(self) -> None:
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id, None)
+            if frame is not None:
+                stack = ";".join(
+                    f"{f.name} ({f.filename.rsplit('/', 1)[-1]}:{f.lineno})" for f in traceback.extract_stack(frame)
+                )
+                self.samples[stack] += 1
+            time.sleep(self.interval)
+
+    def snapshot(self) -> str:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self.logger.info(f"[tracemalloc] - started, the next snapshot shows the growth")
+            return "tracemalloc started"
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        path = f"{self.logdir}/{self.name}-{time.strftime('%Y%m%d-%H%M%S')}.tracemalloc"
+        snapshot.dump(path)
+        current, peak = tracemalloc.get_traced_memory()
+        if self.previous_snapshot is None:
+            stats = snapshot.statistics("lineno")[:self.top]
+        else:
+            stats = snapshot.compare_to(self.previous_snapshot, "lineno")[:self.top]
+        self.previous_snapshot = snapshot
+        summary = "\n".join(str(stat) for stat in stats)
+        self.logger.info(f"[tracemalloc] - current:{current} peak:{peak} - {path}\n{summary}")
+        return summary
+
+
+class PhaseClock:
+    """Wall time spent in each phase of a bot, the phase changes on `enter`."""
+
+    def __init__(self, name:str):
+        self.name = name
+        self.phase = None
+        self.entered_at = None
+
+    def __repr__(self):
+        return f"PhaseClock - {self.name} - {self.phase}"
+
+    def enter(self, phase:str) -> None:
+        now = time.monotonic()
+        if self.phase is not None:
+            registry.inc("phase_wall_seconds_total", now - self.entered_at, symbol=self.name, phase=self.phase)
+        self.phase = phase
+        self.entered_at = now
+
+
+def load_profiler(settings:dict, name:str, logger) -> Profiler:
+    return Profiler(
+        logdir=settings.get('logdir', '/tmp'),
+        name=name,
+        logger=logger,
+        mode=settings.get('profile_mode', DEFAULT_PROFILE_MODE),
+        interval=float(settings.get('profile_interval', DEFAULT_SAMPLE_INTERVAL)),
+        top=int(settings.get('profile_top', DEFAULT_PROFILE_TOP))
+    )
@@ -0,0 +1,44 @@
+import json
+import logging
+
+from prettytable import PrettyTable
+
+
+class LazyTable:
+    """PrettyTable of `rows` built only when the log record is formatted."""
+
+    def __init__(self, rows:list, field_names:list):
+        self.rows = rows
+        self.field_names = field_names
+
+    def __str__(self):
+        tbl = PrettyTable()
+        tbl.field_names = self.field_names
+        for row in self.rows:
+            tbl.add_row([row.get(k, "-") for k in self.field_names])
+        return f"\n{tbl}"
+
+
+class LazyJson:
+    """Indented json of `data` built only when the log record is formatted."""
+
+    def __init__(self, data, indent:int=2):
+        self.data = data
+        self.indent = indent
+
+    def __str__(self):
+        return json.dumps(self.data, indent=self.indent, default=str)
+
+
+def kv(row:dict, field_names:list) -> str:
+    return " ".join(f"{k}={row.get(k, '-')}" for k in field_names)
+
+
+def log_table(logger, rows:list, field_names:list, level:int=logging.INFO) -> None:
+    """Logs `rows` as a table when debug is enabled, as compact key=value records otherwise."""
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.log(level, "%s", LazyTable(rows, field_names))
+    elif logger.isEnabledFor(level):
+        for row in rows:
+            logger.log(level, kv(row, field_names))
@@ -0,0 +1,349 @@
+import time
+from abc import ABC, abstractmethod
+from functools import partial
+
+from metrics import registry
+from polling import IDLE, HOLD, BID, SELL, ERROR
+
+
+class SpotStrategy(ABC):
+    """The spot lifecycle of one trading pair, shared by the bot and the engine.
+
+    Written once as a coroutine against the waits of its runner: `call` and
+    `gather` run the blocking client / db calls, `buffer`, `wait_for_predictions`
+    and `wait_order_details` are the sleeps. The bot awaits them inline on its own
+    thread, the engine runs the calls on its executor and waits as coroutines.
+
+    `settings` is the `Bot` holding the trading config, its client and logger.
+    A runner must implement every abstract hook to be built.
+    """
+
+    # the bot prints the order tables, they would interleave between the engine pairs
+    render_tables = True
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.bot = settings.bot
+        self.logger = settings.logger
+
+        self.trading_pair = settings.trading_pair
+        self.symbol = settings.symbol
+        self.amount = settings.amount
+        self.trade_type = settings.trade_type
+        self.policy = settings.policy
+        self.clock = settings.clock
+
+    @abstractmethod
+    async def call(self, fn, *args, **kwargs):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def gather(self, *calls) -> list:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def buffer(self, phase:str=IDLE, deadline:float=None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def wait_for_predictions(self, phase:str=IDLE, deadline:float=None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def wait_order_details(self, orderId:int, phase:str=BID) -> dict:
+        raise NotImplementedError
+
+    def render_tbl(self, result:list, field_names:list) -> None:
+        if self.render_tables:
+            self.bot.render_tbl(result=result, field_names=field_names)
+
+    async def run_spot(self) -> None:
+
+        bot = self.bot
+        settings = self.settings
+
+        # check lotsize
+        if not bot.is_allowed_lotsize(trading_pair=self.trading_pair, amount=self.amount):
+            self.logger.info(f"Stopping bot..")
+            await self.buffer()
+            return
+
+        # show account
+        await self.call(bot.show_account)
+        transactionId = 0
+
+        while True:
+
+            # get predictions
+            predictions = await self.call(bot.get_predictions, symbol=self.symbol)
+            if not predictions:
+                self.logger.info(f"no scraped predictions yet for {self.trading_pair} in pred_table")
+                await self.wait_for_predictions()
+                continue
+
+            try:
+                elapsed_time = int(predictions[0]['elapsed_time(min)'])
+                if elapsed_time <= settings.buy_delay:
+                    self.logger.info(f"prediction is still less < {settings.buy_delay} min(s) for {self.trading_pair} in pred_table")
+                    # no need to look again before the delay is over
+                    await self.wait_for_predictions(deadline=time.monotonic() + (settings.buy_delay - elapsed_time + 1) * 60)
+                    continue
+            except:
+                if predictions[0]['position'] == 'none' and predictions[0]['elapsed_time(min)'] == "-":
+                    self.logger.info(f"skipping .. {self.trading_pair} - no predictions yet ..")
+                    await self.wait_for_predictions()
+                    continue
+
+            # get open orders and get highest bid
+            bid_price = await self.call(
+                bot.get_order_book, amount=self.amount, symbol=self.trading_pair, position_type="bid"
+            )
+
+            # check if notonial size is okay
+            if not bot.is_allowed_notional_size(trading_pair=self.trading_pair, amount=self.amount, price=bid_price):
+                await self.buffer()
+                continue
+
+            # place "bid" order
+            order = await self.call(
+                bot.set_order, symbol=self.trading_pair, side="BUY", stype="LIMIT",
+                quantity=self.amount, price=bid_price, timeInForce="GTC"
+            )
+            self.policy.reset(BID)
+            transaction_start = time.monotonic()
+
+            # generated transaction id
+            result = await self.call(bot.save_requested_position, {
+                "transactionId": transactionId,
+                "symbol": self.trading_pair,
+                "tradingType": self.trade_type,
+                "side": "BUY",
+                "amount": self.amount,
+                "orderId": order["orderId"],
+                "status": order["status"],
+                "buyPrice": bid_price,
+                "origBuyQty": float(order["origQty"]),
+                "executedBuyQty": float(order["executedQty"]),
+                "cummulativeBuyQuoteQty": float(order["cummulativeQuoteQty"])
+            })
+
+            transactionId = result["id"]
+            orderId = order["orderId"]
+            self.logger.info(f"[start] new transactionId: {transactionId}")
+
+            buyUpdateData = {
+                "transactionId": transactionId,
+                "orderId": orderId,
+                "status": order["status"]
+            }
+
+            bid_status = False
+            for _ in range(settings.bid_retry):
+
+                details = await self.wait_order_details(orderId=orderId)
+                status = details["status"]
+
+                buyUpdateData["status"] = status
+                buyUpdateData["origBuyQty"] = float(details['executedQty'])
+                buyUpdateData["executedBuyQty"] = float(details['origQty'])
+                buyUpdateData["cummulativeBuyQuoteQty"] = float(details['cummulativeQuoteQty'])
+
+                if status != "FILLED":
+                    self.logger.info(f"[{_}][bid] waiting order to be filled ..")
+                    self.render_tbl(
+                        result=[{
+                            "trading_pair": self.trading_pair, "bid": bid_price, "status": status
+                        }], field_names=[
+                            "trading_pair", "bid", "status", "executedBuyQty", "origBuyQty", "percentage"
+                        ]
+                    )
+                    await self.call(bot.save_requested_position, buyUpdateData)
+
+                if status == "PARTIALLY_FILLED":
+                    self.logger.info(f"[{_}][bid] order partially filled ..")
+                    # update actual buy quantity
+                    buyUpdateData["buyPrice"] = float(details['price'])
+                    buyUpdateData["actualBuyQty"] = float(details['cummulativeQuoteQty']) / float(details['price'])
+                    await self.call(bot.save_requested_position, buyUpdateData, render=True)
+
+                if status == "FILLED":
+                    self.logger.info(f"[{_}][bid] order filled ..")
+                    bid_status = True
+                    # update actual buy quantity
+                    buyUpdateData["buyPrice"] = float(details['price'])
+                    buyUpdateData["actualBuyQty"] = float(details['cummulativeQuoteQty']) / float(details['price'])
+                    buyUpdateData["buyFilledAt"] = int(time.time())
+                    await self.call(bot.save_requested_position, buyUpdateData, render=True)
+                    break
+
+            # skip next steps if bid is unsuccessful
+            if bid_status == False:
+                self.logger.info(f"cancelling orderId: {orderId} @ bid: {bid_price}")
+                result = await self.call(bot.cancel_order, symbol=self.trading_pair, orderId=orderId)
+                buyUpdateData['status'] = result['status']
+                await self.call(bot.save_requested_position, buyUpdateData)
+                continue
+
+            # buy check point
+            await self.call(bot.show_account, symbol=self.symbol)
+            self.logger.info(f"[buy] transaction summary - quantity:{details['executedQty']} bid_price:{bid_price}")
+            self.render_tbl(result=[{
+                    "trading_pair": self.trading_pair,
+                    "quantity": details['executedQty'],
+                    "bid_price": bid_price,
+                    "total_amount": float(bid_price) * float(buyUpdateData["executedBuyQty"])
+                }],
+                field_names=["trading_pair", "quantity", "bid_price", "total_amount"]
+            )
+
+            # wait for selling
+            sell_signal = False
+            while True:
+
+                # get predictions and calculate current price - profit/loss
+                predictions, profitData = await self.gather(
+                    partial(bot.get_predictions, symbol=self.symbol),
+                    partial(bot.get_profit, transactionId=transactionId, bid_price=bid_price)
+                )
+                profitData['transactionId'] = transactionId
+                profitData['status'] = status
+
+                # if position is `none` bot will force close the position
+                sell_signal = True if predictions[0]['position'] == 'none' else False
+                # get current elapsed_time
+                elapsed_time = float(predictions[0]['elapsed_time(min)'])
+
+                if float(elapsed_time) >= float(settings.elapsed_time_exp):
+                    sell_signal = True
+                    self.logger.info(f"[sell_signal] reached elapsed_time force sell: {self.trading_pair} position")
+                else:
+                    self.logger.info(f"[sell_signal] waiting for sell signal for {self.trading_pair}")
+                    self.logger.info(f"[sell_signal] sell(?):{'Yes' if sell_signal else 'No'}")
+                    self.logger.info("[sell_signal] unrealized profit: {unrealizedProfit}".format(**profitData))
+
+                await self.call(bot.save_requested_position, profitData)
+
+                if sell_signal:
+                    break
+
+                # wake up right away on a new signal, at the latest when the position expires
+                await self.wait_for_predictions(
+                    phase=HOLD, deadline=time.monotonic() + (float(settings.elapsed_time_exp) - elapsed_time) * 60
+                )
+
+            sellUpdateData = {
+                "transactionId": transactionId,
+                "orderId": orderId
+            }
+
+            sell_index = settings.sell_index
+            while sell_signal:
+
+                await self.buffer(SELL)
+                if sell_index > 0:
+                    sell_index -= 1
+
+                # the executed buy quantity, the balance and the order book don't depend on each other
+                sell_data, balance, orderbook = await self.gather(
+                    partial(bot.get_order_status, transactionId=transactionId),
+                    partial(bot.get_balance, asset=self.symbol),
+                    partial(bot.load_order_book, symbol=self.trading_pair)
+                )
+
+                # get the actual executed buy quantity aka "SELL" amount
+                original_sell_amount = float(sell_data['abq'])
+
+                # need to check if there are coins that were partially filled, need to sell those remaining coins also
+                sell_amount = bot.check_remaining_coins(symbol=self.symbol, sell_amount=original_sell_amount, balance=balance)
+
+                # get open orders and get highest bid
+                sell_price = bot.select_order_book_price(
+                    orderbook=orderbook, amount=sell_amount, symbol=self.trading_pair, position_type="ask", index=sell_index
+                )
+
+                # check if notonial size is okay
+                if not bot.is_allowed_notional_size(trading_pair=self.trading_pair, amount=sell_amount, price=sell_price):
+                    continue
+
+                # place "ask" order
+                sell_order = await self.call(
+                    bot.close_order, symbol=self.trading_pair, side="SELL", stype="LIMIT",
+                    quantity=sell_amount, price=sell_price
+                )
+
+                if not sell_order:
+                    continue
+                self.policy.reset(SELL)
+
+                sell_amount = sell_order['origQty']
+
+                sellId = sell_order["orderId"]
+                status = sell_order["status"]
+                sellUpdateData["side"] = "SELL"
+                sellUpdateData["status"] = status
+                sellUpdateData["sellId"] = sellId
+                sellUpdateData["sellPrice"] = sell_price
+
+                for _ in range(settings.sell_retry):
+
+                    details = await self.wait_order_details(orderId=sellId, phase=SELL)
+                    status = details["status"]
+
+                    # calculate current price - profit/loss
+                    profitData = await self.call(bot.get_profit, transactionId=transactionId, bid_price=bid_price)
+                    # update sell data
+                    sellUpdateData["status"] = status
+                    sellUpdateData["unrealizedProfit"] = profitData['unrealizedProfit']
+                    sellUpdateData["origSellQty"] = details["origQty"]
+                    sellUpdateData["executedSellQty"] = details["executedQty"]
+                    sellUpdateData["cummulativeSellQuoteQty"] = details["cummulativeQuoteQty"]
+
+                    if status != "FILLED":
+                        self.logger.info(f"[{_}][sell] waiting order to be filled ..")
+                        await self.call(bot.save_requested_position, sellUpdateData)
+
+                    if status == "PARTIALLY_FILLED":
+                        self.logger.info(f"[{_}][sell] order partially filled ..")
+                        # update actual sell quantity
+                        sellUpdateData["sellPrice"] = float(details['price'])
+                        sellUpdateData["actualSellQty"] = float(float(details['cummulativeQuoteQty']) / float(details['price']))
+                        await self.call(bot.save_requested_position, sellUpdateData)
+
+                    if status == "FILLED":
+                        break
+
+                # refresh retry to next available sell price iteration
+                if status != "FILLED":
+                    cancel_order = await self.call(bot.cancel_order, symbol=self.trading_pair, orderId=sellId)
+                    sellUpdateData["status"] = cancel_order["status"]
+                    await self.call(bot.save_requested_position, sellUpdateData)
+                    continue
+
+                if status == "FILLED":
+                    self.logger.info(f"[{_}][sell] transaction summary")
+                    # update actual sell quantity
+                    sellUpdateData["sellPrice"] = float(details['price'])
+                    sellUpdateData["actualSellQty"] = float(details['cummulativeQuoteQty']) / float(details['price'])
+                    # calculate current price - profit/loss
+                    profitData = await self.call(
+                        bot.get_profit, transactionId=transactionId, bid_price=bid_price, sell_price=sell_price
+                    )
+                    sellUpdateData["unrealizedProfit"] = profitData['unrealizedProfit']
+                    sellUpdateData["realizedProfit"] = profitData['realizedProfit']
+                    sellUpdateData["isExpired"] = 1
+                    sellUpdateData["status"] = "CLOSED"
+                    sellUpdateData["sellFilledAt"] = int(time.time())
+                    self.logger.info(f"[{_}][sell] transaction saved..")
+                    await self.call(bot.save_requested_position, sellUpdateData, render=True)
+                    break
+
+            await self.call(bot.show_account, symbol=self.symbol)
+            await self.buffer()
+            if not settings.run_forever:
+                break
+
+            self.logger.info(f"[end] finish transactionId: {transactionId}")
+            self.policy.reset(ERROR)
+            registry.observe("transaction_seconds", time.monotonic() - transaction_start, symbol=self.trading_pair)
+            # create new transaction
+            transactionId = 0
@@ -1,31 +1,171 @@
 import sys
+import copy
+import json
+import queue
+import atexit
 import logging
+import threading
+import logging.handlers
+
+from metrics import registry
+
+DEFAULT_LOG_ROTATE = "size"
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUP_COUNT = 5
+DEFAULT_LOG_WHEN = "midnight"
+# records kept in memory while the listener thread catches up, newer ones are dropped past it
+DEFAULT_LOG_QUEUE_SIZE = 10000
+
+
+class JsonFormatter(logging.Formatter):
+    """One json object per line for log shippers."""
+
+    def format(self, record):
+        line = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # formatted by the queue handler before it crossed threads
+            line["exc"] = record.exc_text
+        return json.dumps(line, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """`QueueHandler` that never blocks the caller, records past a full queue are counted and dropped.
+
+    Drops are counted in `log_records_dropped_total` and reported by a warning
+    record once the queue takes records again.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.unreported = 0
+
+    def prepare(self, record):
+        # like QueueHandler.prepare but the traceback stays apart from the message, in exc_text
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.unreported:
+                self.queue.put_nowait(self.dropped_record(record.name))
+                self.unreported = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self.unreported += 1
+            registry.inc("log_records_dropped_total", logger=record.name)
+
+    def dropped_record(self, name:str) -> logging.LogRecord:
+        return self.prepare(logging.makeLogRecord({
+            "name": name, "levelno": logging.WARNING, "levelname": "WARNING",
+            "msg": f"[logging] - dropped {self.unreported} record(s), the log queue was full ({self.dropped} in total)"
+        }))
 
 
 class Monitoring:
+    """Loggers writing through a queue to a background listener thread.
+
+    The calling thread only formats the message and puts it on a bounded queue,
+    the file and console writes happen on the listener so a slow disk never stalls
+    the trading loop. The file rotates by size or time. `get_logger` is idempotent,
+    asking twice for the same logname returns the already configured logger.
+    """
 
-    def __init__(self, logdir:str, debug:int=None):
+    listeners = {}
+    lock = threading.Lock()
+
+    def __init__(self, logdir:str, debug:int=None, rotate:str=DEFAULT_LOG_ROTATE, max_bytes:int=DEFAULT_LOG_MAX_BYTES,
+                    backup_count:int=DEFAULT_LOG_BACKUP_COUNT, when:str=DEFAULT_LOG_WHEN, json_lines:bool=False,
+                    console:bool=True, queue_size:int=DEFAULT_LOG_QUEUE_SIZE):
 
         self.loglevel = "DEBUG" if debug else "INFO"
         self.logdir = logdir
+        self.rotate = rotate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.when = when
+        self.json_lines = json_lines
+        self.console = console
+        self.queue_size = queue_size
+
+    def get_file_handler(self, logname:str) -> logging.Handler:
+        filename = f'{self.logdir}/{logname}.log'
+        if self.rotate == "size":
+            return logging.handlers.RotatingFileHandler(filename, maxBytes=self.max_bytes, backupCount=self.backup_count)
+        if self.rotate == "time":
+            return logging.handlers.TimedRotatingFileHandler(filename, when=self.when, backupCount=self.backup_count)
+        return logging.FileHandler(filename)
 
     def get_logger(self, logname:str):
 
         logger = logging.getLogger(logname)
-        fh = logging.FileHandler(f'{self.logdir}/{logname}.log')
-
-        stdout = logging.StreamHandler(sys.stdout)
-
-        if self.loglevel == "DEBUG":
-            logger.setLevel(logging.DEBUG)
-        else:
-            logger.setLevel(logging.INFO)
-
-        formatter = logging.Formatter('%(asctime)s %(levelname)-3s %(message)s')
-        fh.setFormatter(formatter)
-        logger.setLevel(logging.DEBUG)
-        # Do not log to console.
-        logger.propagate = True
-        logger.addHandler(fh)
-        logger.addHandler(stdout)
-        return logger
\ No newline at end of file
+        logger.setLevel(logging.DEBUG if self.loglevel == "DEBUG" else logging.INFO)
+
+        with self.lock:
+            if logname in self.listeners:
+                return logger
+
+            formatter = logging.Formatter('%(asctime)s %(levelname)-3s %(message)s')
+            fh = self.get_file_handler(logname)
+            fh.setFormatter(JsonFormatter() if self.json_lines else formatter)
+            handlers = [fh]
+            if self.console:
+                stdout = logging.StreamHandler(sys.stdout)
+                stdout.setFormatter(formatter)
+                handlers.append(stdout)
+
+            log_queue = queue.Queue(maxsize=self.queue_size)
+            listener = logging.handlers.QueueListener(log_queue, *handlers)
+            listener.start()
+            self.listeners[logname] = listener
+
+            # drop handlers left by an older setup of the same logger
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+            logger.addHandler(DroppingQueueHandler(log_queue))
+            logger.propagate = False
+        return logger
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Flushes the queued records and stops the listener threads."""
+
+        with cls.lock:
+            for listener in cls.listeners.values():
+                listener.stop()
+                for handler in listener.handlers:
+                    handler.close()
+            cls.listeners.clear()
+
+
+atexit.register(Monitoring.shutdown)
+
+
+def load_monitoring(config) -> Monitoring:
+    settings = config['settings']
+    return Monitoring(
+        logdir=settings.get('logdir', '/tmp'),
+        debug=int(config['app']['debug']),
+        rotate=settings.get('log_rotate', DEFAULT_LOG_ROTATE),
+        max_bytes=int(settings.get('log_max_bytes', DEFAULT_LOG_MAX_BYTES)),
+        backup_count=int(settings.get('log_backup_count', DEFAULT_LOG_BACKUP_COUNT)),
+        when=settings.get('log_when', DEFAULT_LOG_WHEN),
+        json_lines=bool(int(settings.get('log_json', 0))),
+        console=bool(int(settings.get('log_console', 1))),
+        queue_size=int(settings.get('log_queue_size', DEFAULT_LOG_QUEUE_SIZE))
+    )